@@ -1,127 +1,61 @@
 # %%
+# The mix itself is in miniguc/edits/mix.py, also run by `miniguc-edit mix CLIMATE_ID LAND_ID DEST_ID`
+# Every climate x land combination at once, each source read once:
+#   python copy-climate.ju.py 86,87 88,89 90,91,92,93
+# destinations in climate-major order: (86, 88), (86, 89), (87, 88), (87, 89)
 
 from netCDF4 import Dataset
 from glob import glob
 import sys, os
 
 is_py = os.path.basename(sys.argv[0]) == 'copy-climate.ju.py'
-RUN_ID_CLIMATE = int(sys.argv[1]) if is_py and len(sys.argv) > 1 else 86
-RUN_ID_LAND = int(sys.argv[2]) if is_py and len(sys.argv) > 2 else 88
-RUN_ID_DEST = int(sys.argv[3]) if is_py and len(sys.argv) > 3 else 89
 
-root_dir = '/home/mok/miniguc/'
-data_dir_climate = glob(root_dir + f'runs/{RUN_ID_CLIMATE:03}*/')[0]
-data_dir_land = glob(root_dir + f'runs/{RUN_ID_LAND:03}*/')[0]
-
-climate_wrfin = Dataset(glob(data_dir_climate + 'wrfin*')[0])
-land_wrfin = Dataset(glob(data_dir_land + 'wrfin*')[0])
+def run_ids(arg_idx: int, default: list[int]) -> list[int]:
+    return [int(run_id) for run_id in sys.argv[arg_idx].split(',')] if is_py and len(sys.argv) > arg_idx else default
 
-climate_wrfbdy = Dataset(glob(data_dir_climate + 'wrfbdy*')[0])
-land_wrfbdy = Dataset(glob(data_dir_land + 'wrfbdy*')[0])
+RUN_IDS_CLIMATE = run_ids(1, [86])
+RUN_IDS_LAND = run_ids(2, [88])
+RUN_IDS_DEST = run_ids(3, [89])
 
-# %%
+root_dir = '/home/mok/miniguc/'
+sys.path.append(root_dir + 'scripts')
 
-def list_variables(dataset: Dataset) -> None:
-    '''
-    List all variables in the nc dataset for adjustment
-    dataset:    netcdf dataset
-    '''
-    print('\n'.join(map(lambda x: f'{x.name}: {dataset[x.name].__dict__.get('description')} {x.dimensions}', dataset.variables.values())))
+def run_dir(run_id: int) -> str:
+    return glob(root_dir + f'runs/{run_id:03}*/')[0]
 
-def copy_variable(src: Dataset, dest: Dataset, var_name: str) -> Dataset:
-    '''
-    Copy the variable {var_name} from src to dest
-    returns the dest dataset
-    '''
-    dest.variables[var_name][:] = src.variables[var_name][:]
-    return dest
+if len(RUN_IDS_DEST) != len(RUN_IDS_CLIMATE) * len(RUN_IDS_LAND):
+    raise Exception(f'{len(RUN_IDS_CLIMATE)} climate x {len(RUN_IDS_LAND)} land runs need '
+                    f'{len(RUN_IDS_CLIMATE) * len(RUN_IDS_LAND)} destination runs')
 
-# list_variables(climate_wrfbdy)
+data_dirs_climate = [run_dir(run_id) for run_id in RUN_IDS_CLIMATE]
+data_dirs_land = [run_dir(run_id) for run_id in RUN_IDS_LAND]
+data_dirs_dest = [[run_dir(RUN_IDS_DEST[m * len(RUN_IDS_LAND) + k]) for k in range(len(RUN_IDS_LAND))]
+                  for m in range(len(RUN_IDS_CLIMATE))]
 
 # %%
 
-def mix_file(climate_ds: Dataset, land_ds: Dataset, new_name: str) -> None:
-    '''
-    Take the climate variables from climate_ds + the rest from land_ds and copy it to out
-    save it as new name
-    '''
-    climate_vars = [
-        'U', 'V', 'W', 'T', 'THM', 'T_INIT', 'MU', 'MUB', 'P',
-        'AL', 'ALB', 'PB', 'T_BASE', 'Q2', 'T2', 'TH2', 'PSFC',
-        'U10', 'V10', 'QVAPOR', 'QCLOUD', 'QRAIN', 'QICE', 'QSNOW',
-        'QGRAUP', 'QNICE', 'QNRAIN', 'qke_adv', 'FCX', 'GCX',
-        'U_BASE', 'V_BASE', 'QV_BASE', 'U_FRAME', 'V_FRAME', 'P_TOP',
-        'T00', 'P00', 'P_STRAT', 'CLDFRA', 'QSFC_MOSAIC', 'SST', 'PC'
-    ]
-
-    with Dataset(new_name, 'w', format='NETCDF4') as out:
-        attributes = land_ds.__dict__
-        attributes['TITLE'] += ' (MODIFIED)'
-        attributes['NOTE'] = f'Climate from run ID {RUN_ID_CLIMATE} + Land from run ID {RUN_ID_LAND}'
-        out.setncatts(attributes)
-
-        for name, dimension in land_ds.dimensions.items():
-            dimension_size = len(dimension) if not dimension.isunlimited() else None
-            out.createDimension(name, dimension_size)
-
-        for name, variable in land_ds.variables.items():
-            out.createVariable(
-                name,
-                variable.datatype,
-                variable.dimensions,
-                zlib = True,            # Lossless compression (optional)
-                complevel = 5,          # Lossless compression (optional)
-                shuffle = True          # Lossless compression (optional)
-            )
-            out[name].setncatts(land_ds[name].__dict__)
-            out[name][:] = land_ds[name][:]
-
-        # wrfinput case
-        for var_name in climate_vars:
-            if not var_name in land_ds.variables: continue
-            print(f'Copying {var_name}', end='\r')
-            out = copy_variable(climate_ds, out, var_name)
-
-        # wrfbdy case
-        for var_name in climate_vars:
-            for suffix in ['BXS', 'BXE', 'BYS', 'BYE']:
-                if not (var_name + f'_{suffix}') in land_ds.variables: break
-                print(f'Copying {var_name}', end='\r')
-                out = copy_variable(climate_ds, out, var_name + f'_{suffix}')
-
-            for suffix in ['BTXS', 'BTXE', 'BTYS', 'BTYE']:
-                if not (var_name + f'_{suffix}') in land_ds.variables: break
-                print(f'Copying {var_name}', end='\r')
-                out = copy_variable(climate_ds, out, var_name + f'_{suffix}')
-    print()
-
-# %%
-
-import os
-
-print('Modifying wrfinput')
-
-output_dir_wrfin = (glob(root_dir + f'runs/{RUN_ID_DEST:03}*/')[0]) + 'wrfinput_d01'
-if len(glob(output_dir_wrfin)) > 0:
-    raise Exception(f'wrfinput file already exists on run ID {RUN_ID_DEST}')
+if not is_py:
+    from miniguc.display import list_variables
 
-mix_file(climate_wrfin, land_wrfin, output_dir_wrfin)
+    # list_variables(glob(data_dirs_climate[0] + 'wrfbdy*')[0])
 
-print('Modifying wrfbdy')
+# %%
 
-output_dir_wrfbdy = (glob(root_dir + f'runs/{RUN_ID_DEST:03}*/')[0]) + 'wrfbdy_d01'
-if len(glob(output_dir_wrfbdy)) > 0:
-    raise Exception(f'wrfbdy file already exists on run ID {RUN_ID_DEST}')
+from miniguc.edits.mix import run_batch
 
-mix_file(climate_wrfbdy, land_wrfbdy, output_dir_wrfbdy)
+notes = [[f'Climate from run ID {climate_id} + Land from run ID {land_id}' for land_id in RUN_IDS_LAND]
+         for climate_id in RUN_IDS_CLIMATE]
+run_batch(data_dirs_climate, data_dirs_land, data_dirs_dest, notes)
 print('Done!')
 
 # %%
 
 if not is_py:
-    test_ds = Dataset(output_dir_wrfin)
+    climate_wrfin = Dataset(glob(data_dirs_climate[0] + 'wrfin*')[0])
+    test_ds = Dataset(data_dirs_dest[0][0] + 'wrfinput_d01')
     print(test_ds.variables['T'][:] - climate_wrfin.variables['T'][:])
 
 if not is_py:
-    test_ds = Dataset(output_dir_wrfbdy)
+    climate_wrfbdy = Dataset(glob(data_dirs_climate[0] + 'wrfbdy*')[0])
+    test_ds = Dataset(data_dirs_dest[0][0] + 'wrfbdy_d01')
     print(test_ds.variables['T_BXS'][:] - climate_wrfbdy['T_BXS'][:])
@@ -0,0 +1,3 @@
+'''
+Shared helpers for the miniguc preprocessing scripts in scripts/edit-data
+'''
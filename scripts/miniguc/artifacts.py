@@ -0,0 +1,191 @@
+'''
+Content-addressed store of the files shared between runs
+
+Every distinct file (physics tables of run-template, geo_em, met_em, wrfbdy, ...)
+is kept once in $MINIGUC_STORE (store/ in the project by default) under its
+sha256, and run directories hold hard links to it. Where hard links are not
+possible (another file system), files are copied, as reflinks when the file
+system supports them.
+
+Blobs are read-only. miniguc.engine.edit_in_place edits a private copy of a
+file that is linked to the store, so editing one run never changes the others.
+The store keeps no index of its own: a blob whose only link is the store itself
+is no longer referenced by any run and is removed by gc.
+
+    python -m miniguc.artifacts new runs/run-template runs/095-seabreeze   # provision a run
+    python -m miniguc.artifacts dedupe runs/*/ [--min-size 1M]             # share identical files
+    python -m miniguc.artifacts gc [--dry-run]                             # remove unreferenced blobs
+    python -m miniguc.artifacts status
+'''
+
+from fnmatch import fnmatch
+import argparse, os, shutil, sys
+
+from miniguc.files import ROOT_DIR, copy_file
+from miniguc.stage_cache import hash_file
+from miniguc.streaming import UNITS
+
+STORE_DIR = os.environ.get('MINIGUC_STORE', os.path.join(ROOT_DIR, 'store'))
+# Copied into new runs rather than linked, since they are edited for every run
+COPIED_FILES = ['namelist.*']
+
+def blob_name(sha256: str) -> str:
+    return os.path.join(STORE_DIR, 'blobs', sha256[:2], sha256[2:])
+
+def replace_with(source_name: str, file_name: str, copy: bool = True) -> bool:
+    '''
+    Make file_name a hard link to source_name, or a copy of it when linking is not possible
+    copy    copy when linking fails, otherwise leave file_name as is
+    Returns whether file_name is now a hard link
+    '''
+    tmp_name = os.path.join(os.path.dirname(os.path.abspath(file_name)), f'.{os.path.basename(file_name)}.link')
+    if os.path.lexists(tmp_name): os.remove(tmp_name)
+    try:
+        os.link(source_name, tmp_name)
+        linked = True
+    except OSError:
+        if not copy: return False
+        copy_file(source_name, tmp_name)
+        linked = False
+    os.replace(tmp_name, file_name)
+    return linked
+
+def add(file_name: str) -> str:
+    '''
+    Put a file in the store, the file itself becomes a link to its blob
+    Returns its sha256
+    '''
+    sha256 = hash_file(file_name)
+    blob = blob_name(sha256)
+    if not os.path.exists(blob):
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # The file itself becomes the blob, when the store is on the same file system
+        tmp_name = f'{blob}.{os.getpid()}.tmp'
+        try:
+            os.link(file_name, tmp_name)
+        except OSError:
+            copy_file(file_name, tmp_name)
+        os.chmod(tmp_name, 0o444)
+        os.replace(tmp_name, blob)
+    elif not os.path.samefile(blob, file_name):
+        replace_with(blob, file_name, copy=False)
+    return sha256
+
+def provision(sha256: str, file_name: str) -> bool:
+    '''
+    Place the blob of sha256 at file_name, returns whether it is a hard link (a copy otherwise)
+    '''
+    blob = blob_name(sha256)
+    if not os.path.exists(blob): raise FileNotFoundError(f'No blob {sha256} in {STORE_DIR}')
+    return replace_with(blob, file_name)
+
+def new_run(template_dir: str, run_dir: str) -> int:
+    '''
+    Provision a run directory from a template (runs/run-template), files are linked to the store
+    Symlinks (executables) are kept as is, namelists are copied
+    Returns the number of files linked
+    '''
+    linked = 0
+
+    def link(source_name: str, file_name: str) -> None:
+        nonlocal linked
+        if any(fnmatch(os.path.basename(source_name), pattern) for pattern in COPIED_FILES):
+            shutil.copyfile(source_name, file_name)
+        else:
+            linked += provision(add(source_name), file_name)
+
+    shutil.copytree(template_dir, run_dir, symlinks=True, copy_function=link)
+    return linked
+
+def dedupe(dirs: list[str], patterns: list[str] | None = None, min_size: int = 0) -> tuple[int, int]:
+    '''
+    Move the files of dirs into the store, identical files end up as links to a single blob
+    patterns    only files matching one of these, e.g. geo_em.d* met_em.d* wrfbdy_d01, all by default
+    min_size    only files of at least this many bytes
+    Returns the number of files and the bytes no longer held twice
+    '''
+    files, saved = 0, 0
+    for directory in dirs:
+        for root, _, names in os.walk(directory):
+            if os.path.realpath(root).startswith(os.path.realpath(STORE_DIR)): continue
+            for name in names:
+                file_name = os.path.join(root, name)
+                if os.path.islink(file_name) or name.startswith('.'): continue
+                if patterns is not None and not any(fnmatch(name, pattern) for pattern in patterns): continue
+                size = os.path.getsize(file_name)
+                if size < min_size: continue
+                blob = blob_name(hash_file(file_name))
+                # Only a file that was a separate copy of a stored blob frees space
+                duplicate = os.path.exists(blob) and not os.path.samefile(blob, file_name)
+                add(file_name)
+                files += 1
+                if duplicate and os.path.samefile(blob, file_name): saved += size
+    return files, saved
+
+def blobs() -> list[str]:
+    blob_dir = os.path.join(STORE_DIR, 'blobs')
+    if not os.path.isdir(blob_dir): return []
+    return [os.path.join(blob_dir, prefix, name) for prefix in sorted(os.listdir(blob_dir))
+            for name in sorted(os.listdir(os.path.join(blob_dir, prefix))) if not name.endswith('.tmp')]
+
+def gc(dry_run: bool = False) -> tuple[int, int]:
+    '''
+    Remove the blobs no run links to anymore
+    Returns the number of blobs and bytes reclaimed
+    '''
+    removed, reclaimed = 0, 0
+    for blob in blobs():
+        stat_result = os.stat(blob)
+        if stat_result.st_nlink > 1: continue
+        if not dry_run: os.remove(blob)
+        removed += 1
+        reclaimed += stat_result.st_size
+    return removed, reclaimed
+
+def usage() -> dict[str, int]:
+    '''
+    Number of blobs, bytes stored, links to them and bytes saved by sharing them
+    '''
+    summary = {'blobs': 0, 'bytes': 0, 'links': 0, 'saved_bytes': 0}
+    for blob in blobs():
+        stat_result = os.stat(blob)
+        summary['blobs'] += 1
+        summary['bytes'] += stat_result.st_size
+        summary['links'] += stat_result.st_nlink - 1
+        summary['saved_bytes'] += max(0, stat_result.st_nlink - 2) * stat_result.st_size
+    return summary
+
+def parse_size(size: str) -> int:
+    size = size.strip().upper()
+    return int(float(size[:-1]) * UNITS[size[-1]]) if size[-1] in UNITS else int(size)
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog='python -m miniguc.artifacts', description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    new_parser = commands.add_parser('new', help='provision a run directory from a template')
+    new_parser.add_argument('template_dir')
+    new_parser.add_argument('run_dir')
+    dedupe_parser = commands.add_parser('dedupe', help='move the files of run directories into the store')
+    dedupe_parser.add_argument('dirs', nargs='+')
+    dedupe_parser.add_argument('--patterns', nargs='+', default=None, help='e.g. geo_em.d* met_em.d* wrfbdy_d01')
+    dedupe_parser.add_argument('--min-size', default='0', help='e.g. 1M')
+    gc_parser = commands.add_parser('gc', help='remove the blobs no run links to')
+    gc_parser.add_argument('--dry-run', action='store_true')
+    commands.add_parser('status', help='size of the store and bytes saved')
+    args = parser.parse_args(argv)
+
+    if args.command == 'new':
+        print(f'{args.run_dir}: {new_run(args.template_dir, args.run_dir)} files linked to {STORE_DIR}')
+    elif args.command == 'dedupe':
+        files, saved = dedupe(args.dirs, args.patterns, parse_size(args.min_size))
+        print(f'{files} files in {STORE_DIR}, {saved / (1 << 20):.1f} MB saved')
+    elif args.command == 'gc':
+        removed, reclaimed = gc(args.dry_run)
+        print(f'{"Would remove" if args.dry_run else "Removed"} {removed} blobs, {reclaimed / (1 << 20):.1f} MB')
+    else:
+        summary = usage()
+        print(f'{summary["blobs"]} blobs, {summary["bytes"] / (1 << 20):.1f} MB stored, {summary["links"]} links, '
+              f'{summary["saved_bytes"] / (1 << 20):.1f} MB saved')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
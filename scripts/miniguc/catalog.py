@@ -0,0 +1,210 @@
+'''
+Sidecar catalog of netCDF files: metadata and summary statistics of every variable
+
+The first look at a file reads its header (dimensions, shapes, attributes) and,
+when statistics are asked for, streams every numeric variable once in slabs
+(see miniguc.streaming) to get its min, max, mean, count of missing values and
+per-level means. The result goes to miniguc-catalog.<file name>.json next to the
+file ($MINIGUC_CACHE/catalog when the directory is read-only), so looking at the
+same file again only reads that JSON.
+
+A catalog is valid as long as the size and mtime of the file match. With
+hashed=True it also keeps the sha256 of the file, so a file that was copied or
+touched without changing is recognised by its content instead of decoded again.
+
+    python -m miniguc.catalog runs/045-*/wrfout_d01_* [--vars T2 PSFC] [--hash]
+'''
+
+from datetime import datetime
+import argparse, hashlib, json, os, sys
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.stage_cache import CACHE_DIR, hash_file
+from miniguc.streaming import default_budget, slab_indices
+
+CATALOG_VERSION = 1
+DEFAULT_BUDGET = 256 << 20
+# Dimensions averaged separately in level_means, WRF, WPS and real.exe names
+LEVEL_DIMENSIONS = ('bottom_top', 'soil_layers', 'num_metgrid_levels', 'num_st_layers', 'num_sm_layers')
+
+def catalog_name(file_name: str) -> str:
+    '''
+    Sidecar path, named so that globs such as wrfout* or geo_em* don't pick it up
+    '''
+    file_dir, base_name = os.path.split(os.path.abspath(file_name))
+    if os.access(file_dir, os.W_OK):
+        return os.path.join(file_dir, f'miniguc-catalog.{base_name}.json')
+    key = hashlib.sha256(os.path.realpath(file_name).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, 'catalog', f'{key}.json')
+
+def plain(value):
+    '''
+    JSON-ready attribute value
+    '''
+    if isinstance(value, np.ndarray): return value.tolist()
+    if isinstance(value, np.generic): return value.item()
+    return value
+
+def level_axis(dimensions: tuple[str, ...]) -> int | None:
+    '''
+    Axis of the vertical (or soil) levels, the second axis of other (time, n, y, x) variables
+    '''
+    for axis, dimension in enumerate(dimensions[1:-1], 1):
+        if dimension.startswith(LEVEL_DIMENSIONS): return axis
+    return 1 if len(dimensions) == 4 else None
+
+def describe(var) -> dict:
+    return {
+        'dimensions': list(var.dimensions),
+        'shape': list(var.shape),
+        'dtype': str(var.dtype),
+        'attributes': {name: plain(value) for name, value in var.__dict__.items()},
+    }
+
+def variable_stats(var, budget: int) -> dict | None:
+    '''
+    min, max, mean, count, nan_count (NaN and fill values) and level_means of a numeric
+    variable, read in slabs of at most budget bytes, None for other variables
+    '''
+    if var.dtype.kind not in 'iuf' or var.size == 0: return None
+    shape, axis = var.shape, level_axis(var.dimensions)
+    minimum, maximum, total, count, missing = np.inf, -np.inf, 0.0, 0, 0
+    level_sums = np.zeros(shape[axis]) if axis is not None else None
+    level_counts = np.zeros(shape[axis], dtype=np.int64) if axis is not None else None
+
+    # Slabs are decoded as float64, hence the itemsize of 8
+    indices = slab_indices(shape, 8, budget, var.chunking())[1] if len(shape) >= 3 else [Ellipsis]
+    for index in indices:
+        values = np.ma.filled(np.ma.asarray(var[index], dtype=np.float64), np.nan)
+        valid = ~np.isnan(values)
+        valid_count = int(valid.sum())
+        missing += values.size - valid_count
+        if valid_count == 0: continue
+        count += valid_count
+        minimum = min(minimum, float(np.nanmin(values)))
+        maximum = max(maximum, float(np.nanmax(values)))
+        total += float(np.nansum(values))
+        if axis is not None:
+            other_axes = tuple(i for i in range(len(shape)) if i != axis)
+            levels = index[axis] if index is not Ellipsis and axis < len(index) else slice(None)
+            level_sums[levels] += np.nansum(values, axis=other_axes)
+            level_counts[levels] += valid.sum(axis=other_axes)
+
+    stats = {
+        'min': minimum if count > 0 else None,
+        'max': maximum if count > 0 else None,
+        'mean': total / count if count > 0 else None,
+        'count': count,
+        'nan_count': missing,
+    }
+    if axis is not None:
+        stats['level_dimension'] = var.dimensions[axis]
+        stats['level_means'] = [float(s / n) if n > 0 else None for s, n in zip(level_sums, level_counts)]
+    return stats
+
+def build_catalog(file_name: str, stats: bool = True, hashed: bool = False, budget: int | None = None) -> dict:
+    '''
+    Catalog of a file, written to its sidecar
+    stats   compute the statistics, otherwise only the metadata (a header read)
+    hashed  also store the sha256 of the file, see load_catalog
+    budget  bytes read at once per variable, MINIGUC_MEMORY or 256M by default
+    '''
+    budget = budget or default_budget() or DEFAULT_BUDGET
+    stat = os.stat(file_name)
+    with Dataset(file_name) as dataset:
+        catalog = {
+            'version': CATALOG_VERSION,
+            'file': os.path.abspath(file_name),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': hash_file(file_name) if hashed else None,
+            'built': datetime.now().isoformat(timespec='seconds'),
+            'has_stats': stats,
+            'dimensions': {name: len(dimension) for name, dimension in dataset.dimensions.items()},
+            'attributes': {name: plain(value) for name, value in dataset.__dict__.items()},
+            'variables': {name: describe(var) for name, var in dataset.variables.items()},
+        }
+        if stats:
+            for name, var in dataset.variables.items():
+                catalog['variables'][name]['stats'] = variable_stats(var, budget)
+
+    save_catalog(file_name, catalog)
+    return catalog
+
+def save_catalog(file_name: str, catalog: dict) -> None:
+    sidecar = catalog_name(file_name)
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    tmp_name = f'{sidecar}.{os.getpid()}.tmp'
+    with open(tmp_name, 'w') as f:
+        json.dump(catalog, f)
+    os.replace(tmp_name, sidecar)
+
+def is_current(file_name: str, catalog: dict) -> bool:
+    '''
+    Whether the catalog still describes the file, by size and mtime, then by content
+    when the catalog has a hash. A match by content refreshes the stored mtime
+    '''
+    if catalog.get('version') != CATALOG_VERSION: return False
+    stat = os.stat(file_name)
+    if catalog['size'] != stat.st_size: return False
+    if catalog['mtime_ns'] == stat.st_mtime_ns: return True
+    if catalog.get('sha256') is None or hash_file(file_name) != catalog['sha256']: return False
+
+    catalog['mtime_ns'] = stat.st_mtime_ns
+    save_catalog(file_name, catalog)
+    return True
+
+def read_catalog(file_name: str) -> dict | None:
+    '''
+    Catalog of a file from its sidecar, None when there is none or it no longer describes the file
+    '''
+    try:
+        with open(catalog_name(file_name)) as f:
+            catalog = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return catalog if is_current(file_name, catalog) else None
+
+def load_catalog(file_name: str, stats: bool = True, hashed: bool = False, budget: int | None = None) -> dict:
+    '''
+    Catalog of a file from its sidecar, built (or completed with statistics) when missing or stale
+    file_name   netCDF file, e.g. wrfout_d01_*, wrfinput_d01 or geo_em.d01.nc
+    stats       whether the statistics are needed, metadata only needs the header
+    hashed      validate by content when the mtime changed, costs one read of the file
+    '''
+    catalog = read_catalog(file_name)
+    if catalog is not None and (catalog['has_stats'] or not stats):
+        if not hashed or catalog.get('sha256') is not None:
+            return catalog
+    return build_catalog(file_name, stats, hashed, budget)
+
+def format_stats(catalog: dict, var_names: list[str] | None = None) -> str:
+    '''
+    Statistics of a catalog as a text table, one variable per line
+    '''
+    lines = [f'{os.path.basename(catalog["file"])}',
+             f'{"variable":<22}{"min":>14}{"max":>14}{"mean":>14}{"missing":>10}  dimensions']
+    for name, var in catalog['variables'].items():
+        if var_names is not None and name not in var_names: continue
+        stats = var.get('stats') or {}
+        values = [f'{stats[key]:>14.6g}' if stats.get(key) is not None else f'{"-":>14}' for key in ['min', 'max', 'mean']]
+        lines.append(f'{name:<22}{"".join(values)}{stats.get("nan_count", "-"):>10}  {tuple(var["dimensions"])}')
+    return '\n'.join(lines)
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog='python -m miniguc.catalog', description=__doc__.split('\n')[1])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--vars', nargs='+', default=None, help='only print these variables')
+    parser.add_argument('--hash', action='store_true', help='validate by content when the mtime changed')
+    parser.add_argument('--rebuild', action='store_true', help='ignore existing catalogs')
+    args = parser.parse_args(argv)
+
+    for file_name in args.files:
+        catalog = build_catalog(file_name, hashed=args.hash) if args.rebuild else \
+            load_catalog(file_name, hashed=args.hash)
+        print(format_stats(catalog, args.vars))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
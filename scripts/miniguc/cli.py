@@ -0,0 +1,99 @@
+'''
+miniguc-edit, command line of the edits in miniguc.edits
+
+    miniguc-edit geogrid [--dir Build_WRF/WPS]      geo_em.d*, in place
+    miniguc-edit metgrid [--dir Build_WRF/WPS]      met_em.d*, replaced once complete
+    miniguc-edit wrfinput RUN_ID                    wrfinput_d* of runs/RUN_ID-*, in place
+    miniguc-edit wrfbdy RUN_ID                      wrfbdy_d01 of runs/RUN_ID-*, in place
+    miniguc-edit mix CLIMATE_ID LAND_ID DEST_ID     climate of one run + land of another
+    miniguc-edit mix --climate 86 87 --land 88 89 --dest 90 91 92 93
+                                                    every climate x land combination, climate-major
+
+Files are taken from the current directory unless a run ID or --dir is given,
+--output-dir writes modified copies instead. Runs are looked up in
+$MINIGUC_ROOT/runs (/home/mok/miniguc by default) with miniguc.registry.
+Only argparse is imported until a command runs, and nothing imports matplotlib.
+'''
+
+from glob import glob
+import argparse, os, sys
+
+from miniguc.files import ROOT_DIR
+
+# Command: (module in miniguc.edits, files it edits)
+EDITS = {
+    'geogrid': ('geogrid', 'geo_em.d*'),
+    'metgrid': ('metgrid', 'met_em.d*'),
+    'wrfinput': ('wrfinput', 'wrfinput_d*'),
+    # real.exe only writes boundaries for d01, nests get theirs from their parent
+    'wrfbdy': ('wrfbdy', 'wrfbdy_d01'),
+}
+
+def run_dir(run_id: int) -> str:
+    '''
+    Directory of a run, runs/045-some-name/ for run ID 45, looked up in miniguc.registry
+    '''
+    from miniguc.registry import registry
+
+    try:
+        return os.path.join(registry().run_dir(run_id), '')
+    except KeyError as error:
+        raise SystemExit(error.args[0])
+
+def edit(args: argparse.Namespace) -> None:
+    from importlib import import_module
+
+    module_name, pattern = EDITS[args.command]
+    data_dir = args.dir or (run_dir(args.run_id) if args.run_id is not None else '.')
+    file_names = sorted(glob(os.path.join(data_dir, pattern)))
+    if len(file_names) == 0:
+        raise SystemExit(f'No {pattern} in {os.path.abspath(data_dir)}')
+
+    if args.output_dir is not None: os.makedirs(args.output_dir, exist_ok=True)
+    import_module(f'miniguc.edits.{module_name}').run(file_names, args.output_dir)
+    print('Done! Congrats 🎉')
+
+def mix(args: argparse.Namespace) -> None:
+    from miniguc.edits.mix import run_batch
+
+    if len(args.ids) > 0:
+        if len(args.ids) != 3: raise SystemExit('mix takes CLIMATE_ID LAND_ID DEST_ID, or --climate, --land and --dest')
+        args.climate, args.land, args.dest = [args.ids[0]], [args.ids[1]], [args.ids[2]]
+    if not (args.climate and args.land and args.dest):
+        raise SystemExit('mix needs climate, land and destination run IDs')
+    if len(args.dest) != len(args.climate) * len(args.land):
+        raise SystemExit(f'{len(args.climate)} climate x {len(args.land)} land runs need '
+                         f'{len(args.climate) * len(args.land)} destination IDs, got {len(args.dest)}')
+
+    # Destinations in climate-major order: (c1, l1), (c1, l2), ..., (c2, l1), ...
+    dest_ids = [args.dest[m * len(args.land):(m + 1) * len(args.land)] for m in range(len(args.climate))]
+    notes = [[f'Climate from run ID {climate_id} + Land from run ID {land_id}' for land_id in args.land]
+             for climate_id in args.climate]
+    run_batch([run_dir(run_id) for run_id in args.climate], [run_dir(run_id) for run_id in args.land],
+              [[run_dir(run_id) for run_id in row] for row in dest_ids], notes)
+    print('Done!')
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog='miniguc-edit', description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for command, (_, pattern) in EDITS.items():
+        edit_parser = commands.add_parser(command, help=f'edit {pattern}')
+        edit_parser.add_argument('run_id', type=int, nargs='?', default=None, help='run ID, e.g. 45 for runs/045-*')
+        edit_parser.add_argument('--dir', default=None, help='directory of the files, current directory by default')
+        edit_parser.add_argument('--output-dir', default=None, help='write modified copies there instead')
+        edit_parser.set_defaults(handler=edit)
+
+    mix_parser = commands.add_parser('mix', help='climate of one run + land of another into a third')
+    mix_parser.add_argument('ids', type=int, nargs='*', help='CLIMATE_ID LAND_ID DEST_ID')
+    mix_parser.add_argument('--climate', type=int, nargs='+', default=None, help='climate run IDs (M)')
+    mix_parser.add_argument('--land', type=int, nargs='+', default=None, help='land run IDs (K)')
+    mix_parser.add_argument('--dest', type=int, nargs='+', default=None,
+                            help='M x K destination run IDs, climate-major')
+    mix_parser.set_defaults(handler=mix)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
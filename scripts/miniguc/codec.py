@@ -0,0 +1,157 @@
+'''
+Compression policy of the edited geo_em/met_em/wrfinput/wrfbdy files
+
+Most of these files are intermediates read once by metgrid.exe or real.exe,
+so recompressing them at zlib level 5 is usually wasted CPU time. A policy
+picks a preset for the whole file and optionally another one per variable.
+
+The preset of each kind of file can be set without editing the scripts with
+the MINIGUC_CODEC environment variable, e.g.
+    MINIGUC_CODEC=fast                          every file
+    MINIGUC_CODEC=met_em=none,wrfinput=archive  per kind of file
+
+zstd needs netCDF-C built with its plugin, without it the fast preset is
+written instead, with a warning.
+
+Run `python -m miniguc.codec <file>` from scripts/ to benchmark the presets.
+'''
+
+import os, sys, tempfile, time, warnings
+
+import netCDF4
+from netCDF4 import Dataset
+
+DEFAULT_COMPRESSION = {
+    'zlib': True,           # Lossless compression (optional)
+    'complevel': 5,         # Lossless compression (optional)
+    'shuffle': True,        # Lossless compression (optional)
+}
+
+PRESETS: dict[str, dict] = {
+    'none':     {'zlib': False},                                    # Scratch intermediates
+    'fast':     {'zlib': True, 'complevel': 1, 'shuffle': True},    # Staging
+    'zstd':     {'compression': 'zstd', 'complevel': 1, 'shuffle': True},
+    'default':  DEFAULT_COMPRESSION,                                # What the scripts always used
+    'archive':  {'zlib': True, 'complevel': 9, 'shuffle': True},    # Archival
+}
+
+# Written instead when netCDF-C lacks the filter of a preset (zstd needs it built with the plugin)
+FALLBACKS = {'zstd': 'fast'}
+# Presets whose fallback was already warned about
+WARNED: set[str] = set()
+
+def available(preset: str) -> str:
+    '''
+    The preset itself, or its fallback when netCDF-C can't write it, with a warning the first time
+    '''
+    if PRESETS[preset].get('compression') != 'zstd' or getattr(netCDF4, '__has_zstandard_support__', False):
+        return preset
+    if preset not in WARNED:
+        WARNED.add(preset)
+        warnings.warn(f'netCDF-C has no {preset} support, writing the {FALLBACKS[preset]} preset instead',
+                      RuntimeWarning, stacklevel=2)
+    return FALLBACKS[preset]
+
+def expected_filters(compression: dict) -> dict:
+    '''
+    Values of Variable.filters() a variable written with these compression arguments has
+    '''
+    method = compression.get('compression', 'zlib' if compression.get('zlib') else None)
+    expected = {
+        'zlib': method == 'zlib',
+        'zstd': method == 'zstd',
+        'shuffle': compression.get('shuffle', False),
+    }
+    if method is not None:
+        expected['complevel'] = compression.get('complevel', 4)
+    return expected
+
+class CodecPolicy:
+    '''
+    Compression preset of a file, optionally overridden per variable
+    '''
+
+    def __init__(self, default: str | dict = 'default', variables: dict[str, str | dict] | None = None) -> None:
+        '''
+        default     preset name (or raw createVariable arguments) used for every variable
+        variables   preset per variable name, e.g. {'LANDUSEF': 'archive'}
+        '''
+        for preset in [default, *(variables or {}).values()]:
+            if isinstance(preset, str) and preset not in PRESETS:
+                raise KeyError(f'Unknown compression preset {preset}, choose from {", ".join(PRESETS)}')
+        self.default = default
+        self.variables = variables or {}
+
+    def compression(self, var_name: str) -> dict:
+        '''
+        Keyword arguments of createVariable for a variable
+        '''
+        preset = self.variables.get(var_name, self.default)
+        return PRESETS[available(preset)] if isinstance(preset, str) else preset
+
+    def matches(self, variable: netCDF4.Variable) -> bool:
+        '''
+        Whether the variable is already stored the way this policy would write it
+        '''
+        filters = variable.filters() or {}
+        expected = expected_filters(self.compression(variable.name))
+        return all(filters.get(key, False) == value for key, value in expected.items())
+
+def as_policy(compression: CodecPolicy | dict | str) -> CodecPolicy:
+    '''
+    Accept a policy, a preset name or raw createVariable arguments
+    '''
+    return compression if isinstance(compression, CodecPolicy) else CodecPolicy(compression)
+
+def file_policy(file_kind: str, default: str | None) -> CodecPolicy | None:
+    '''
+    Policy of one kind of file, from MINIGUC_CODEC when it is set
+    file_kind   geo_em, met_em, wrfinput or wrfbdy
+    default     preset when MINIGUC_CODEC doesn't mention this kind of file,
+                None to keep the compression the file already has (in-place edits)
+    '''
+    presets = {}
+    for item in filter(None, os.environ.get('MINIGUC_CODEC', '').split(',')):
+        kind, _, preset = item.rpartition('=')
+        presets[kind.strip() or '*'] = preset.strip()
+
+    preset = presets.get(file_kind, presets.get('*', default))
+    return CodecPolicy(preset) if preset is not None else None
+
+def benchmark(file_name: str, presets: list[str] | None = None) -> list[dict]:
+    '''
+    Rewrite a file with every preset, reporting write time and size of each
+    file_name   path of a geo_em/met_em/wrfinput/wrfbdy file
+    presets     names of the presets to try, all by default
+    '''
+    from miniguc.engine import EditPlan, clone_dataset
+
+    results = []
+    with Dataset(file_name) as src, tempfile.TemporaryDirectory() as tmp_dir:
+        for preset in presets or list(PRESETS):
+            output_name = os.path.join(tmp_dir, f'{preset}.nc')
+            start = time.perf_counter()
+            clone_dataset(src, output_name, EditPlan(), note=f'Codec benchmark ({preset})', compression=preset)
+            results.append({
+                'preset': preset,
+                # Another preset when this one is not available, see FALLBACKS
+                'written_as': available(preset),
+                'write_seconds': time.perf_counter() - start,
+                'size_bytes': os.path.getsize(output_name),
+            })
+            os.remove(output_name)
+
+    original_size = os.path.getsize(file_name)
+    print(f'\n{"preset":<12}{"write (s)":>12}{"size (MB)":>12}{"vs input":>10}')
+    for result in results:
+        label = result['preset'] if result['written_as'] == result['preset'] \
+            else f'{result["preset"]}→{result["written_as"]}'
+        print(f'{label:<12}{result["write_seconds"]:>12.2f}'
+              f'{result["size_bytes"] / 1e6:>12.1f}{result["size_bytes"] / original_size:>10.2f}')
+    return results
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python -m miniguc.codec {FILE} [PRESET ...]')
+        sys.exit(0)
+    benchmark(sys.argv[1], sys.argv[2:] or None)
@@ -0,0 +1,234 @@
+'''
+Inspection helpers of the edit-data and wrfout notebooks
+matplotlib is only imported when something is drawn, so the edits run without it.
+The list_* helpers read the sidecar catalog of the file, see miniguc.catalog
+(list_urban_vars_min_max only its statistics when they are already there)
+
+plot_thumbnails draws every 2D/3D variable of a file as a small image, read
+with a stride so only about size x size points of each variable are decoded.
+Both the thumbnails and the rendered grid are cached under
+$MINIGUC_CACHE/thumbnails, keyed by file path, mtime and frame, so running
+the cell again on an unchanged file only shows the cached PNG:
+
+    plot_thumbnails('wrfinput_d01')
+    plot_before_after('wrfinput_d01', 'modified-files/wrfinput_d01')
+'''
+
+import hashlib, json, math, os
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.catalog import DEFAULT_BUDGET, load_catalog, read_catalog, variable_stats
+from miniguc.stage_cache import CACHE_DIR
+from miniguc.streaming import default_budget
+
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, 'thumbnails')
+
+def file_path(dataset: Dataset | str) -> str:
+    return dataset if isinstance(dataset, str) else dataset.filepath()
+
+def list_variables(dataset: Dataset | str, shapes: bool = False) -> None:
+    '''
+    List all variables in the nc dataset for adjustment, from the catalog of the file (see miniguc.catalog)
+    dataset:    netcdf dataset or file name
+    shapes:     also print the shape of every variable
+    '''
+    variables = load_catalog(file_path(dataset), stats=False)['variables']
+    print('\n'.join(f"{name}: {var['attributes'].get('description')} {tuple(var['dimensions'])}"
+                    + (f' {tuple(var["shape"])}' if shapes else '') for name, var in variables.items()))
+
+def list_landuse(dataset: Dataset | str) -> None:
+    attrs = load_catalog(file_path(dataset), stats=False)['attributes']
+    print(f"Land use category (MMINLU), check with WRF/LANDUSE.TBL: {attrs['MMINLU']}")
+    print(f"Land use category number (NUM_LAND_CAT): {attrs['NUM_LAND_CAT']}")
+    print(f"Water type index (ISWATER): {attrs['ISWATER']}")
+    print(f"Urban type index (ISURBAN): {attrs['ISURBAN']}")
+
+def list_urban_vars_min_max(dataset: Dataset | str) -> None:
+    '''
+    Mean and max of the urban parameters, from the catalog of the file when it has statistics,
+    otherwise from these variables only (a new catalog would read every variable of the file)
+    '''
+    urban_vars = ['MH_URB2D', 'ZD_URB2D', 'Z0_URB2D', 'BUILD_AREA_FRACTION', 'LF_URB2D_S', 'AHE']
+    catalog = read_catalog(file_path(dataset))
+    if catalog is not None and catalog['has_stats']:
+        stats = {var_name: catalog['variables'][var_name]['stats'] for var_name in urban_vars}
+    else:
+        with Dataset(file_path(dataset)) as src:
+            stats = {var_name: variable_stats(src[var_name], default_budget() or DEFAULT_BUDGET)
+                     for var_name in urban_vars}
+    for var_name in urban_vars:
+        print(f'{var_name}: mean = {stats[var_name]["mean"]} max = {stats[var_name]["max"]}')
+
+def plot_all_vars(dataset: Dataset, figsize: tuple[float, float] = (12, 12), title: str | None = None) -> None:
+    '''
+    First time (and level) of every 2D and 3D variable, 10 per row
+    '''
+    import matplotlib.pyplot as plt
+
+    cols_num, len_vars = 10, len(dataset.variables)
+    fig, axes = plt.subplots(math.ceil(len_vars / cols_num), cols_num, figsize=figsize)
+    idx: int = 0
+    for var in dataset.variables.values():
+        i, j = idx // cols_num, idx % cols_num
+        axes[i][j].tick_params(top=True, labeltop=True, bottom=False, labelbottom=False)
+        axes[i][j].set_title(var.name, x=0.5, y=0.35, fontweight="500", fontsize=6)
+        if j != 0: axes[i][j].set_yticklabels([])
+        if i != 0: axes[i][j].set_xticklabels([])
+        if len(var.shape) == 3: axes[i][j].contourf(var[0], cmap='Spectral')
+        elif len(var.shape) == 4: axes[i][j].contourf(var[0][0], cmap='Spectral')
+        else: continue
+        idx += 1
+    if title is not None: fig.suptitle(title)
+
+def file_key(file_name: str, frame: int, size: int) -> str:
+    '''
+    Cache key of the thumbnails of a file, changes whenever the file is written
+    '''
+    stat = os.stat(file_name)
+    content = f'{os.path.realpath(file_name)}:{stat.st_mtime_ns}:{stat.st_size}:{frame}:{size}'
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def thumbnail(var, frame: int, size: int) -> np.ndarray | None:
+    '''
+    First level of a (time, [level,] y, x) variable at frame, every n-th point so the
+    longest side is about size, None for variables that can't be drawn
+    '''
+    if var.ndim not in [3, 4] or var.dtype.kind not in 'iuf': return None
+    step = max(1, math.ceil(max(var.shape[-2:]) / size))
+    index = (min(frame, var.shape[0] - 1),) + (0,) * (var.ndim - 3) + (slice(None, None, step),) * 2
+    return np.ma.filled(np.ma.asarray(var[index], dtype=np.float32), np.nan)
+
+def load_thumbnails(file_name: str, frame: int = 0, size: int = 64) -> dict[str, np.ndarray]:
+    '''
+    Thumbnails of every variable by name, read once per file version
+    file_name   netCDF file, e.g. geo_em.d01.nc, wrfinput_d01 or wrfout
+    frame       time index (0-based)
+    size        about the number of points along the longest side
+    '''
+    cache_name = os.path.join(THUMBNAIL_DIR, file_key(file_name, frame, size) + '.npz')
+    if os.path.exists(cache_name):
+        with np.load(cache_name) as cached:
+            return {name: cached[name] for name in cached.files}
+
+    with Dataset(file_name) as dataset:
+        thumbnails = {name: thumbnail(var, frame, size) for name, var in dataset.variables.items()}
+    thumbnails = {name: values for name, values in thumbnails.items() if values is not None}
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    tmp_name = f'{cache_name}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_name, **thumbnails)
+    os.replace(tmp_name, cache_name)
+    return thumbnails
+
+def render_grid(panels: list[tuple[str, np.ndarray, float, float]], png_name: str, cols_num: int,
+                title: str | None) -> None:
+    '''
+    Draw (title, values, vmin, vmax) panels on a grid and save it as png_name
+    The panels are colored with numpy and tiled into one image, drawn with a single
+    imshow rather than one axes per variable, which is most of the time of a grid of 150+
+    '''
+    import matplotlib
+    import matplotlib.pyplot as plt
+
+    cmap = matplotlib.colormaps['Spectral']
+    label_height, gap = 10, 4
+    cell_height = max(values.shape[0] for _, values, _, _ in panels) + label_height + gap
+    cell_width = max(values.shape[1] for _, values, _, _ in panels) + gap
+    rows_num = math.ceil(len(panels) / cols_num)
+    mosaic = np.ones((rows_num * cell_height, cols_num * cell_width, 4))
+
+    labels = []
+    for idx, (name, values, vmin, vmax) in enumerate(panels):
+        i, j = idx // cols_num, idx % cols_num
+        # Rows flipped so south is at the bottom, as with origin='lower'
+        values = values[::-1]
+        scaled = (values - vmin) / (vmax - vmin) if vmax > vmin else np.full(values.shape, 0.5)
+        colors = cmap(scaled)
+        colors[~np.isfinite(values)] = (0.8, 0.8, 0.8, 1)
+        y, x = i * cell_height + label_height, j * cell_width
+        mosaic[y:y + values.shape[0], x:x + values.shape[1]] = colors
+        labels.append((x + values.shape[1] / 2, y - 1, name))
+
+    # Two pixels per thumbnail point
+    scale, dpi = 2, 100
+    fig = plt.figure(figsize=(mosaic.shape[1] * scale / dpi, (mosaic.shape[0] * scale + 30) / dpi), dpi=dpi)
+    ax = fig.add_axes((0, 0, 1, mosaic.shape[0] * scale / (mosaic.shape[0] * scale + 30)))
+    ax.imshow(mosaic, interpolation='nearest', aspect='auto')
+    ax.set_axis_off()
+    for x, y, name in labels:
+        ax.text(x, y, name, ha='center', va='bottom', fontsize=6, clip_on=True)
+    if title is not None: fig.suptitle(title, fontsize=10, y=1 - 8 / (mosaic.shape[0] * scale + 30))
+
+    os.makedirs(os.path.dirname(png_name), exist_ok=True)
+    fig.savefig(png_name, dpi=dpi)
+    # Shown from the PNG, so the next run can skip drawing
+    plt.close(fig)
+
+def value_range(*arrays: np.ndarray) -> tuple[float, float]:
+    finite = [values[np.isfinite(values)] for values in arrays]
+    finite = [values for values in finite if values.size > 0]
+    if len(finite) == 0: return 0.0, 1.0
+    return float(min(values.min() for values in finite)), float(max(values.max() for values in finite))
+
+def show(png_name: str) -> str:
+    '''
+    Display a PNG in the notebook, returns its path (e.g. to open it outside of Jupyter)
+    '''
+    try:
+        from IPython.display import Image, display
+        display(Image(filename=png_name))
+    except ImportError:
+        pass
+    return png_name
+
+def cached_grid(keys: list[str], options: dict) -> tuple[str, bool]:
+    '''
+    Path of the PNG of a grid, and whether it is already rendered
+    '''
+    key = hashlib.sha256(json.dumps([keys, options], sort_keys=True).encode()).hexdigest()
+    png_name = os.path.join(THUMBNAIL_DIR, f'{key}.png')
+    return png_name, os.path.exists(png_name)
+
+def plot_thumbnails(file_name: str, frame: int = 0, size: int = 64, cols_num: int = 10) -> str:
+    '''
+    Thumbnail of every 2D and 3D variable of a file, see load_thumbnails
+    Returns the path of the cached PNG
+    '''
+    title = f'{os.path.basename(file_name)}, frame {frame + 1} (1-index)'
+    png_name, rendered = cached_grid([file_key(file_name, frame, size)], {'cols': cols_num, 'title': title})
+    if not rendered:
+        thumbnails = load_thumbnails(file_name, frame, size)
+        panels = [(name, values, *value_range(values)) for name, values in thumbnails.items()]
+        render_grid(panels, png_name, cols_num, title)
+    return show(png_name)
+
+def plot_before_after(before_name: str, after_name: str, frame: int = 0, size: int = 64, cols_num: int = 10,
+                      changed_only: bool = False) -> str | None:
+    '''
+    Thumbnails of a file before and after an edit, side by side with the same color scale
+    Edited variables are marked with *
+    cols_num        panels per row, rounded down to an even number (at least 2) to keep the pairs together
+    changed_only    only draw the edited variables
+    Returns the path of the cached PNG, None when changed_only and nothing changed
+    '''
+    cols_num = max(2, cols_num - cols_num % 2)
+    title = f'{os.path.basename(before_name)} before | after, frame {frame + 1} (1-index)'
+    keys = [file_key(before_name, frame, size), file_key(after_name, frame, size)]
+    png_name, rendered = cached_grid(keys, {'cols': cols_num, 'title': title, 'changed_only': changed_only})
+    if not rendered:
+        before, after = load_thumbnails(before_name, frame, size), load_thumbnails(after_name, frame, size)
+        panels = []
+        for name in [name for name in after if name in before]:
+            changed = before[name].shape != after[name].shape or not np.array_equal(before[name], after[name],
+                                                                                  equal_nan=True)
+            if changed_only and not changed: continue
+            vmin, vmax = value_range(before[name], after[name])
+            marker = '*' if changed else ''
+            panels += [(f'{name}{marker}', before[name], vmin, vmax), ('after', after[name], vmin, vmax)]
+        if len(panels) == 0:
+            print(f'No variable of {os.path.basename(after_name)} differs from {before_name}')
+            return None
+        render_grid(panels, png_name, cols_num, title)
+    return show(png_name)
@@ -0,0 +1,99 @@
+'''
+Nested domains (d01, d02, ...) of geo_em, met_em and wrfinput files
+
+Each domain knows where it sits in its parent (parent_grid_ratio and
+i/j_parent_start), so a region defined once, either in d01 grid indices or in
+lat/lon, lands on the same area of every nest:
+
+    domains = load_domains(sorted(glob('geo_em.d*')))
+    mask = domains[grid_id(src)].mask(Rectangle(center=(50, 50), size=(20, 20)))
+'''
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.masks import LatLonRegion, Mask, Raster
+
+def attribute(dataset: Dataset, name: str, default=None):
+    '''
+    Global attribute regardless of case, geo_em and met_em use grid_id where wrfinput uses GRID_ID
+    '''
+    attrs = {key.upper(): value for key, value in dataset.__dict__.items()}
+    return attrs.get(name.upper(), default)
+
+def grid_id(dataset: Dataset) -> int:
+    return int(attribute(dataset, 'GRID_ID', 1))
+
+class Domain:
+    '''
+    Grid of one domain and its position in its parent
+    grid_id         domain number, 1 for d01
+    parent          parent domain, None for d01
+    ratio           parent_grid_ratio
+    i_parent_start  west_east index (1-based) of the parent cell holding the first cell
+    j_parent_start  south_north index (1-based) of the parent cell holding the first cell
+    shape           (south_north, west_east)
+    lat, lon        XLAT and XLONG of the cell centres, needed for lat/lon regions
+    '''
+
+    def __init__(self, grid_id: int, parent: 'Domain | None', ratio: int, i_parent_start: int, j_parent_start: int,
+                 shape: tuple[int, int], lat: np.ndarray | None = None, lon: np.ndarray | None = None) -> None:
+        self.grid_id, self.parent, self.ratio = grid_id, parent, ratio
+        self.i_parent_start, self.j_parent_start = i_parent_start, j_parent_start
+        self.shape, self.lat, self.lon = shape, lat, lon
+
+    @classmethod
+    def from_dataset(cls, dataset: Dataset, parent: 'Domain | None' = None) -> 'Domain':
+        lat_name = next((name for name in ['XLAT_M', 'XLAT'] if name in dataset.variables), None)
+        lon_name = next((name for name in ['XLONG_M', 'XLONG'] if name in dataset.variables), None)
+        return cls(
+            grid_id(dataset), parent,
+            int(attribute(dataset, 'PARENT_GRID_RATIO', 1)),
+            int(attribute(dataset, 'I_PARENT_START', 1)),
+            int(attribute(dataset, 'J_PARENT_START', 1)),
+            (len(dataset.dimensions['south_north']), len(dataset.dimensions['west_east'])),
+            dataset.variables[lat_name][0][:] if lat_name else None,
+            dataset.variables[lon_name][0][:] if lon_name else None,
+        )
+
+    def to_root(self, y: np.ndarray, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        d01 grid coordinates (0-based, fractional) of points in this grid
+        '''
+        if self.parent is None: return y, x
+        # The first nest cell starts on the south-west edge of parent cell (j_parent_start, i_parent_start)
+        parent_y = self.j_parent_start - 1.5 + (y + 0.5) / self.ratio
+        parent_x = self.i_parent_start - 1.5 + (x + 0.5) / self.ratio
+        return self.parent.to_root(parent_y, parent_x)
+
+    def mask(self, region: Mask | LatLonRegion) -> Mask:
+        '''
+        Region on this grid
+        region  mask in d01 grid indices, or a lat/lon region
+        '''
+        if isinstance(region, LatLonRegion):
+            if self.lat is None: raise ValueError(f'No XLAT/XLONG for lat/lon masks on domain d{self.grid_id:02}')
+            return region.on_grid(self.lat, self.lon)
+        if self.parent is None: return region
+        y, x = np.ogrid[:self.shape[0], :self.shape[1]]
+        return Raster(np.broadcast_to(region.contains(*self.to_root(y, x)), self.shape))
+
+def load_domains(file_names: list[str]) -> dict[int, Domain]:
+    '''
+    Domains of one file per domain (e.g. geo_em.d01.nc, geo_em.d02.nc), by grid id
+    '''
+    datasets = {}
+    for file_name in file_names:
+        dataset = Dataset(file_name)
+        datasets[grid_id(dataset)] = dataset
+
+    # Parents always have a smaller grid id than their nests
+    domains: dict[int, Domain] = {}
+    for domain_id in sorted(datasets):
+        parent_id = int(attribute(datasets[domain_id], 'PARENT_ID', 0))
+        parent = domains.get(parent_id) if parent_id not in [0, domain_id] else None
+        if parent is None and parent_id not in [0, domain_id]:
+            raise ValueError(f'Domain d{domain_id:02} given without its parent d{parent_id:02}')
+        domains[domain_id] = Domain.from_dataset(datasets[domain_id], parent)
+        datasets[domain_id].close()
+    return domains
@@ -0,0 +1,54 @@
+'''
+Edits of the idealized runs, one module per kind of file
+
+Each module has the modify_* functions and the build_plan of one of the
+scripts in scripts/edit-data, and a run(file_names, output_dir=None) applying
+them. Run them with `miniguc-edit geogrid|metgrid|wrfinput|wrfbdy|mix`, or
+from the notebooks, which only keep the inspection and plotting cells.
+'''
+
+from functools import partial
+from typing import Callable
+import os
+
+from netCDF4 import Dataset
+
+from miniguc.codec import file_policy
+from miniguc.engine import EditPlan, clone_dataset, edit_in_place
+from miniguc.parallel import for_each_file, process_files
+
+PlanBuilder = Callable[[Dataset], EditPlan]
+
+def edit_file(file_name: str, build_plan: PlanBuilder, note: str, compression: str | dict | None) -> None:
+    edit_in_place(file_name, build_plan, note=note, compression=compression)
+
+def clone_file(input_name: str, output_name: str, build_plan: PlanBuilder, note: str,
+               compression: str | dict) -> None:
+    with Dataset(input_name, 'r', format='NETCDF4') as src:
+        clone_dataset(src, output_name, build_plan(src), note=note, compression=compression)
+
+def edit_files(build_plan: PlanBuilder, file_names: list[str], note: str, file_kind: str,
+               output_dir: str | None = None, in_place: bool = True, compression: str | None = None,
+               clone_compression: str = 'fast') -> None:
+    '''
+    Apply the plan of every file on a pool of workers (MINIGUC_WORKERS)
+    build_plan          function creating the plan of an opened file, module level (or a partial of one)
+    file_names          files to edit, e.g. one per domain
+    note                note to add to the global attributes
+    file_kind           geo_em, met_em, wrfinput or wrfbdy, for MINIGUC_CODEC
+    output_dir          write modified copies there instead of editing the files
+    in_place            edit only the modified variables in the files themselves, otherwise
+                        rewrite each file and replace it once complete
+    compression         preset when editing the files themselves, None to keep theirs
+    clone_compression   preset of rewritten files and copies
+    '''
+    if output_dir is None and in_place:
+        edit = partial(edit_file, build_plan=build_plan, note=note, compression=file_policy(file_kind, compression))
+        for_each_file(edit, file_names)
+        return
+
+    output_names = file_names if output_dir is None else [
+        os.path.join(output_dir, os.path.basename(file_name)) for file_name in file_names
+    ]
+    clone = partial(clone_file, build_plan=build_plan, note=note, compression=file_policy(file_kind, clone_compression))
+    process_files(clone, file_names, output_names)
@@ -0,0 +1,214 @@
+'''
+Edits of geo_em.d*.nc (geogrid.exe output): uniform land, urban patch and urban parameters
+'''
+
+from functools import partial
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.domains import Domain, grid_id, load_domains
+from miniguc.edits import edit_files
+from miniguc.engine import EditPlan, plan_step
+from miniguc.expressions import add_script
+from miniguc.kernels import HorizontalMean, Paint, ahe_profile
+from miniguc.masks import Mask, Rectangle
+
+@plan_step
+def modify_convert_uniform(plan: EditPlan, var_names: list[str]) -> EditPlan:
+    '''
+    Convert all variables in the src file to uniform average
+    plan        edit plan of the output file
+    var_names   list of variable names to average
+    '''
+    # Every axis except time is averaged, including levels and months
+    return plan.add(var_names, HorizontalMean(start_axis=1))
+
+@plan_step
+def modify_map_factor(plan: EditPlan, src: Dataset) -> EditPlan:
+    '''
+    Adjust map factor to 1
+    plan        edit plan of the output file
+    src         source dataset
+    '''
+    for var_name in src.variables.keys():
+        if var_name.split('_')[0] == 'MAPFAC':
+            plan.set(var_name, 1)
+
+    return plan
+
+WATER_CUTOFF_IDX = 50
+URBAN_SIZE = (20, 20)
+# In d01 grid indices, see miniguc.masks for disks, polygons or several cities,
+# e.g. Disk((30, 30), 5) | Disk((70, 60), 8), or lat/lon regions, e.g. LatLonDisk((35.7, 139.7), 10)
+# Nests get the same area through their parent_grid_ratio and i/j_parent_start
+urban_mask = Rectangle(center=(50, 50), size=URBAN_SIZE)
+
+@plan_step
+def modify_landuse(plan: EditPlan, src: Dataset, urban_mask: Mask) -> EditPlan:
+    '''
+    Modify the land use category
+    plan        edit plan of the output file
+    src         source dataset
+    urban_mask  urban area on the grid of src
+    '''
+    attrs = src.__dict__
+    land_use_cat = {
+        'urban': attrs['ISURBAN'],         # Urban and Built-up Land
+        'water': attrs['ISWATER'],        # Water Bodies
+        'grassland': 10,     # Grassland
+        'barren': 16,     # Barren or sparsely vegetated
+        'forest': 5,     # Mixed Forests
+    }
+
+    rural_land_type = 'grassland'
+
+    # Modify the land use index. To check the variables,
+    # see LANDUSE.TBL and num_land_cat in namelist.input
+    # 24 - for USGS (default); 20 for MODIS
+    # 28 - for USGS if including lake category
+    # 21 - for MODIS if including lake category (default since 3.8)
+    # 40 - for NCLD
+    # Currently using USGS (num_land_cat = 24)
+    def landuse_index(modified_lu: np.ndarray) -> np.ndarray:
+        modified_lu[0][:] = land_use_cat[rural_land_type]
+        urban_mask.fill(modified_lu[0], land_use_cat['urban'])
+        return modified_lu
+
+    plan.add('LU_INDEX', landuse_index)
+
+    # Modify land mask, 1 for land, 0 for water
+    def landmask(modified_landmask: np.ndarray) -> np.ndarray:
+        modified_landmask[0][:] = 1 # Land
+        return modified_landmask
+
+    plan.add('LANDMASK', landmask)
+
+    # Modify land use fraction
+    # https://forum.mmm.ucar.edu/threads/difference-between-landusef-and-frc_urb2d.10455/
+    # Basically you need to modify the fraction of land to the corresponding
+    # array index
+    # !!!!! IMPORTANT: The index is 0-indexed, so it should be the value in LANDUSE minus 1 !!!!!
+    def landuse_fraction(modified_landusef: np.ndarray) -> np.ndarray:
+        modified_landusef[:] = 0 # Reset everything, probably easier
+        modified_landusef[0][land_use_cat[rural_land_type] - 1][:] = 1.0
+
+        # No grassland here
+        urban_mask.fill(modified_landusef[0][land_use_cat[rural_land_type] - 1], 0)
+        urban_mask.fill(modified_landusef[0][land_use_cat['urban'] - 1], 1.0)
+        return modified_landusef
+
+    return plan.add('LANDUSEF', landuse_fraction)
+
+# modify_landuse and modify_height as a scenario, see miniguc.expressions
+LANDUSE_SCENARIO = '''
+LU_INDEX[0] := grassland; LU_INDEX[0, urban] := ISURBAN
+LANDMASK[0] := 1
+LANDUSEF := 0; LANDUSEF[0, grassland - 1] := 1
+LANDUSEF[0, grassland - 1, urban] := 0; LANDUSEF[0, ISURBAN - 1, urban] := 1
+HGT_M := 0
+'''
+
+@plan_step
+def modify_landuse_scenario(plan: EditPlan, src: Dataset, urban_mask: Mask, scenario: str = LANDUSE_SCENARIO) -> EditPlan:
+    '''
+    Land use and terrain from a scenario instead of modify_landuse and modify_height
+    plan        edit plan of the output file
+    src         source dataset
+    urban_mask  urban area on the grid of src, the urban mask of the scenario
+    scenario    assignments, see miniguc.expressions
+    '''
+    return add_script(plan, scenario, src, masks={'urban': urban_mask})
+
+@plan_step
+def modify_height(plan: EditPlan) -> EditPlan:
+    '''
+    Modify terrain height of input file
+    plan    edit plan of the output file
+    '''
+    return plan.set('HGT_M', 0)
+
+@plan_step
+def modify_urban_area(plan: EditPlan, urban_mask: Mask) -> EditPlan:
+    '''
+    Modify urban related variables
+    plan        edit plan of the output file
+    urban_mask  urban area on the grid of the file
+    '''
+    urban_vars = [
+        ('MH_URB2D',            10   ),
+        ('ZD_URB2D',            3   ),
+        ('Z0_URB2D',            1 ),
+        ('BUILD_AREA_FRACTION', 0.25 ),
+        ('LF_URB2D_S',          0.25 ),
+    ]
+    # Zero outside the urban area, value inside, for every time step at once
+    for var_name, value in urban_vars:
+        plan.add(var_name, Paint(urban_mask, value))
+
+    # Modify AHE, optionally with 24 hourly and 12 monthly factors along the month_hour axis
+    ahe_value = 100
+    ahe_diurnal: list[float] | None = None
+    ahe_monthly: list[float] | None = None
+    ahe = ahe_profile(ahe_value, ahe_diurnal, ahe_monthly)
+
+    return plan.add('AHE', Paint(urban_mask, ahe[:, None]))
+
+@plan_step
+def modify_urban_zero(plan: EditPlan) -> EditPlan:
+    return plan.set(['MH_URB2D', 'Z0_URB2D', 'ZD_URB2D', 'BUILD_AREA_FRACTION', 'LF_URB2D_S', 'AHE'], 0)
+
+@plan_step
+def modify_cos_sin_a(plan: EditPlan) -> EditPlan:
+    plan.set('COSALPHA', 1)
+    plan.set('SINALPHA', 0)
+
+    plan.set('COSALPHA_U', 1)
+    plan.set('SINALPHA_U', 0)
+    plan.set('COSALPHA_V', 1)
+    plan.set('SINALPHA_V', 0)
+
+    plan.set('E', 0)
+    plan.set('F', 0)
+    return plan
+
+def build_plan(src: Dataset, domains: dict[int, Domain]) -> EditPlan:
+    '''
+    Register the modifications, see functions above.
+    Nothing is read or written until the plan is applied
+    src     source dataset
+    domains domains of all the files, see miniguc.domains
+    '''
+    var_names = [
+        'SOILTEMP', 'SOILCTOP', 'SCT_DOM', 'SOILCBOT',
+        'SCB_DOM', 'ALBEDO12M', 'GREENFRAC', 'LAI12M',
+        'SNOALB', 'CON', 'VAR', 'OA1', 'OA2', 'OA3', 'OA4',
+        'OL1', 'OL2', 'OL3', 'OL4', 'VAR_SSO',
+        # 'XLAT_M', 'XLONG_M',
+    ]
+
+    # Computed once per domain and reused by every variable
+    domain_mask = domains[grid_id(src)].mask(urban_mask)
+
+    plan = EditPlan()
+    plan = modify_convert_uniform(plan, var_names)
+
+    plan = modify_landuse(plan, src, domain_mask)
+    plan = modify_height(plan)
+    # plan = modify_landuse_scenario(plan, src, domain_mask)
+    plan = modify_map_factor(plan, src)
+    # plan = modify_urban_zero(plan)
+    plan = modify_urban_area(plan, domain_mask)
+    plan = modify_cos_sin_a(plan)
+    return plan
+
+NOTE = 'Idealized Urban-barren by Mok'
+
+def run(file_names: list[str], output_dir: str | None = None) -> None:
+    '''
+    Edit the geo_em file of every domain, in place or into copies in output_dir
+    '''
+    domains = load_domains(file_names)
+    # geo_em is only read once by metgrid.exe, no need to compress it
+    edit_files(partial(build_plan, domains=domains), file_names, NOTE, 'geo_em', output_dir,
+               compression='none', clone_compression='none')
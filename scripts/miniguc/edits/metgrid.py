@@ -0,0 +1,58 @@
+'''
+Edits of met_em.d*.nc (metgrid.exe output): uniform meteorology, averaged over land for the soil
+'''
+
+from netCDF4 import Dataset
+
+from miniguc.edits import edit_files
+from miniguc.engine import EditPlan, plan_step
+from miniguc.kernels import HorizontalMean
+
+@plan_step
+def modify_convert_uniform(plan: EditPlan, var_names: list[str]) -> EditPlan:
+    '''
+    Convert all variables in the src file to uniform average
+    plan        edit plan of the output file
+    var_names   list of variable names to average
+    '''
+    return plan.add(var_names, HorizontalMean())
+
+@plan_step
+def modify_convert_uniform_land(plan: EditPlan, src: Dataset, var_names: list[str]) -> EditPlan:
+    '''
+    Convert all variables in the src file to uniform average only on land
+    plan        edit plan of the output file
+    src         source dataset
+    var_names   list of variable names to average
+    '''
+    mask_array = src.variables['LANDMASK'][0][:] == 1
+
+    return plan.add(var_names, HorizontalMean(mask_array))
+
+def build_plan(src: Dataset) -> EditPlan:
+    '''
+    Register the modifications, see functions above
+    src     source dataset
+    '''
+    # landsea?
+    var_names = ['PRES', 'GHT', 'HGTTROP', 'TTROP', 'PTROPNN', 'PTROP', 'VTROP', 'UTROP', 'HGTMAXW', 'TMAXW',
+                 'PMAXWNN', 'PMAXW', 'VMAXW', 'UMAXW', 'SKINTEMP', 'SOILHGT', 'PSFC', 'RH', 'VV', 'UU', 'TT',
+                 'PMSL', 'VAR_SSO', 'OL4', 'OL3', 'OL2', 'OL1', 'OA4', 'OA3', 'OA2', 'OA1', 'VAR', 'CON']
+
+    var_names_land = ['SM', 'ST', 'ST100200', 'ST040100', 'ST010040', 'ST000010',
+                      'SM100200', 'SM040100', 'SM010040', 'SM000010', 'SNOW', 'SNOWH']
+
+    plan = EditPlan()
+    plan = modify_convert_uniform(plan, var_names)
+    plan = modify_convert_uniform_land(plan, src, var_names_land)
+    landmask = src.variables['LANDMASK'][:]
+    return plan.add('LANDSEA', lambda _: landmask)
+
+NOTE = 'Idealized Urban grassland by Mok'
+
+def run(file_names: list[str], output_dir: str | None = None) -> None:
+    '''
+    Edit every met_em file, replacing it (or into copies in output_dir) once complete
+    '''
+    # met_em is only read once by real.exe, no need to compress it
+    edit_files(build_plan, file_names, NOTE, 'met_em', output_dir, in_place=False, clone_compression='none')
@@ -0,0 +1,144 @@
+'''
+Mix of runs: the climate (winds, temperature, moisture, ...) of one run with
+the land of another, for wrfinput_d01 and wrfbdy_d01
+
+run_batch writes every combination of M climate runs and K land runs. Each
+variable is read once from each source file, a climate variable of climate run
+m goes to the K outputs (m, *) and a land variable of land run k to the M
+outputs (*, k), so every output variable is written exactly once.
+'''
+
+from glob import glob
+import os
+
+from netCDF4 import Dataset
+
+from miniguc.codec import file_policy
+from miniguc.engine import EditPlan, copy_structure
+from miniguc.streaming import copy_to_many, default_budget
+
+CLIMATE_VARS = [
+    'U', 'V', 'W', 'T', 'THM', 'T_INIT', 'MU', 'MUB', 'P',
+    'AL', 'ALB', 'PB', 'T_BASE', 'Q2', 'T2', 'TH2', 'PSFC',
+    'U10', 'V10', 'QVAPOR', 'QCLOUD', 'QRAIN', 'QICE', 'QSNOW',
+    'QGRAUP', 'QNICE', 'QNRAIN', 'qke_adv', 'FCX', 'GCX',
+    'U_BASE', 'V_BASE', 'QV_BASE', 'U_FRAME', 'V_FRAME', 'P_TOP',
+    'T00', 'P00', 'P_STRAT', 'CLDFRA', 'QSFC_MOSAIC', 'SST', 'PC'
+]
+
+# wrfinput case uses the names as is, wrfbdy case has the boundary suffixes
+SUFFIXES = ['', '_BXS', '_BXE', '_BYS', '_BYE', '_BTXS', '_BTXE', '_BTYS', '_BTYE']
+
+# File kind: pattern of the source file in a run directory
+FILES = {'wrfinput': 'wrfin*', 'wrfbdy': 'wrfbdy*'}
+
+def climate_var_names(land_ds: Dataset) -> list[str]:
+    '''
+    Names of the climate variables present in a file, with their boundary suffixes
+    '''
+    return [var_name + suffix for var_name in CLIMATE_VARS for suffix in SUFFIXES
+            if var_name + suffix in land_ds.variables]
+
+def default_note(climate_dir: str, land_dir: str) -> str:
+    return f'Climate from {os.path.basename(os.path.normpath(climate_dir))} ' \
+           f'+ Land from {os.path.basename(os.path.normpath(land_dir))}'
+
+def check_variables(land_datasets: list[Dataset]) -> None:
+    '''
+    Make sure every land file has the same variables, the outputs of each get the variables of the first
+    '''
+    var_names = set(land_datasets[0].variables)
+    mismatches = [
+        f'{land_ds.filepath()} ({", ".join(sorted(set(land_ds.variables) ^ var_names))})'
+        for land_ds in land_datasets[1:] if set(land_ds.variables) != var_names
+    ]
+    if len(mismatches) > 0:
+        raise ValueError(f'Land files with other variables than {land_datasets[0].filepath()}: {", ".join(mismatches)}')
+
+def check_shapes(climate_datasets: list[Dataset], land_datasets: list[Dataset], var_names: list[str]) -> None:
+    '''
+    Make sure every climate variable fits every land file before anything is written
+    '''
+    mismatches = [
+        f'{var_name} {climate_ds.filepath()}'
+        for climate_ds in climate_datasets for land_ds in land_datasets for var_name in var_names
+        if var_name not in climate_ds.variables or climate_ds[var_name].shape != land_ds[var_name].shape
+    ]
+    if len(mismatches) > 0:
+        raise ValueError(f'Climate variables missing or of another shape than the land file: {", ".join(mismatches)}')
+
+def tmp_name(output_name: str) -> str:
+    output_dir, file_name = os.path.split(os.path.abspath(output_name))
+    return os.path.join(output_dir, f'.{file_name}.mix.tmp')
+
+def mix_batch(climate_names: list[str], land_names: list[str], output_names: list[list[str]],
+              file_kind: str, notes: list[list[str]], memory_budget: int | None = None) -> None:
+    '''
+    Write output_names[m][k] from climate file m and land file k, reading every source once
+    climate_names   climate source files (M)
+    land_names      land source files (K), the outputs get their structure and attributes
+    output_names    M lists of K output paths
+    file_kind       wrfinput or wrfbdy, for the compression policy
+    notes           M lists of K notes for the global attributes
+    memory_budget   bytes of a variable held in memory at once, MINIGUC_MEMORY by default
+    '''
+    budget = memory_budget or default_budget()
+    policy = file_policy(file_kind, 'fast')
+    climate_datasets = [Dataset(name) for name in climate_names]
+    land_datasets = [Dataset(name) for name in land_names]
+    outputs: list[list[Dataset]] = [[] for _ in output_names]
+    complete = False
+    try:
+        check_variables(land_datasets)
+        var_names = climate_var_names(land_datasets[0])
+        check_shapes(climate_datasets, land_datasets, var_names)
+
+        # Written next to their destination, renamed once all of them are complete
+        for m, row in enumerate(output_names):
+            for k, output_name in enumerate(row):
+                outputs[m].append(Dataset(tmp_name(output_name), 'w', format='NETCDF4'))
+                copy_structure(land_datasets[k], outputs[m][k], EditPlan(), notes[m][k], policy)
+
+        climate = set(var_names)
+        for var_name in land_datasets[0].variables:
+            print(f'Mixing {var_name}...', end='\r')
+            if var_name in climate:
+                for m, climate_ds in enumerate(climate_datasets):
+                    copy_to_many(climate_ds[var_name], [out[var_name] for out in outputs[m]], budget)
+            else:
+                for k, land_ds in enumerate(land_datasets):
+                    copy_to_many(land_ds[var_name], [row[k][var_name] for row in outputs], budget)
+        complete = True
+    finally:
+        for dataset in climate_datasets + land_datasets + [out for row in outputs for out in row]:
+            dataset.close()
+        for output_name in [name for row in output_names for name in row]:
+            if complete: os.replace(tmp_name(output_name), output_name)
+            elif os.path.exists(tmp_name(output_name)): os.remove(tmp_name(output_name))
+
+def run_batch(climate_dirs: list[str], land_dirs: list[str], dest_dirs: list[list[str]],
+              notes: list[list[str]] | None = None) -> None:
+    '''
+    Write wrfinput_d01 and wrfbdy_d01 of dest_dirs[m][k] from climate run m and land run k
+    Raises FileExistsError rather than overwriting a file of a destination
+    '''
+    notes = notes or [[default_note(climate_dir, land_dir) for land_dir in land_dirs] for climate_dir in climate_dirs]
+    for file_kind in FILES:
+        output_names = [[os.path.join(dest_dir, f'{file_kind}_d01') for dest_dir in row] for row in dest_dirs]
+        existing = [name for row in output_names for name in row if os.path.exists(name)]
+        if len(existing) > 0:
+            raise FileExistsError(f'{file_kind} file already exists: {", ".join(existing)}')
+
+    for file_kind, pattern in FILES.items():
+        print(f'Modifying {file_kind} ({len(climate_dirs)} climate x {len(land_dirs)} land)')
+        output_names = [[os.path.join(dest_dir, f'{file_kind}_d01') for dest_dir in row] for row in dest_dirs]
+        mix_batch([glob(os.path.join(climate_dir, pattern))[0] for climate_dir in climate_dirs],
+                  [glob(os.path.join(land_dir, pattern))[0] for land_dir in land_dirs],
+                  output_names, file_kind, notes)
+
+def run(climate_dir: str, land_dir: str, dest_dir: str, note: str | None = None) -> None:
+    '''
+    Write wrfinput_d01 and wrfbdy_d01 of dest_dir from the runs in climate_dir and land_dir
+    Raises FileExistsError rather than overwriting a file of dest_dir
+    '''
+    run_batch([climate_dir], [land_dir], [[dest_dir]], [[note or default_note(climate_dir, land_dir)]])
@@ -0,0 +1,109 @@
+'''
+Edits of wrfbdy_d01 (real.exe output): boundaries averaged along the edges, without wind
+'''
+
+from datetime import datetime
+
+from netCDF4 import Dataset, chartostring
+import numpy as np
+
+from miniguc.edits import edit_files
+from miniguc.engine import EditPlan, plan_step
+from miniguc.kernels import boundary_tendency, horizontal_mean
+
+def boundary_interval(src: Dataset) -> float | None:
+    '''
+    Seconds between two boundary times, None if the file only has one
+    src:    A read file pointer to source/input file
+    '''
+    times = [datetime.strptime(str(time), '%Y-%m-%d_%H:%M:%S') for time in chartostring(src.variables['Times'][:])]
+    return (times[1] - times[0]).total_seconds() if len(times) > 1 else None
+
+@plan_step
+def modify_average_z_layers(plan: EditPlan, src: Dataset, var_names: list[str]) -> EditPlan:
+    '''
+    A function to average all variables in each Z-layer
+    plan:       edit plan of the output file
+    src:        A read file pointer to source/input file
+    var_names:  list of variable names to average
+    '''
+    # All times, widths and layers are averaged with one reduction along the boundary,
+    # then the tendencies (X_BT*) are recomputed from the averaged values (X_B*).
+    # The file stores X_B* before X_BT*, so the averaged values are kept until then
+    interval = boundary_interval(src)
+    averaged: dict[str, np.ndarray] = {}
+
+    def average(var_name: str):
+        def edit(values: np.ndarray) -> np.ndarray:
+            averaged[var_name] = horizontal_mean(values, start_axis=-1)
+            return averaged[var_name]
+
+        return edit
+
+    def average_tendency(values_name: str):
+        def edit(tendency: np.ndarray) -> np.ndarray:
+            tendency = horizontal_mean(tendency, start_axis=-1)
+            if interval is None or values_name not in var_names:
+                return tendency
+            # Never read back from src, which is the file being edited when editing in place
+            if values_name not in averaged:
+                raise ValueError(f'{values_name} must be averaged before its tendency, check the variable order')
+            return boundary_tendency(averaged.pop(values_name), tendency, interval)
+
+        return edit
+
+    for var_name in var_names:
+        prefix, _, suffix = var_name.rpartition('_')
+        if suffix.startswith('BT'):
+            plan.add(var_name, average_tendency(f'{prefix}_B{suffix[2:]}'))
+        else:
+            plan.add(var_name, average(var_name))
+
+    return plan
+
+@plan_step
+def modify_remove_wind(plan: EditPlan, src: Dataset) -> EditPlan:
+    '''
+    A function to remove boundary condition wind
+    plan:   edit plan of the output file
+    src:    A read file pointer to source/input file
+    '''
+    for var_name in src.variables.keys():
+        if (var_name.split('_')[0] in ['U', 'V', 'W']):
+            plan.set(var_name, 0.0)
+    return plan
+
+@plan_step
+def modify_reduce_vapor(plan: EditPlan, src: Dataset) -> EditPlan:
+    reduction_factor = 0.01
+    for var_name in src.variables.keys():
+        initial = var_name.split('_')[0]
+        if initial == 'QVAPOR':
+            plan.add(var_name, lambda values: values * reduction_factor)
+    return plan
+
+def build_plan(src: Dataset) -> EditPlan:
+    '''
+    Register the modifications, see functions above
+    src:    A read file pointer to source/input file
+    '''
+    var_names = []
+    for var_name in src.variables.keys():
+        initial = var_name.split('_')[0]
+        if initial in ['PH', 'T', 'QVAPOR']:
+            var_names.append(var_name)
+
+    plan = EditPlan()
+    plan = modify_average_z_layers(plan, src, var_names)
+    plan = modify_remove_wind(plan, src)
+    plan = modify_reduce_vapor(plan, src)
+    return plan
+
+NOTE = 'Average Top-bottom direction by Mok'
+
+def run(file_names: list[str], output_dir: str | None = None) -> None:
+    '''
+    Edit wrfbdy_d01 in place, or into a copy in output_dir
+    real.exe only writes boundaries for d01, nests get theirs from their parent
+    '''
+    edit_files(build_plan, file_names, NOTE, 'wrfbdy', output_dir)
@@ -0,0 +1,116 @@
+'''
+Edits of wrfinput_d* (real.exe output): calm, uniform initial state and urban parameters
+'''
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.edits import edit_files
+from miniguc.engine import EditPlan, plan_step
+from miniguc.ensemble import perturbation
+from miniguc.kernels import HorizontalMean
+from miniguc.masks import LandUse
+
+@plan_step
+def modify_convert_uniform(plan: EditPlan, var_names: list[str]) -> EditPlan:
+    '''
+    Convert all variables in the src file to uniform average
+    plan        edit plan of the output file
+    var_names   list of variable names to average
+    '''
+    return plan.add(var_names, HorizontalMean())
+
+@plan_step
+def modify_water_depth(plan: EditPlan) -> EditPlan:
+    def water_depth(modified_water_depth: np.ndarray) -> np.ndarray:
+        modified_water_depth[0][:, :] = -10.0
+        return modified_water_depth
+
+    return plan.add('WATER_DEPTH', water_depth)
+
+@plan_step
+def modify_remove_initial_wind(plan: EditPlan) -> EditPlan:
+    return plan.set(['U', 'U10', 'V', 'V10', 'W'], 0)
+
+@plan_step
+def modify_random_initial_winds(plan: EditPlan, seed: int | None = None, length_scale: float | None = None) -> EditPlan:
+    '''
+    Replace the initial winds with noise in [-0.1, 0.1] m/s
+    seed            same seed, same winds, None for a fresh one every run
+    length_scale    correlation length in grid cells, white noise if None
+    For many members, generate them all from one base file with miniguc.ensemble instead
+    '''
+    rng = np.random.default_rng(seed)
+    plan.add('U', lambda values: perturbation(rng, values.shape, 0.1, length_scale))
+    plan.add('V', lambda values: perturbation(rng, values.shape, 0.1, length_scale))
+
+    return plan
+
+@plan_step
+def modify_remove_sin_cos_alpha(plan: EditPlan) -> EditPlan:
+    return plan.set(['SINALPHA', 'COSALPHA', 'E'], 0)
+
+@plan_step
+def modify_reduce_vapor(plan: EditPlan) -> EditPlan:
+    return plan.add('QVAPOR', lambda values: values * 0.01)
+
+# Levels painted by urban_value, all of them for the variables not listed
+URBAN_LEVELS = {
+    'LF_URB2D': slice(3),
+}
+
+def urban_value(mask: LandUse, var_name: str, value: float):
+    '''
+    Edit setting value inside the urban cells of the first time, on the levels of URBAN_LEVELS
+    mask        urban cells, LandUse.from_dataset(src, 'ISURBAN')
+    var_name    name of the edited variable
+    value       value of the urban cells
+    '''
+    levels = URBAN_LEVELS.get(var_name, slice(None))
+    def paint(values: np.ndarray) -> np.ndarray:
+        mask.fill(values[0][levels] if values.ndim == 4 else values[0], value)
+        return values
+
+    return paint
+
+@plan_step
+def modify_urban_params(plan: EditPlan, src: Dataset) -> EditPlan:
+    mask = LandUse.from_dataset(src, 'ISURBAN')
+    urban_vars = {
+        'BUILD_SURF_RATIO': 0.25,
+        'BUILD_HEIGHT': 1,
+        'STDH_URB2D': 0.5,
+        'LF_URB2D': 0.25,
+    }
+    for name, value in urban_vars.items():
+        plan.add(name, urban_value(mask, name, value))
+
+    return plan
+
+def build_plan(src: Dataset) -> EditPlan:
+    '''
+    Register the modifications, see functions above
+    src     source dataset
+    '''
+    plan = EditPlan()
+    # plan = modify_water_depth(plan)
+    plan = modify_remove_initial_wind(plan)
+    # plan = modify_random_initial_winds(plan)
+    plan = modify_remove_sin_cos_alpha(plan)
+    # plan = modify_reduce_vapor(plan)
+    plan = modify_urban_params(plan, src)
+
+    var_names = [ 'T', 'THM', 'MU', 'P', 'AL', 'P_HYD', 'Q2', 'T2', 'TH2',
+        'PSFC', 'QVAPOR', 'TSLB', 'TMN', 'TSK', 'SST', 'VAR',
+        'CON', 'VAR_SSO', 'OA1', 'OA2', 'OA3', 'OA4',
+        'OL1', 'OL2', 'OL3', 'OL4',
+    ]
+    return modify_convert_uniform(plan, var_names)
+
+NOTE = 'Idealized land-water split by Mok'
+
+def run(file_names: list[str], output_dir: str | None = None) -> None:
+    '''
+    Edit the wrfinput file of every domain, in place or into copies in output_dir
+    '''
+    edit_files(build_plan, file_names, NOTE, 'wrfinput', output_dir)
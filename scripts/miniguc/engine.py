@@ -0,0 +1,254 @@
+'''
+Clone-and-edit engine shared by the edit-data scripts
+
+Every script used to copy all variables into the output file and then read
+the (compressed) variables back out of it to modify them. Here each source
+variable is read once, the edits registered for it are applied in memory,
+and the result is written to the output file exactly once.
+
+Small edits can also be applied in place (edit_in_place), rewriting only the
+edited variables of a copy of the file instead of recompressing the whole file.
+
+Both stream big variables in slabs when given a memory budget, see miniguc.streaming,
+and report the time and bytes spent on every variable, see miniguc.instrument.
+'''
+
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Iterable, Iterator
+import os, stat
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.codec import DEFAULT_COMPRESSION, CodecPolicy, as_policy
+from miniguc.files import copy_file
+from miniguc.instrument import edit_name, instrument
+from miniguc.streaming import Fill, default_budget, stream_variable
+
+Edit = Callable[[np.ndarray], np.ndarray]
+
+class EditPlan:
+    '''
+    Ordered list of in-memory edits for each variable of a dataset
+    '''
+
+    def __init__(self) -> None:
+        self.edits: dict[str, list[Edit]] = {}
+        self.sources: dict[str, Dataset] = {}
+        self.dimensions: dict[str, int | None] = {}
+        self.steps: dict[int, str] = {}
+        self.current_step: str | None = None
+
+    def add(self, var_names: str | Iterable[str], edit: Edit, step: str | None = None) -> 'EditPlan':
+        '''
+        Register an edit, edits of a variable are applied in the order they are added
+        var_names   variable name or list of variable names
+        edit        function taking the current values and returning the new values
+        step        name of the edit in the timing report, that of the current step by default
+        '''
+        if isinstance(var_names, str): var_names = [var_names]
+        for var_name in var_names:
+            self.edits.setdefault(var_name, []).append(edit)
+        self.steps[id(edit)] = step or self.current_step or edit_name(edit)
+        return self
+
+    @contextmanager
+    def step(self, name: str) -> Iterator['EditPlan']:
+        '''
+        Name the edits added in the block in the timing report, see plan_step
+        '''
+        previous, self.current_step = self.current_step, name
+        try:
+            yield self
+        finally:
+            self.current_step = previous
+
+    def set(self, var_names: str | Iterable[str], value: float) -> 'EditPlan':
+        '''
+        Register an edit filling the whole variable with a constant
+        var_names   variable name or list of variable names
+        value       value to fill
+        '''
+        return self.add(var_names, Fill(value))
+
+    def take(self, var_names: str | Iterable[str], dataset: Dataset) -> 'EditPlan':
+        '''
+        Read the variables from another dataset instead of the cloned one
+        var_names   variable name or list of variable names
+        dataset     dataset to read the variables from
+        '''
+        if isinstance(var_names, str): var_names = [var_names]
+        for var_name in var_names:
+            self.sources[var_name] = dataset
+        return self
+
+    def resize(self, dim_name: str, size: int | None) -> 'EditPlan':
+        '''
+        Change the size of a dimension in the output, the edits must return arrays of the new shape
+        dim_name    dimension name
+        size        new size, None for unlimited
+        '''
+        self.dimensions[dim_name] = size
+        return self
+
+    def variable(self, src: Dataset, var_name: str):
+        '''
+        Original variable, from whichever dataset it is taken from
+        '''
+        return self.sources.get(var_name, src).variables[var_name]
+
+    def read(self, src: Dataset, var_name: str) -> np.ndarray:
+        '''
+        Read the original values of a variable, from whichever dataset it is taken from
+        '''
+        return self.variable(src, var_name)[:]
+
+    def apply(self, var_name: str, values: np.ndarray) -> np.ndarray:
+        '''
+        Apply all registered edits of a variable to its values
+        '''
+        for edit in self.edits.get(var_name, []):
+            values = edit(values)
+        return values
+
+    def check(self, src: Dataset) -> None:
+        '''
+        Make sure every edited variable exists before anything is written
+        '''
+        missing = [name for name in [*self.edits, *self.sources] if name not in src.variables]
+        if len(missing) > 0:
+            raise KeyError(f'Variables not found in the source file: {", ".join(missing)}')
+
+def plan_step(modify: Callable[..., EditPlan]) -> Callable[..., EditPlan]:
+    '''
+    Decorator of the modify_* functions, their edits are reported under the function name
+    The plan must be the first argument
+    '''
+    @wraps(modify)
+    def wrapper(plan: EditPlan, *args, **kwargs) -> EditPlan:
+        with plan.step(modify.__name__):
+            return modify(plan, *args, **kwargs)
+
+    return wrapper
+
+def modified_attributes(src: Dataset, note: str) -> dict:
+    '''
+    Global attributes of src, marked as modified with an extra note
+    '''
+    attributes = src.__dict__
+    if not attributes.get('TITLE', '').endswith(' (MODIFIED)'):
+        attributes['TITLE'] = attributes.get('TITLE', '') + ' (MODIFIED)'
+    attributes['NOTE'] = note
+    return attributes
+
+def copy_structure(src: Dataset, out: Dataset, plan: EditPlan, note: str,
+                   compression: CodecPolicy | dict | str = DEFAULT_COMPRESSION) -> None:
+    '''
+    Copy attributes, dimensions and (empty) variables of src into out
+    src         source dataset
+    out         output dataset, opened for writing
+    plan        edit plan, for the dimensions it resizes
+    note        note to add to the global attributes
+    compression codec policy, preset name or createVariable arguments for compression
+    '''
+    policy = as_policy(compression)
+    out.setncatts(modified_attributes(src, note))
+
+    for name, dimension in src.dimensions.items():
+        # The value should be None for unlimited dimension
+        dimension_size = len(dimension) if not dimension.isunlimited() else None
+        out.createDimension(name, plan.dimensions.get(name, dimension_size))
+
+    for name, variable in src.variables.items():
+        var_attributes = variable.__dict__
+        out.createVariable(
+            name,
+            variable.datatype,
+            variable.dimensions,
+            fill_value=var_attributes.pop('_FillValue', None),
+            **policy.compression(name),
+        )
+        out[name].setncatts(var_attributes)
+
+def clone_dataset(src: Dataset, output_name: str, plan: EditPlan, note: str,
+                  compression: CodecPolicy | dict | str = DEFAULT_COMPRESSION,
+                  memory_budget: int | None = None) -> None:
+    '''
+    Write a modified copy of src, reading and writing every variable once
+    src             source dataset
+    output_name     path of the output file, overwritten if it exists
+    plan            edits to apply on the way
+    note            note to add to the global attributes
+    compression     codec policy, preset name or createVariable arguments for compression
+    memory_budget   bytes of a variable held in memory at once, MINIGUC_MEMORY by default,
+                    bigger variables are streamed in slabs
+    '''
+    plan.check(src)
+    budget = memory_budget or default_budget()
+    with instrument(output_name) as report:
+        if report is not None: report.step_names.update(plan.steps)
+        out = Dataset(output_name, 'w', format='NETCDF4')
+        try:
+            copy_structure(src, out, plan, note, compression)
+            for name in src.variables:
+                if name in plan.edits: print(f'Modifying {name}...', end='\r')
+                stream_variable(plan.variable(src, name), out[name], plan.edits.get(name, []), budget)
+        finally:
+            # Compressed chunks still in the cache are written out here
+            start = perf_counter()
+            out.close()
+            if report is not None: report.close_seconds += perf_counter() - start
+
+def edit_in_place(file_name: str, build_plan: Callable[[Dataset], EditPlan], note: str,
+                  compression: CodecPolicy | dict | str | None = None, memory_budget: int | None = None) -> bool:
+    '''
+    Apply the edits without recompressing the file, only the edited variables are read and rewritten
+    file_name   path of the file to modify
+    build_plan  function creating the edit plan from the opened dataset, called once
+    note        note to add to the global attributes
+    compression codec policy the file must end up with, None to keep the current one
+    memory_budget   bytes of a variable held in memory at once, see clone_dataset
+    The edits go to a copy of the file (sharing its blocks on copy-on-write file systems),
+    which replaces the file once complete: a failure leaves the file as it was, and a file
+    hard linked elsewhere (a blob of miniguc.artifacts) is never modified.
+    Falls back to a full rewrite (clone_dataset) when the plan resizes a dimension
+    or the file is not stored with the requested compression.
+    Returns True if the file was edited in place, False if it was rewritten
+    '''
+    # Next to the original so the replacement is a rename on the same file system
+    tmp_name = os.path.join(os.path.dirname(os.path.abspath(file_name)), f'.{os.path.basename(file_name)}.tmp')
+    with instrument(file_name, 'in_place') as report:
+        src = Dataset(file_name, 'r')
+        try:
+            plan = build_plan(src)
+            plan.check(src)
+            in_place = len(plan.dimensions) == 0 and len(plan.sources) == 0 and (
+                compression is None or all(map(as_policy(compression).matches, src.variables.values()))
+            )
+            if in_place:
+                if report is not None: report.step_names.update(plan.steps)
+                copy_file(file_name, tmp_name)
+                os.chmod(tmp_name, os.stat(tmp_name).st_mode | stat.S_IWUSR)
+                out = Dataset(tmp_name, 'r+')
+                try:
+                    out.setncatts(modified_attributes(src, note))
+                    for name in src.variables:
+                        if name not in plan.edits: continue
+                        print(f'Modifying {name}...', end='\r')
+                        stream_variable(out[name], out[name], plan.edits[name], memory_budget or default_budget())
+                finally:
+                    start = perf_counter()
+                    out.close()
+                    if report is not None: report.close_seconds += perf_counter() - start
+            else:
+                if report is not None: report.mode = 'rewrite'
+                clone_dataset(src, tmp_name, plan, note, compression or DEFAULT_COMPRESSION, memory_budget)
+        except BaseException:
+            if os.path.exists(tmp_name): os.remove(tmp_name)
+            raise
+        finally:
+            src.close()
+        os.replace(tmp_name, file_name)
+        return in_place
@@ -0,0 +1,111 @@
+'''
+Ensemble wrfinput generator
+
+The base wrfinput_d01 is read once. Every member starts as a copy of the
+base file (a reflink on copy-on-write file systems, otherwise a raw byte copy,
+never decompressed or recompressed) and only the perturbed variables are then
+rewritten in place. Members are written in parallel, each with its own seed
+derived from the ensemble seed, so any member can be reproduced on its own.
+
+    python -m miniguc.ensemble BASE OUTPUT_PATTERN MEMBERS [--seed 0] [--length-scale 5]
+e.g.
+    python -m miniguc.ensemble runs/045-base/wrfinput_d01 'runs/{member:03}-ens/wrfinput_d01' 30
+'''
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+import argparse, os, sys
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.files import copy_file
+from miniguc.parallel import default_workers
+
+def white_noise(rng: np.random.Generator, shape: tuple[int, ...], amplitude: float) -> np.ndarray:
+    '''
+    Uniform noise in [-amplitude, amplitude], independent for every point
+    '''
+    return rng.uniform(-amplitude, amplitude, shape)
+
+def correlated_noise(rng: np.random.Generator, shape: tuple[int, ...], amplitude: float,
+                     length_scale: float) -> np.ndarray:
+    '''
+    Gaussian noise smoothed over the horizontal axes, correlated over about length_scale cells
+    The result is rescaled so its standard deviation matches uniform noise of the same amplitude
+    '''
+    noise = rng.standard_normal(shape)
+    ky = np.fft.fftfreq(shape[-2])[:, None]
+    kx = np.fft.rfftfreq(shape[-1])[None, :]
+    kernel = np.exp(-2 * (np.pi * length_scale) ** 2 * (kx ** 2 + ky ** 2))
+    smooth = np.fft.irfft2(np.fft.rfft2(noise) * kernel, s=shape[-2:])
+    return smooth / (smooth.std() or 1) * amplitude / np.sqrt(3)
+
+def perturbation(rng: np.random.Generator, shape: tuple[int, ...], amplitude: float,
+                 length_scale: float | None = None) -> np.ndarray:
+    '''
+    White noise, or spatially correlated noise when a length scale (cells) is given
+    '''
+    if length_scale is None: return white_noise(rng, shape, amplitude)
+    return correlated_noise(rng, shape, amplitude, length_scale)
+
+def write_member(base_name: str, output_name: str, base_values: dict[str, np.ndarray],
+                 seed: np.random.SeedSequence, amplitude: float, length_scale: float | None, member: int) -> str:
+    '''
+    Write one member: copy the base file, then rewrite only the perturbed variables
+    '''
+    rng = np.random.default_rng(seed)
+    output_dir = os.path.dirname(os.path.abspath(output_name))
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_name = os.path.join(output_dir, f'.{os.path.basename(output_name)}.tmp')
+    copy_file(base_name, tmp_name)
+    with Dataset(tmp_name, 'r+') as out:
+        for var_name, values in base_values.items():
+            out[var_name][:] = values + perturbation(rng, values.shape, amplitude, length_scale).astype(values.dtype)
+        out.setncatts({'NOTE': f'Ensemble member {member}, seed entropy {seed.entropy} spawn key {seed.spawn_key}'})
+    os.replace(tmp_name, output_name)
+    return output_name
+
+def generate_ensemble(base_name: str, output_names: list[str], seed: int = 0, var_names: tuple[str, ...] = ('U', 'V'),
+                      amplitude: float = 0.1, length_scale: float | None = None, workers: int | None = None) -> None:
+    '''
+    Write perturbed copies of a wrfinput file
+    base_name       base wrfinput file
+    output_names    path of every member
+    seed            ensemble seed, member i always gets the same perturbation for the same seed
+    var_names       variables to perturb
+    amplitude       perturbation amplitude (m/s for winds), uniform noise in [-amplitude, amplitude]
+    length_scale    correlation length in grid cells, white noise if None
+    workers         number of processes, see miniguc.parallel.default_workers
+    '''
+    # The only read of the base data, the rest of each member is a file copy
+    with Dataset(base_name) as base:
+        base_values = {var_name: base[var_name][:] for var_name in var_names}
+
+    seeds = np.random.SeedSequence(seed).spawn(len(output_names))
+    with ProcessPoolExecutor(max_workers=workers or default_workers(), mp_context=get_context('fork')) as pool:
+        futures = [
+            pool.submit(write_member, base_name, output_name, base_values, seeds[member],
+                        amplitude, length_scale, member)
+            for member, output_name in enumerate(output_names)
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            print(f'[{done}/{len(futures)}] Written {future.result()}')
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog='python -m miniguc.ensemble', description=__doc__.split('\n')[1])
+    parser.add_argument('base', help='base wrfinput file')
+    parser.add_argument('output_pattern', help='output path with {member}, e.g. runs/{member:03}-ens/wrfinput_d01')
+    parser.add_argument('members', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--vars', nargs='+', default=['U', 'V'])
+    parser.add_argument('--amplitude', type=float, default=0.1)
+    parser.add_argument('--length-scale', type=float, default=None, help='correlation length in cells')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    output_names = [args.output_pattern.format(member=member) for member in range(args.members)]
+    generate_ensemble(args.base, output_names, args.seed, args.vars, args.amplitude, args.length_scale, args.workers)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,381 @@
+'''
+Small declarative language for the edits, compiled into an EditPlan
+
+A scenario is a list of assignments, one per line or separated by ;
+
+    LU_INDEX := grassland; LU_INDEX[urban] := ISURBAN
+    LANDUSEF := 0; LANDUSEF[0, grassland - 1] := 1
+    U, U10, V, V10, W := 0
+    T := horizontal_mean(T)
+    QVAPOR[~urban] := QVAPOR * 0.01
+
+A target is a variable, optionally indexed along its leading axes (time, level,
+category, ints or :) and ending with a mask. Masks are named (urban, water,
+given by the caller, or combined with | and ~). Values are numbers, global
+attributes of the file (ISURBAN, ISWATER, ...), the land-use names of LAND_USE,
+the variable itself, + - * / **, abs, minimum, maximum, or horizontal_mean(X[, start_axis])
+as the whole value. Assignments only read the variable they write.
+
+Nothing is read while compiling. The assignments of each variable form a small
+graph that is optimized before anything runs:
+- an assignment overwriting the whole variable (or the same region) without
+  reading it drops the assignments before it, and the variable is then not read at all
+- consecutive assignments of the same region are fused into one expression,
+  e.g. X := X * 2; X := X + 1 becomes X := X * 2 + 1, constants are folded
+- consecutive elementwise assignments run as a single edit on every slab
+
+The result is added to an EditPlan, so the whole file is still written in one
+pass, slab by slab within MINIGUC_MEMORY, see miniguc.engine and miniguc.streaming:
+
+    plan = add_script(EditPlan(), SCENARIO, src, masks={'urban': domain_mask})
+'''
+
+from typing import Callable
+import ast
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.engine import EditPlan
+from miniguc.kernels import HorizontalMean
+from miniguc.masks import LandUse, Mask
+from miniguc.streaming import Index, SlabEdit
+
+# USGS categories by name, see LANDUSE.TBL
+LAND_USE = {
+    'grassland': 10,    # Grassland
+    'barren': 16,       # Barren or sparsely vegetated
+    'forest': 5,        # Mixed Forests
+}
+# Masks available without being given, from LU_INDEX and the category in this global attribute
+LAND_USE_MASKS = {'urban': 'ISURBAN', 'water': 'ISWATER'}
+
+OPERATORS = {
+    ast.Add: (np.add, '+'), ast.Sub: (np.subtract, '-'), ast.Mult: (np.multiply, '*'),
+    ast.Div: (np.divide, '/'), ast.Pow: (np.power, '**'),
+}
+FUNCTIONS = {'abs': np.abs, 'minimum': np.minimum, 'maximum': np.maximum}
+
+class Expr:
+    '''
+    Elementwise expression of the current values of the variable
+    '''
+    reads: bool = False
+
+    def evaluate(self, current: np.ndarray) -> np.ndarray | float:
+        raise NotImplementedError
+
+    def substitute(self, current: 'Expr') -> 'Expr':
+        '''
+        Same expression with the current values replaced by another expression
+        '''
+        return self
+
+    def references(self) -> int:
+        '''
+        Number of times the current values are used
+        '''
+        return 0
+
+class Constant(Expr):
+    def __init__(self, value: float) -> None:
+        self.value = value
+
+    def evaluate(self, current: np.ndarray) -> float:
+        return self.value
+
+    def __str__(self) -> str:
+        return f'{self.value:g}' if np.isscalar(self.value) else 'array'
+
+class Current(Expr):
+    reads = True
+
+    def __init__(self, var_name: str) -> None:
+        self.var_name = var_name
+
+    def evaluate(self, current: np.ndarray) -> np.ndarray:
+        return current
+
+    def substitute(self, current: Expr) -> Expr:
+        return current
+
+    def references(self) -> int:
+        return 1
+
+    def __str__(self) -> str:
+        return self.var_name
+
+class Operation(Expr):
+    def __init__(self, function: Callable, operands: list[Expr], symbol: str) -> None:
+        self.function, self.operands, self.symbol = function, operands, symbol
+        self.reads = any(operand.reads for operand in operands)
+
+    def evaluate(self, current: np.ndarray) -> np.ndarray | float:
+        return self.function(*[operand.evaluate(current) for operand in self.operands])
+
+    def substitute(self, current: Expr) -> Expr:
+        return operation(self.function, [operand.substitute(current) for operand in self.operands], self.symbol)
+
+    def references(self) -> int:
+        return sum(operand.references() for operand in self.operands)
+
+    def __str__(self) -> str:
+        if self.symbol.isidentifier(): return f'{self.symbol}({", ".join(map(str, self.operands))})'
+        if len(self.operands) == 1: return f'{self.symbol}{self.operands[0]}'
+        return f'({self.operands[0]} {self.symbol} {self.operands[1]})'
+
+def operation(function: Callable, operands: list[Expr], symbol: str) -> Expr:
+    '''
+    Operation on the operands, computed right away when they are all constants
+    '''
+    if any(operand.reads for operand in operands): return Operation(function, operands, symbol)
+    return Constant(function(*[operand.evaluate(None) for operand in operands]))
+
+class Assign:
+    '''
+    var[leading..., mask] := expr, elementwise
+    leading     index of each leading axis, None for all of it
+    '''
+
+    def __init__(self, var_name: str, leading: tuple[int | None, ...], mask: Mask | None, mask_name: str | None,
+                 expr: Expr) -> None:
+        self.var_name, self.leading, self.mask, self.mask_name, self.expr = var_name, leading, mask, mask_name, expr
+
+    @property
+    def full(self) -> bool:
+        return self.mask is None and all(index is None for index in self.leading)
+
+    @property
+    def reads(self) -> bool:
+        '''
+        Whether the previous values are needed, either by the expression or outside of the region
+        '''
+        return self.expr.reads or not self.full
+
+    def same_region(self, other) -> bool:
+        return isinstance(other, Assign) and self.leading == other.leading and self.mask is other.mask
+
+    def apply(self, slab: np.ndarray, index: Index, shape: tuple[int, ...]) -> np.ndarray:
+        # Position of the leading indices within the slab, nothing to do if the slab doesn't contain them
+        local = []
+        for axis, position in enumerate(self.leading):
+            start = index[axis].start or 0 if axis < len(index) else 0
+            if position is None:
+                local.append(slice(None))
+            elif start <= position < start + slab.shape[axis]:
+                local.append(slice(position - start, position - start + 1))
+            else:
+                return slab
+
+        region = slab[tuple(local)]
+        if self.mask is None:
+            region[...] = self.expr.evaluate(region)
+        else:
+            self.mask.fill(region, self.expr.evaluate(self.mask.select(region)) if self.expr.reads else self.expr.value)
+        return slab
+
+    def __str__(self) -> str:
+        subscript = [':' if index is None else str(index) for index in self.leading]
+        if self.mask is not None: subscript.append(self.mask_name)
+        target = f'{self.var_name}[{", ".join(subscript)}]' if not self.full else self.var_name
+        return f'{target} := {self.expr}'
+
+class Mean:
+    '''
+    var[mask] := horizontal_mean(var, start_axis), see miniguc.kernels.HorizontalMean
+    '''
+
+    def __init__(self, var_name: str, mask: Mask | None, mask_name: str | None, start_axis: int) -> None:
+        self.var_name, self.mask, self.mask_name, self.start_axis = var_name, mask, mask_name, start_axis
+
+    def same(self, other) -> bool:
+        return isinstance(other, Mean) and self.mask is other.mask and self.start_axis == other.start_axis
+
+    def edit(self, shape: tuple[int, ...]) -> HorizontalMean:
+        return HorizontalMean(None if self.mask is None else self.mask.boolean(shape), self.start_axis)
+
+    def __str__(self) -> str:
+        target = self.var_name if self.mask is None else f'{self.var_name}[{self.mask_name}]'
+        return f'{target} := horizontal_mean({self.var_name}, {self.start_axis})'
+
+Step = Assign | Mean
+
+class Fused(SlabEdit):
+    '''
+    Consecutive elementwise assignments of a variable, applied to each slab in one go
+    '''
+    local_axes = 1 << 16
+
+    def __init__(self, steps: list[Assign]) -> None:
+        self.steps = steps
+        self.reads_values = steps[0].reads
+        self.__name__ = '; '.join(map(str, steps))
+
+    def apply(self, slab: np.ndarray, index: Index, shape: tuple[int, ...]) -> np.ndarray:
+        for step in self.steps:
+            slab = step.apply(slab, index, shape)
+        return slab
+
+def parse(text: str) -> list[tuple[ast.expr, ast.expr, str]]:
+    '''
+    (target, value, source) of every assignment of a scenario, one per variable of tuple targets
+    '''
+    statements = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        for source in line.split('#')[0].split(';'):
+            source = source.strip()
+            if len(source) == 0: continue
+            if ':=' not in source:
+                raise SyntaxError(f'Line {line_number}: expected TARGET := VALUE, got {source!r}')
+            target, value = (ast.parse(part.strip(), mode='eval').body for part in source.split(':=', 1))
+            for node in target.elts if isinstance(target, ast.Tuple) else [target]:
+                statements.append((node, value, source))
+    return statements
+
+class Binder:
+    '''
+    Resolves the names of the assignments against one source file
+    '''
+
+    def __init__(self, src: Dataset, masks: dict[str, Mask] | None, constants: dict[str, float] | None) -> None:
+        self.src, self.masks = src, dict(masks or {})
+        self.constants = {name: value for name, value in src.__dict__.items()
+                          if isinstance(value, (int, float, np.number))}
+        self.constants.update(LAND_USE)
+        self.constants.update(constants or {})
+
+    def mask(self, node: ast.expr) -> Mask:
+        if isinstance(node, ast.Name):
+            if node.id not in self.masks and node.id in LAND_USE_MASKS:
+                self.masks[node.id] = LandUse.from_dataset(self.src, LAND_USE_MASKS[node.id])
+            if node.id not in self.masks: raise NameError(f'Unknown mask {node.id}')
+            return self.masks[node.id]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+            return ~self.mask(node.operand)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+            return self.mask(node.left) | self.mask(node.right)
+        raise SyntaxError(f'Not a mask: {ast.unparse(node)}')
+
+    def is_mask(self, node: ast.expr) -> bool:
+        names = [name.id for name in ast.walk(node) if isinstance(name, ast.Name)]
+        return len(names) > 0 and all(name in self.masks or name in LAND_USE_MASKS for name in names) \
+            and not any(name in self.constants for name in names)
+
+    def integer(self, node: ast.expr) -> int:
+        value = self.expression(node, '')
+        if not isinstance(value, Constant) or int(value.value) != value.value:
+            raise SyntaxError(f'Not an index: {ast.unparse(node)}')
+        return int(value.value)
+
+    def expression(self, node: ast.expr, var_name: str) -> Expr:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return Constant(node.value)
+        if isinstance(node, ast.Name):
+            if node.id == var_name: return Current(var_name)
+            if node.id in self.constants: return Constant(self.constants[node.id])
+            if node.id in self.src.variables:
+                raise ValueError(f'{var_name} can only be computed from itself, not from {node.id}')
+            raise NameError(f'Unknown name {node.id}')
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            function, symbol = OPERATORS[type(node.op)]
+            return operation(function, [self.expression(node.left, var_name),
+                                        self.expression(node.right, var_name)], symbol)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self.expression(node.operand, var_name)
+            return operation(np.negative, [operand], '-') if isinstance(node.op, ast.USub) else operand
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+            return operation(FUNCTIONS[node.func.id], [self.expression(arg, var_name) for arg in node.args],
+                             node.func.id)
+        raise SyntaxError(f'Unsupported expression: {ast.unparse(node)}')
+
+    def step(self, target: ast.expr, value: ast.expr) -> Step:
+        subscript = []
+        if isinstance(target, ast.Subscript):
+            subscript = target.slice.elts if isinstance(target.slice, ast.Tuple) else [target.slice]
+            target = target.value
+        if not isinstance(target, ast.Name): raise SyntaxError(f'Not a variable: {ast.unparse(target)}')
+        var_name = target.id
+        if var_name not in self.src.variables:
+            raise KeyError(f'Variables not found in the source file: {var_name}')
+        ndim = self.src.variables[var_name].ndim
+
+        mask, mask_name = None, None
+        if len(subscript) > 0 and self.is_mask(subscript[-1]):
+            mask, mask_name = self.mask(subscript[-1]), ast.unparse(subscript[-1])
+            subscript = subscript[:-1]
+        if len(subscript) > ndim - 2:
+            raise IndexError(f'{var_name} has {ndim - 2} leading axes, {len(subscript)} indices given')
+        shape = self.src.variables[var_name].shape
+        if any(isinstance(node, ast.Slice) and (node.lower or node.upper or node.step) for node in subscript):
+            raise IndexError(f'Only : or single indices are supported along the leading axes of {var_name}')
+        leading = tuple(None if isinstance(node, ast.Slice) else self.integer(node) % shape[axis]
+                        for axis, node in enumerate(subscript))
+        leading += (None,) * (ndim - 2 - len(leading))
+
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == 'horizontal_mean':
+            if len(value.args) == 0 or not (isinstance(value.args[0], ast.Name) and value.args[0].id == var_name) \
+                    or any(index is not None for index in leading):
+                raise SyntaxError(f'Use {var_name}[mask] := horizontal_mean({var_name}[, start_axis])')
+            start_axis = self.integer(value.args[1]) if len(value.args) > 1 else -2
+            return Mean(var_name, mask, mask_name, start_axis)
+        return Assign(var_name, leading, mask, mask_name, self.expression(value, var_name))
+
+def push(steps: list[Step], step: Step) -> None:
+    '''
+    Append a step to the optimized steps of a variable, dropping overwritten steps and fusing expressions
+    '''
+    if isinstance(step, Mean):
+        # Averaging twice gives the same values
+        if len(steps) == 0 or not step.same(steps[-1]): steps.append(step)
+        return
+
+    if not step.reads:
+        if step.full:
+            steps.clear()
+        while len(steps) > 0 and step.same_region(steps[-1]):
+            steps.pop()
+    elif len(steps) > 0 and step.same_region(steps[-1]) and (
+            step.expr.references() <= 1 or not steps[-1].expr.reads):
+        previous = steps.pop()
+        fused = Assign(step.var_name, step.leading, step.mask, step.mask_name, step.expr.substitute(previous.expr))
+        return push(steps, fused)
+    steps.append(step)
+
+def compile_script(text: str, src: Dataset, masks: dict[str, Mask] | None = None,
+                   constants: dict[str, float] | None = None) -> dict[str, list[Step]]:
+    '''
+    Optimized steps of every variable of a scenario, in the order of their first assignment
+    text        scenario, see above
+    src         dataset the scenario is applied to, for its variables and global attributes
+    masks       named masks on the grid of src, urban and water default to the LU_INDEX of src
+    constants   extra named values
+    '''
+    binder = Binder(src, masks, constants)
+    graph: dict[str, list[Step]] = {}
+    for target, value, source in parse(text):
+        try:
+            step = binder.step(target, value)
+        except (SyntaxError, NameError, ValueError, IndexError, KeyError) as error:
+            raise type(error)(f'{error} in {source!r}') from None
+        push(graph.setdefault(step.var_name, []), step)
+    return graph
+
+def add_script(plan: EditPlan, text: str, src: Dataset, masks: dict[str, Mask] | None = None,
+               constants: dict[str, float] | None = None) -> EditPlan:
+    '''
+    Register the edits of a scenario, see compile_script
+    plan        edit plan of the output file
+    '''
+    for var_name, steps in compile_script(text, src, masks, constants).items():
+        shape = src.variables[var_name].shape
+        i = 0
+        while i < len(steps):
+            if isinstance(steps[i], Mean):
+                plan.add(var_name, steps[i].edit(shape))
+                i += 1
+                continue
+            j = i
+            while j < len(steps) and isinstance(steps[j], Assign): j += 1
+            plan.add(var_name, Fused(steps[i:j]))
+            i = j
+    return plan
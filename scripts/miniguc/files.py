@@ -0,0 +1,13 @@
+'''
+Project location and file copies, shared by the modules handling run directories
+'''
+
+import os, subprocess
+
+ROOT_DIR = os.environ.get('MINIGUC_ROOT', '/home/mok/miniguc')
+
+def copy_file(src_name: str, dest_name: str) -> None:
+    '''
+    Copy a file without decoding it, sharing the blocks on copy-on-write file systems
+    '''
+    subprocess.run(['cp', '--reflink=auto', src_name, dest_name], check=True)
@@ -0,0 +1,343 @@
+'''
+Synthetic geo_em, met_em, wrfinput and wrfbdy files
+
+Same variable names, dimensions and global attributes (ISURBAN, ISWATER,
+MMINLU, NUM_LAND_CAT, grid_id, ...) as the files written by WPS and real.exe,
+filled with smooth random fields, so the edit scripts and the benchmarks in
+scripts/tests can run anywhere without WPS, WRF or WPS_GEOG.
+
+    python -m miniguc.fixtures OUT_DIR [--size 100x100x35] [--times 5] [--codec none]
+
+Sizes go from the usual 100x100x35 up to 1000x1000x60, variables are written one
+level at a time so big fixtures don't need the whole field in memory.
+'''
+
+from datetime import datetime, timedelta
+import argparse, os, sys
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.codec import as_policy
+
+SIZES = {
+    'small': (100, 100, 35),
+    'medium': (300, 300, 45),
+    'large': (1000, 1000, 60),
+}
+
+# USGS categories, as the runs use (num_land_cat = 24)
+ATTRIBUTES = {
+    'MMINLU': 'USGS',
+    'NUM_LAND_CAT': 24,
+    'ISWATER': 16,
+    'ISLAKE': -1,
+    'ISICE': 24,
+    'ISURBAN': 1,
+    'ISOILWATER': 14,
+    'DX': 1000.0,
+    'DY': 1000.0,
+    'CEN_LAT': 35.0,
+    'CEN_LON': 135.0,
+    'MAP_PROJ': 1,
+}
+
+START = datetime(2025, 3, 1)
+INTERVAL = timedelta(hours=6)
+SOIL_LAYERS = 4
+BDY_WIDTH = 5
+MET_LEVELS = 38
+# Degrees north and east spanned by d01, from the centre of the first cell to the centre of the last
+LATITUDES = (34, 36)
+LONGITUDES = (134, 136)
+
+def parse_size(size: str) -> tuple[int, int, int]:
+    '''
+    (south_north, west_east, bottom_top) from small/medium/large or e.g. 100x100x35
+    '''
+    if size in SIZES: return SIZES[size]
+    ny, nx, nz = map(int, size.lower().split('x'))
+    return ny, nx, nz
+
+class Writer:
+    '''
+    Creates dimensions and variables of one fixture file, filling each with a smooth random field
+    '''
+
+    def __init__(self, file_name: str, title: str, shape: tuple[int, int, int], seed: int,
+                 compression: str | dict = 'none') -> None:
+        self.ny, self.nx, self.nz = shape
+        self.rng = np.random.default_rng(seed)
+        self.policy = as_policy(compression)
+        self.dataset = Dataset(file_name, 'w', format='NETCDF4')
+        self.dataset.setncatts({'TITLE': title, 'WEST-EAST_GRID_DIMENSION': self.nx + 1,
+                                'SOUTH-NORTH_GRID_DIMENSION': self.ny + 1, **ATTRIBUTES})
+
+    def dimensions(self, **sizes: int | None) -> None:
+        for name, size in sizes.items():
+            self.dataset.createDimension(name, size)
+
+    def times(self, count: int, start: datetime = START) -> None:
+        times = [(start + i * INTERVAL).strftime('%Y-%m-%d_%H:%M:%S') for i in range(count)]
+        variable = self.dataset.createVariable('Times', 'S1', ('Time', 'DateStrLen'))
+        variable[:] = np.array([list(time) for time in times], dtype='S1')
+
+    def field(self, shape: tuple[int, int], mean: float, spread: float) -> np.ndarray:
+        '''
+        Smooth 2D field (a few random waves) around mean
+        '''
+        y = np.linspace(0, 2 * np.pi, shape[0])[:, None]
+        x = np.linspace(0, 2 * np.pi, shape[1])[None, :]
+        k = self.rng.integers(1, 4, 4)
+        phase = self.rng.uniform(0, 2 * np.pi, 2)
+        wave = np.sin(k[0] * x + k[1] * y + phase[0]) + np.cos(k[2] * x - k[3] * y + phase[1])
+        return (mean + spread * wave / 2).astype(np.float32)
+
+    def variable(self, name: str, dimensions: tuple[str, ...], mean: float = 0.0, spread: float = 1.0,
+                 values: np.ndarray | None = None, dtype: str = 'f4', description: str = '') -> None:
+        '''
+        Create a variable, filled with values or a smooth field, one leading index at a time
+        '''
+        variable = self.dataset.createVariable(name, dtype, dimensions, **self.policy.compression(name))
+        variable.setncatts({'FieldType': 104, 'MemoryOrder': 'XY ' if len(dimensions) <= 3 else 'XYZ',
+                            'description': description or name, 'units': '', 'stagger': ''})
+        shape = variable.shape
+        if values is not None:
+            variable[:] = np.broadcast_to(values, shape)
+            return
+
+        # One field per variable, shifted for every time/level and with a little noise,
+        # so averages and compression behave about like real data
+        field = self.field(shape[-2:], mean, spread)
+        for i, index in enumerate(np.ndindex(*shape[:-2])):
+            noise = self.rng.standard_normal(shape[-2:], dtype=np.float32) * (spread / 100)
+            variable[index] = field + spread * 0.05 * np.sin(i) + noise
+
+    def close(self) -> None:
+        self.dataset.close()
+
+def landuse(shape: tuple[int, int]) -> np.ndarray:
+    '''
+    LU_INDEX of a land-water split with an urban patch in the middle, like the idealized runs
+    '''
+    ny, nx = shape
+    lu_index = np.full((1, ny, nx), 10, dtype=np.float32) # Grassland
+    lu_index[0, :, nx // 2:] = ATTRIBUTES['ISWATER']
+    lu_index[0, ny // 2 - ny // 10:ny // 2 + ny // 10, nx // 2 - nx // 10:nx // 2] = ATTRIBUTES['ISURBAN']
+    return lu_index
+
+def write_geo_em(file_name: str, shape: tuple[int, int, int], seed: int = 0, compression: str | dict = 'none',
+                 grid_id: int = 1) -> None:
+    '''
+    geo_em.d01.nc as written by geogrid.exe
+    '''
+    writer = Writer(file_name, 'OUTPUT FROM GEOGRID V4.5', shape, seed, compression)
+    writer.dataset.setncatts({'grid_id': grid_id, 'parent_id': 1, 'i_parent_start': 1, 'j_parent_start': 1,
+                              'parent_grid_ratio': 1, 'FLAG_MF_XY': 1})
+    writer.dimensions(Time=None, DateStrLen=19, west_east=writer.nx, south_north=writer.ny,
+                      south_north_stag=writer.ny + 1, west_east_stag=writer.nx + 1, land_cat=24, soil_cat=16,
+                      month=12, num_urb_params=132, month_hour=288)
+    writer.times(1)
+    grid, stag_x, stag_y = ('Time', 'south_north', 'west_east'), ('Time', 'south_north', 'west_east_stag'), \
+        ('Time', 'south_north_stag', 'west_east')
+
+    lu_index = landuse((writer.ny, writer.nx))
+    writer.variable('XLAT_M', grid, values=np.linspace(*LATITUDES, writer.ny)[None, :, None])
+    writer.variable('XLONG_M', grid, values=np.linspace(*LONGITUDES, writer.nx)[None, None, :])
+    writer.variable('XLAT_U', stag_x, 35, 1)
+    writer.variable('XLONG_U', stag_x, 135, 1)
+    writer.variable('XLAT_V', stag_y, 35, 1)
+    writer.variable('XLONG_V', stag_y, 135, 1)
+    for name, dims in [('MAPFAC_M', grid), ('MAPFAC_U', stag_x), ('MAPFAC_V', stag_y), ('MAPFAC_MX', grid),
+                       ('MAPFAC_VX', stag_y), ('MAPFAC_UY', stag_x), ('MAPFAC_MY', grid), ('MAPFAC_VY', stag_y),
+                       ('MAPFAC_UX', stag_x)]:
+        writer.variable(name, dims, 1.0, 0.01)
+    for name in ['E', 'F', 'SINALPHA', 'COSALPHA']:
+        writer.variable(name, grid, 0.5, 0.1)
+    for name, dims in [('SINALPHA_U', stag_x), ('COSALPHA_U', stag_x), ('SINALPHA_V', stag_y), ('COSALPHA_V', stag_y)]:
+        writer.variable(name, dims, 0.5, 0.1)
+    writer.variable('LANDMASK', grid, values=(lu_index != ATTRIBUTES['ISWATER']).astype(np.float32))
+    writer.variable('LU_INDEX', grid, values=lu_index)
+    landusef = np.zeros((1, 24, writer.ny, writer.nx), dtype=np.float32)
+    for category in range(24):
+        landusef[0, category][lu_index[0] == category + 1] = 1.0
+    writer.variable('LANDUSEF', ('Time', 'land_cat', 'south_north', 'west_east'), values=landusef)
+    writer.variable('HGT_M', grid, 100, 50)
+    writer.variable('HGT_U', stag_x, 100, 50)
+    writer.variable('HGT_V', stag_y, 100, 50)
+    writer.variable('SOILTEMP', grid, 285, 5)
+    writer.variable('SOILCTOP', ('Time', 'soil_cat', 'south_north', 'west_east'), 0.1, 0.1)
+    writer.variable('SCT_DOM', grid, 6, 2)
+    writer.variable('SOILCBOT', ('Time', 'soil_cat', 'south_north', 'west_east'), 0.1, 0.1)
+    writer.variable('SCB_DOM', grid, 6, 2)
+    for name in ['ALBEDO12M', 'GREENFRAC', 'LAI12M']:
+        writer.variable(name, ('Time', 'month', 'south_north', 'west_east'), 0.3, 0.2)
+    writer.variable('SNOALB', grid, 0.5, 0.1)
+    for name in ['CON', 'VAR', 'OA1', 'OA2', 'OA3', 'OA4', 'OL1', 'OL2', 'OL3', 'OL4', 'VAR_SSO']:
+        writer.variable(name, grid, 0.2, 0.2)
+    writer.variable('URB_PARAM', ('Time', 'num_urb_params', 'south_north', 'west_east'), 0, 0)
+    for name, mean in [('MH_URB2D', 10), ('ZD_URB2D', 3), ('Z0_URB2D', 1), ('BUILD_AREA_FRACTION', 0.25),
+                       ('LF_URB2D_S', 0.25)]:
+        writer.variable(name, grid, mean, mean / 2)
+    writer.variable('AHE', ('Time', 'month_hour', 'south_north', 'west_east'), 50, 50)
+    writer.close()
+
+def write_nest(file_name: str, parent_shape: tuple[int, int, int], shape: tuple[int, int, int], ratio: int = 3,
+               parent_start: tuple[int, int] = (40, 40), seed: int = 0, compression: str | dict = 'none') -> None:
+    '''
+    geo_em.d02.nc of a nest in the d01 of write_geo_em, its XLAT_M and XLONG_M continue those of d01
+    parent_start    (i_parent_start, j_parent_start), 1-based
+    '''
+    write_geo_em(file_name, shape, seed, compression, grid_id=2)
+    # d01 grid coordinates of the nest cell centres, see miniguc.domains.Domain.to_root
+    y = parent_start[1] - 1.5 + (np.arange(shape[0]) + 0.5) / ratio
+    x = parent_start[0] - 1.5 + (np.arange(shape[1]) + 0.5) / ratio
+    with Dataset(file_name, 'r+') as dataset:
+        dataset.setncatts({'parent_id': 1, 'parent_grid_ratio': ratio, 'i_parent_start': parent_start[0],
+                           'j_parent_start': parent_start[1]})
+        lat = LATITUDES[0] + (LATITUDES[1] - LATITUDES[0]) * y / (parent_shape[0] - 1)
+        lon = LONGITUDES[0] + (LONGITUDES[1] - LONGITUDES[0]) * x / (parent_shape[1] - 1)
+        dataset['XLAT_M'][0] = np.broadcast_to(lat[:, None], shape[:2])
+        dataset['XLONG_M'][0] = np.broadcast_to(lon[None, :], shape[:2])
+
+def write_met_em(file_name: str, shape: tuple[int, int, int], seed: int = 0, compression: str | dict = 'none',
+                 time: datetime = START) -> None:
+    '''
+    One met_em.d01.<time>.nc as written by metgrid.exe
+    '''
+    ny, nx, _ = shape
+    writer = Writer(file_name, 'OUTPUT FROM METGRID V4.5', shape, seed, compression)
+    writer.dataset.setncatts({'grid_id': 1, 'parent_id': 1, 'i_parent_start': 1, 'j_parent_start': 1,
+                              'parent_grid_ratio': 1, 'SIMULATION_START_DATE': START.strftime('%Y-%m-%d_%H:%M:%S')})
+    writer.dimensions(Time=None, DateStrLen=19, west_east=nx, south_north=ny, num_metgrid_levels=MET_LEVELS,
+                      num_st_layers=4, num_sm_layers=4, south_north_stag=ny + 1, west_east_stag=nx + 1,
+                      z_dim_name=12)
+    writer.times(1, time)
+    grid, levels = ('Time', 'south_north', 'west_east'), ('Time', 'num_metgrid_levels', 'south_north', 'west_east')
+
+    lu_index = landuse((ny, nx))
+    writer.variable('LANDMASK', grid, values=(lu_index != ATTRIBUTES['ISWATER']).astype(np.float32))
+    writer.variable('LANDSEA', grid, values=(lu_index != ATTRIBUTES['ISWATER']).astype(np.float32))
+    writer.variable('LU_INDEX', grid, values=lu_index)
+    for name, mean, spread in [('PRES', 60000, 30000), ('GHT', 5000, 3000), ('RH', 60, 30), ('TT', 260, 30)]:
+        writer.variable(name, levels, mean, spread)
+    writer.variable('UU', ('Time', 'num_metgrid_levels', 'south_north', 'west_east_stag'), 5, 5)
+    writer.variable('VV', ('Time', 'num_metgrid_levels', 'south_north_stag', 'west_east'), 5, 5)
+    for name, mean, spread in [('HGTTROP', 12000, 2000), ('TTROP', 215, 10), ('PTROPNN', 20000, 5000),
+                               ('PTROP', 20000, 5000), ('VTROP', 5, 5), ('UTROP', 5, 5), ('HGTMAXW', 11000, 2000),
+                               ('TMAXW', 220, 10), ('PMAXWNN', 25000, 5000), ('PMAXW', 25000, 5000),
+                               ('VMAXW', 10, 10), ('UMAXW', 10, 10), ('SKINTEMP', 285, 10), ('SOILHGT', 100, 50),
+                               ('PSFC', 100000, 2000), ('PMSL', 101300, 1000), ('SNOW', 0, 1), ('SNOWH', 0, 0.1),
+                               ('SM', 0.3, 0.1), ('ST', 285, 5)]:
+        writer.variable(name, grid, mean, spread)
+    for layer in ['000010', '010040', '040100', '100200']:
+        writer.variable(f'ST{layer}', grid, 285, 5)
+        writer.variable(f'SM{layer}', grid, 0.3, 0.1)
+    for name in ['CON', 'VAR', 'OA1', 'OA2', 'OA3', 'OA4', 'OL1', 'OL2', 'OL3', 'OL4', 'VAR_SSO']:
+        writer.variable(name, grid, 0.2, 0.2)
+    writer.close()
+
+def write_wrfinput(file_name: str, shape: tuple[int, int, int], seed: int = 0, compression: str | dict = 'none',
+                   grid_id: int = 1) -> None:
+    '''
+    wrfinput_d01 as written by real.exe
+    '''
+    ny, nx, nz = shape
+    writer = Writer(file_name, 'OUTPUT FROM REAL_EM V4.5 PREPROCESSOR', shape, seed, compression)
+    writer.dataset.setncatts({'GRID_ID': grid_id, 'PARENT_ID': 0, 'I_PARENT_START': 1, 'J_PARENT_START': 1,
+                              'PARENT_GRID_RATIO': 1, 'START_DATE': START.strftime('%Y-%m-%d_%H:%M:%S')})
+    writer.dimensions(Time=None, DateStrLen=19, west_east=nx, south_north=ny, bottom_top=nz,
+                      bottom_top_stag=nz + 1, soil_layers_stag=SOIL_LAYERS, west_east_stag=nx + 1,
+                      south_north_stag=ny + 1, urb_directions=4)
+    writer.times(1)
+    grid, mass = ('Time', 'south_north', 'west_east'), ('Time', 'bottom_top', 'south_north', 'west_east')
+
+    writer.variable('U', ('Time', 'bottom_top', 'south_north', 'west_east_stag'), 5, 5)
+    writer.variable('V', ('Time', 'bottom_top', 'south_north_stag', 'west_east'), 5, 5)
+    writer.variable('W', ('Time', 'bottom_top_stag', 'south_north', 'west_east'), 0, 0.1)
+    writer.variable('PH', ('Time', 'bottom_top_stag', 'south_north', 'west_east'), 0, 100)
+    writer.variable('PHB', ('Time', 'bottom_top_stag', 'south_north', 'west_east'), 50000, 30000)
+    for name, mean, spread in [('T', 10, 10), ('THM', 10, 10), ('P', 100, 100), ('AL', 0.1, 0.1),
+                               ('P_HYD', 60000, 30000), ('QVAPOR', 0.005, 0.005), ('PB', 60000, 30000)]:
+        writer.variable(name, mass, mean, spread)
+    for name, mean, spread in [('MU', 100, 100), ('MUB', 95000, 1000), ('Q2', 0.008, 0.004), ('T2', 288, 5),
+                               ('TH2', 288, 5), ('PSFC', 100000, 2000), ('U10', 3, 3), ('V10', 3, 3), ('TMN', 285, 3),
+                               ('TSK', 288, 5), ('SST', 288, 3), ('XLAND', 1.5, 1), ('HGT', 100, 50),
+                               ('SINALPHA', 0, 0.1), ('COSALPHA', 1, 0.1), ('E', 0.0001, 0.00001),
+                               ('F', 0.0001, 0.00001), ('WATER_DEPTH', 10, 10), ('BUILD_SURF_RATIO', 0.25, 0.1),
+                               ('BUILD_HEIGHT', 10, 5), ('STDH_URB2D', 2, 1), ('MH_URB2D', 10, 5),
+                               ('Z0_URB2D', 1, 0.5), ('ZD_URB2D', 3, 1), ('FRC_URB2D', 0.5, 0.3), ('AHE', 50, 50)]:
+        writer.variable(name, grid, mean, spread)
+    for name in ['CON', 'VAR', 'OA1', 'OA2', 'OA3', 'OA4', 'OL1', 'OL2', 'OL3', 'OL4', 'VAR_SSO']:
+        writer.variable(name, grid, 0.2, 0.2)
+    writer.variable('LF_URB2D', ('Time', 'urb_directions', 'south_north', 'west_east'), 0.25, 0.1)
+    writer.variable('TSLB', ('Time', 'soil_layers_stag', 'south_north', 'west_east'), 285, 5)
+    writer.variable('LU_INDEX', grid, values=landuse((ny, nx)))
+    writer.variable('XLAT', grid, values=np.linspace(*LATITUDES, ny)[None, :, None])
+    writer.variable('XLONG', grid, values=np.linspace(*LONGITUDES, nx)[None, None, :])
+    writer.close()
+
+def write_wrfbdy(file_name: str, shape: tuple[int, int, int], times: int = 5, seed: int = 0,
+                 compression: str | dict = 'none') -> None:
+    '''
+    wrfbdy_d01 as written by real.exe, with times boundary times
+    '''
+    ny, nx, nz = shape
+    writer = Writer(file_name, 'OUTPUT FROM REAL_EM V4.5 PREPROCESSOR', shape, seed, compression)
+    writer.dataset.setncatts({'GRID_ID': 1, 'PARENT_ID': 0, 'START_DATE': START.strftime('%Y-%m-%d_%H:%M:%S')})
+    writer.dimensions(Time=None, DateStrLen=19, west_east=nx, south_north=ny, bottom_top=nz,
+                      bottom_top_stag=nz + 1, bdy_width=BDY_WIDTH, west_east_stag=nx + 1, south_north_stag=ny + 1)
+    writer.times(times)
+
+    # (stagger of the variable along x, y and z) for each boundary variable
+    staggers = {'U': ('_stag', '', ''), 'V': ('', '_stag', ''), 'W': ('', '', '_stag'), 'PH': ('', '', '_stag'),
+                'T': ('', '', ''), 'QVAPOR': ('', '', ''), 'MU': ('', '', None)}
+    means = {'U': (5, 5), 'V': (5, 5), 'W': (0, 0.1), 'PH': (0, 100), 'T': (10, 10), 'QVAPOR': (0.005, 0.005),
+             'MU': (100, 100)}
+    for name, (stag_x, stag_y, stag_z) in staggers.items():
+        vertical = () if stag_z is None else (f'bottom_top{stag_z}',)
+        for kind in ['B', 'BT']:
+            mean, spread = means[name] if kind == 'B' else (0, means[name][1] / 1e4)
+            for side in ['XS', 'XE']:
+                writer.variable(f'{name}_{kind}{side}', ('Time', 'bdy_width', *vertical, f'south_north{stag_y}'),
+                                mean, spread)
+            for side in ['YS', 'YE']:
+                writer.variable(f'{name}_{kind}{side}', ('Time', 'bdy_width', *vertical, f'west_east{stag_x}'),
+                                mean, spread)
+    writer.close()
+
+def write_fixtures(output_dir: str, shape: tuple[int, int, int], times: int = 5, seed: int = 0,
+                   compression: str | dict = 'none') -> dict[str, list[str]]:
+    '''
+    Write a geo_em, times met_em files, a wrfinput and a wrfbdy into output_dir
+    Returns the file names of each kind
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    files = {
+        'geo_em': [os.path.join(output_dir, 'geo_em.d01.nc')],
+        'met_em': [os.path.join(output_dir, f'met_em.d01.{(START + i * INTERVAL).strftime("%Y-%m-%d_%H:%M:%S")}.nc')
+                   for i in range(times)],
+        'wrfinput': [os.path.join(output_dir, 'wrfinput_d01')],
+        'wrfbdy': [os.path.join(output_dir, 'wrfbdy_d01')],
+    }
+    write_geo_em(files['geo_em'][0], shape, seed, compression)
+    for i, file_name in enumerate(files['met_em']):
+        write_met_em(file_name, shape, seed + i, compression, START + i * INTERVAL)
+    write_wrfinput(files['wrfinput'][0], shape, seed, compression)
+    write_wrfbdy(files['wrfbdy'][0], shape, times, seed, compression)
+    return files
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog='python -m miniguc.fixtures', description=__doc__.split('\n')[1])
+    parser.add_argument('output_dir')
+    parser.add_argument('--size', default='small', help='small, medium, large or NYxNXxNZ, e.g. 100x100x35')
+    parser.add_argument('--times', type=int, default=5, help='number of met_em files and boundary times')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--codec', default='none', help='compression preset, see miniguc.codec')
+    args = parser.parse_args(argv)
+
+    files = write_fixtures(args.output_dir, parse_size(args.size), args.times, args.seed, args.codec)
+    print('\n'.join(name for names in files.values() for name in names))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
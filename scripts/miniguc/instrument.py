@@ -0,0 +1,176 @@
+'''
+Timing and I/O report of the edit pipeline
+
+While a file is written by clone_dataset or edit_in_place, the time spent
+reading, editing and writing every variable is recorded along with the bytes
+read and written (uncompressed), and the time of every edit is charged to its
+step, the modify_* function that registered it (see miniguc.engine.plan_step).
+Once the file is closed, the stored size of every variable gives its compression
+ratio (with h5py, file level otherwise).
+
+Off by default. With MINIGUC_REPORT=json the report goes to
+miniguc-report.<file name>.json next to the output file, named so that globs such
+as geo_em* or wrfinput* don't pick it up, MINIGUC_REPORT=table also prints a
+summary on stderr. The report being written is kept in a context variable, so
+files written at the same time by different threads get their own reports.
+'''
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from time import perf_counter
+from typing import Iterator
+import json, os, sys
+
+Record = dict[str, float]
+
+def report_mode() -> str:
+    '''
+    MINIGUC_REPORT, off (default), json or table
+    '''
+    return os.environ.get('MINIGUC_REPORT', 'off').strip().lower() or 'off'
+
+def report_name(output_name: str) -> str:
+    output_dir, file_name = os.path.split(os.path.abspath(output_name))
+    return os.path.join(output_dir, f'miniguc-report.{file_name}.json')
+
+def edit_name(edit) -> str:
+    '''
+    Step name of an edit registered outside of a step, the name of its function or class
+    '''
+    return getattr(edit, '__name__', type(edit).__name__)
+
+class Report:
+    '''
+    Timings and byte counts of one output file
+    '''
+
+    def __init__(self, file_name: str, mode: str) -> None:
+        self.file_name, self.mode = os.path.abspath(file_name), mode
+        self.started, self.start = datetime.now().isoformat(timespec='seconds'), perf_counter()
+        self.variables: dict[str, Record] = {}
+        self.steps: dict[str, Record] = {}
+        self.step_names: dict[int, str] = {}
+        self.close_seconds = 0.0
+
+    def variable(self, var_name: str) -> Record:
+        return self.variables.setdefault(var_name, {
+            'read_seconds': 0.0, 'edit_seconds': 0.0, 'write_seconds': 0.0, 'bytes_read': 0, 'bytes_written': 0,
+        })
+
+    def add(self, var_name: str, kind: str, seconds: float, nbytes: int = 0) -> None:
+        '''
+        Record a read, edit or write of (a slab of) a variable
+        '''
+        record = self.variable(var_name)
+        record[f'{kind}_seconds'] += seconds
+        if kind == 'read': record['bytes_read'] += nbytes
+        if kind == 'write': record['bytes_written'] += nbytes
+
+    def add_edit(self, var_name: str, edit, seconds: float) -> None:
+        self.add(var_name, 'edit', seconds)
+        step = self.steps.setdefault(self.step_names.get(id(edit), edit_name(edit)), {'seconds': 0.0, 'calls': 0})
+        step['seconds'] += seconds
+        step['calls'] += 1
+
+    def summary(self) -> dict:
+        '''
+        JSON-ready report, with the stored size and compression ratio of every variable
+        '''
+        stored = stored_sizes(self.file_name, list(self.variables))
+        total_written = sum(record['bytes_written'] for record in self.variables.values())
+        for var_name, record in self.variables.items():
+            record['stored_bytes'] = stored.get(var_name)
+            record['compression_ratio'] = (record['bytes_written'] / stored[var_name]
+                                           if stored.get(var_name) else None)
+        file_size = os.path.getsize(self.file_name) if os.path.exists(self.file_name) else None
+        return {
+            'file': self.file_name,
+            'mode': self.mode,
+            'started': self.started,
+            'wall_seconds': perf_counter() - self.start,
+            'close_seconds': self.close_seconds,
+            'bytes_read': sum(record['bytes_read'] for record in self.variables.values()),
+            'bytes_written': total_written,
+            'file_size': file_size,
+            'compression_ratio': total_written / file_size if file_size and self.mode != 'in_place' else None,
+            'steps': dict(sorted(self.steps.items(), key=lambda item: -item[1]['seconds'])),
+            'variables': self.variables,
+        }
+
+def stored_sizes(file_name: str, var_names: list[str]) -> dict[str, int]:
+    '''
+    Bytes each variable takes in the file, needs h5py (empty without it)
+    '''
+    try:
+        import h5py
+    except ImportError:
+        return {}
+    if not os.path.exists(file_name): return {}
+    with h5py.File(file_name, 'r') as f:
+        return {name: f[name].id.get_storage_size() for name in var_names if name in f}
+
+def format_table(summary: dict, rows: int = 15) -> str:
+    '''
+    Slowest variables and modify steps of a report, as a text table
+    '''
+    mb = 1 << 20
+    lines = [f'{os.path.basename(summary["file"])} ({summary["mode"]}): {summary["wall_seconds"]:.2f} s, '
+             f'{summary["bytes_read"] / mb:.1f} MB read, {summary["bytes_written"] / mb:.1f} MB written, '
+             f'close {summary["close_seconds"]:.2f} s']
+    lines.append(f'{"variable":<22}{"read (s)":>10}{"edit (s)":>10}{"write (s)":>10}{"MB":>9}{"ratio":>8}')
+    by_time = sorted(summary['variables'].items(),
+                     key=lambda item: -(item[1]['read_seconds'] + item[1]['edit_seconds'] + item[1]['write_seconds']))
+    for var_name, record in by_time[:rows]:
+        ratio = f'{record["compression_ratio"]:.2f}' if record['compression_ratio'] else '-'
+        lines.append(f'{var_name:<22}{record["read_seconds"]:>10.3f}{record["edit_seconds"]:>10.3f}'
+                     f'{record["write_seconds"]:>10.3f}{record["bytes_written"] / mb:>9.1f}{ratio:>8}')
+    lines.append(f'{"step":<42}{"edit (s)":>10}{"calls":>8}')
+    for name, step in summary['steps'].items():
+        lines.append(f'{name:<42}{step["seconds"]:>10.3f}{step["calls"]:>8}')
+    return '\n'.join(lines)
+
+ACTIVE: ContextVar[Report | None] = ContextVar('miniguc_report', default=None)
+
+def active() -> Report | None:
+    '''
+    Report of the file being written, None when not instrumented
+    '''
+    return ACTIVE.get()
+
+@contextmanager
+def instrument(output_name: str, mode: str = 'clone') -> Iterator[Report | None]:
+    '''
+    Record the writing of output_name, the file must be closed when the block ends
+    Nested blocks (e.g. clone_dataset inside edit_in_place) add to the outer report
+    output_name     path the report is named after
+    mode            clone, in_place, or rewrite (in_place falling back to a full rewrite)
+    '''
+    if ACTIVE.get() is not None or report_mode() == 'off':
+        yield ACTIVE.get()
+        return
+
+    report = Report(output_name, mode)
+    token = ACTIVE.set(report)
+    try:
+        yield report
+    finally:
+        ACTIVE.reset(token)
+
+    # Only reached when the block succeeded
+    summary = report.summary()
+    with open(report_name(output_name), 'w') as f:
+        json.dump(summary, f, indent=2)
+    if report_mode() == 'table':
+        print(format_table(summary), file=sys.stderr)
+
+@contextmanager
+def timed(var_name: str, kind: str) -> Iterator[list[int]]:
+    '''
+    Time a read or write of a variable on the active report, append the bytes to the yielded list
+    '''
+    nbytes: list[int] = []
+    start = perf_counter()
+    yield nbytes
+    report = ACTIVE.get()
+    if report is not None: report.add(var_name, kind, perf_counter() - start, sum(nbytes))
@@ -0,0 +1,117 @@
+'''
+Vectorized array kernels used by the modify_* edits
+
+All kernels work on the whole in-memory array at once (every time step and
+level in one numpy call) and modify it in place, returning it for chaining.
+HorizontalMean and Paint wrap them as edits that can also be streamed in slabs.
+'''
+
+import numpy as np
+
+from miniguc.masks import Mask
+from miniguc.streaming import SlabEdit
+
+def horizontal_mean(values: np.ndarray, mask: np.ndarray | None = None, start_axis: int = -2) -> np.ndarray:
+    '''
+    Replace values by their mean over the horizontal axes, for all times and levels at once
+    values      array of any rank, the last two axes are south_north and west_east
+    mask        optional 2D boolean array, only these points are averaged and replaced, e.g. LANDMASK == 1
+    start_axis  first axis of the reduction, e.g. 1 to average everything except time
+    '''
+    axes = tuple(range(start_axis % values.ndim, values.ndim))
+    if mask is None:
+        values[...] = values.mean(axis=axes, keepdims=True)
+        return values
+
+    full_mask = np.broadcast_to(mask, values.shape)
+    mean = np.ma.masked_array(values, mask=~full_mask).mean(axis=axes, keepdims=True)
+    values[full_mask] = np.broadcast_to(mean, values.shape)[full_mask]
+    return values
+
+def boundary_tendency(values: np.ndarray, tendency: np.ndarray, interval_seconds: float) -> np.ndarray:
+    '''
+    Recompute wrfbdy tendencies (X_BT*) from the boundary values (X_B*) so they stay consistent
+    values              boundary values, time is the first axis
+    tendency            tendency array of the same shape, modified in place
+    interval_seconds    seconds between two boundary times
+    The last time keeps its own tendency, since the next boundary time is not in the file
+    '''
+    tendency[:-1] = np.diff(values, axis=0) / interval_seconds
+    return tendency
+
+def paint_field(values: np.ndarray, mask: Mask, value: float | np.ndarray, background: float = 0) -> np.ndarray:
+    '''
+    Overwrite a field with background, and value inside the mask, keeping the native dtype
+    values      array whose last two axes are the grid, modified in place
+    mask        region to paint
+    value       scalar, or array broadcasting against the leading axes + one point axis,
+                e.g. ahe_profile(...)[:, None] for AHE (Time, month_hour, south_north, west_east)
+    background  value outside the mask
+    '''
+    values[...] = background
+    return mask.fill(values, value)
+
+def ahe_profile(value: float, diurnal: list[float] | None = None, monthly: list[float] | None = None) -> np.ndarray:
+    '''
+    AHE along the month_hour axis of geo_em (12 months x 24 hours, month major)
+    value       base AHE (W/m2)
+    diurnal     24 hourly factors, constant through the day if None
+    monthly     12 monthly factors, constant through the year if None
+    '''
+    diurnal_factors = np.ones(24) if diurnal is None else np.asarray(diurnal, dtype=float)
+    monthly_factors = np.ones(12) if monthly is None else np.asarray(monthly, dtype=float)
+    return value * (monthly_factors[:, None] * diurnal_factors[None, :]).ravel()
+
+class HorizontalMean(SlabEdit):
+    '''
+    horizontal_mean as an edit that can be streamed, see miniguc.streaming
+    When the slabs split the averaged axes, the sums are accumulated over a first pass
+    '''
+    two_pass = True
+
+    def __init__(self, mask: np.ndarray | None = None, start_axis: int = -2) -> None:
+        self.mask, self.start_axis = mask, start_axis
+        self.sums: np.ndarray | None = None
+
+    def begin(self, shape: tuple[int, ...]) -> None:
+        self.local_axes = self.start_axis % len(shape)
+        self.kept_shape = shape[:self.local_axes]
+        self.sums, self.counts = None, None
+
+    def accumulate(self, slab: np.ndarray, index: tuple[slice, ...]) -> None:
+        shape = slab.shape
+        if self.sums is None:
+            self.sums, self.counts = np.zeros(self.kept_shape), np.zeros(self.kept_shape)
+        weights = np.ones(shape[-2:]) if self.mask is None else np.asarray(self.mask, dtype=float)
+        valid = ~np.ma.getmaskarray(slab) * weights
+        axes = tuple(range(self.local_axes, len(shape)))
+        self.sums[index[:self.local_axes]] += np.sum(np.ma.filled(slab, 0) * valid, axis=axes)
+        self.counts[index[:self.local_axes]] += np.sum(np.broadcast_to(valid, shape), axis=axes)
+
+    def apply(self, slab: np.ndarray, index: tuple[slice, ...], shape: tuple[int, ...]) -> np.ndarray:
+        if self.sums is None:
+            return horizontal_mean(slab, self.mask, self.start_axis)
+
+        mean = (self.sums / self.counts)[index[:self.local_axes]]
+        mean = mean.reshape(mean.shape + (1,) * (slab.ndim - self.local_axes))
+        if self.mask is None:
+            slab[...] = mean
+        else:
+            full_mask = np.broadcast_to(self.mask, slab.shape)
+            slab[full_mask] = np.broadcast_to(mean, slab.shape)[full_mask]
+        return slab
+
+class Paint(SlabEdit):
+    '''
+    paint_field as an edit that can be streamed, see miniguc.streaming
+    '''
+    local_axes = 1 << 16
+    reads_values = False
+
+    def __init__(self, mask: Mask, value: float | np.ndarray, background: float = 0) -> None:
+        self.mask, self.value, self.background = mask, value, background
+
+    def apply(self, slab: np.ndarray, index: tuple[slice, ...], shape: tuple[int, ...]) -> np.ndarray:
+        # The value broadcasts against the whole variable, take the part of this slab
+        value = np.broadcast_to(self.value, (*shape[:-2], 1))[(*index, slice(None))]
+        return paint_field(slab, self.mask, value, self.background)
@@ -0,0 +1,228 @@
+'''
+Region masks for land-use editing and analysis
+
+A mask is defined once (rectangle, disk, polygon, raster or land-use
+category) and evaluated lazily for each grid shape it is used on. The result
+is cached as flat index arrays, so painting the same region into every
+variable of every file in a batch is a single fancy-indexing assignment.
+
+Coordinates are grid indices (south_north, west_east). Masks can be combined
+with |, e.g. several cities: Disk((30, 30), 5) | Disk((70, 60), 8)
+
+Regions can also be given in lat/lon (LatLonBox, LatLonDisk), evaluated on the
+XLAT/XLONG of each grid. miniguc.domains maps both kinds onto nested domains.
+'''
+
+from netCDF4 import Dataset
+import numpy as np
+
+class Mask:
+    '''
+    Base class of all masks, subclasses implement compute(shape)
+    '''
+
+    def __init__(self) -> None:
+        self._cache: dict[tuple[int, int], tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def contains(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        '''
+        Whether the points at grid coordinates (y, x) are inside the region, broadcasting y against x
+        Coordinates may be fractional, e.g. the cell centres of a nest in parent grid coordinates
+        '''
+        raise NotImplementedError
+
+    def compute(self, shape: tuple[int, int]) -> np.ndarray:
+        '''
+        Boolean array of the given (south_north, west_east) shape, True inside the region
+        '''
+        y, x = np.ogrid[:shape[0], :shape[1]]
+        return np.broadcast_to(self.contains(y, x), shape)
+
+    def _indices(self, shape: tuple[int, ...]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        shape = tuple(shape[-2:])
+        if shape not in self._cache:
+            flat = np.flatnonzero(self.compute(shape))
+            self._cache[shape] = (flat, *np.unravel_index(flat, shape))
+        return self._cache[shape]
+
+    def indices(self, shape: tuple[int, ...]) -> np.ndarray:
+        '''
+        Flat indices of the region on a grid, only the last two axes of shape are used
+        '''
+        return self._indices(shape)[0]
+
+    def boolean(self, shape: tuple[int, ...]) -> np.ndarray:
+        '''
+        Boolean 2D array of the region on a grid, only the last two axes of shape are used
+        '''
+        mask = np.zeros(shape[-2:], dtype=bool)
+        mask.flat[self.indices(shape)] = True
+        return mask
+
+    def fill(self, values: np.ndarray, value: float | np.ndarray) -> np.ndarray:
+        '''
+        Set value inside the region for every leading index (time, level, ...) at once
+        values  array whose last two axes are the grid, modified in place (views work too)
+        value   scalar, or array broadcasting against values[..., n_points]
+        '''
+        _, rows, cols = self._indices(values.shape)
+        values[..., rows, cols] = value
+        return values
+
+    def select(self, values: np.ndarray) -> np.ndarray:
+        '''
+        Values inside the region, the grid axes are flattened into the last axis
+        values  array whose last two axes are the grid, xarray (wrf-python) arrays are converted
+        '''
+        _, rows, cols = self._indices(values.shape)
+        return np.asanyarray(values)[..., rows, cols]
+
+    def __or__(self, other: 'Mask') -> 'Mask':
+        return Union(self, other)
+
+    def __invert__(self) -> 'Mask':
+        return Complement(self)
+
+class Rectangle(Mask):
+    '''
+    Rectangle of size (south_north, west_east) cells around center
+    '''
+
+    def __init__(self, center: tuple[int, int], size: tuple[int, int]) -> None:
+        super().__init__()
+        self.center, self.size = center, size
+
+    def contains(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        # Cells center - size // 2 to center + size // 2 (excluded), each spanning index +- 0.5
+        (center_y, center_x), (size_y, size_x) = self.center, self.size
+        return ((center_y - size_y // 2 - 0.5 <= y) & (y < center_y + size_y // 2 - 0.5)
+                & (center_x - size_x // 2 - 0.5 <= x) & (x < center_x + size_x // 2 - 0.5))
+
+class Disk(Mask):
+    '''
+    Disk of radius cells around center
+    '''
+
+    def __init__(self, center: tuple[float, float], radius: float) -> None:
+        super().__init__()
+        self.center, self.radius = center, radius
+
+    def contains(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        return (y - self.center[0]) ** 2 + (x - self.center[1]) ** 2 <= self.radius ** 2
+
+class Polygon(Mask):
+    '''
+    Polygon given by its (south_north, west_east) vertices, cell centres inside are selected
+    '''
+
+    def __init__(self, vertices: list[tuple[float, float]]) -> None:
+        super().__init__()
+        self.vertices = np.asarray(vertices, dtype=float)
+
+    def contains(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        # Even-odd ray casting along west_east, vectorized over all cells for each edge
+        inside = np.zeros(np.broadcast_shapes(np.shape(y), np.shape(x)), dtype=bool)
+        for (y0, x0), (y1, x1) in zip(self.vertices, np.roll(self.vertices, -1, axis=0)):
+            if y0 == y1: continue
+            crosses = (y0 > y) != (y1 > y)
+            x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+            inside ^= crosses & (x < x_cross)
+        return inside
+
+class Raster(Mask):
+    '''
+    Mask from an existing boolean (or 0/1) array, e.g. read from a file
+    '''
+
+    def __init__(self, array: np.ndarray) -> None:
+        super().__init__()
+        self.array = np.asarray(array).astype(bool)
+
+    def compute(self, shape: tuple[int, int]) -> np.ndarray:
+        if self.array.shape != tuple(shape):
+            raise ValueError(f'Raster mask of shape {self.array.shape} used on a {tuple(shape)} grid')
+        return self.array
+
+    def contains(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        # Nearest cell, points beyond the edges take the value of the edge
+        rows = np.clip(np.rint(y), 0, self.array.shape[0] - 1).astype(int)
+        cols = np.clip(np.rint(x), 0, self.array.shape[1] - 1).astype(int)
+        return self.array[rows, cols]
+
+class LandUse(Raster):
+    '''
+    Cells whose LU_INDEX is one of the given categories
+    '''
+
+    def __init__(self, lu_index: np.ndarray, categories: int | list[int]) -> None:
+        super().__init__(np.isin(np.asarray(lu_index), np.atleast_1d(categories)))
+        self.categories = categories
+
+    @classmethod
+    def from_dataset(cls, dataset: Dataset, categories: int | list[int] | str = 'ISURBAN') -> 'LandUse':
+        '''
+        categories  category numbers, or the name of a global attribute such as ISURBAN or ISWATER
+        '''
+        if isinstance(categories, str): categories = int(dataset.getncattr(categories))
+        return cls(dataset.variables['LU_INDEX'][0][:], categories)
+
+class Union(Mask):
+    def __init__(self, *masks: Mask) -> None:
+        super().__init__()
+        self.masks = masks
+
+    def compute(self, shape: tuple[int, int]) -> np.ndarray:
+        return np.logical_or.reduce([mask.boolean(shape) for mask in self.masks])
+
+    def contains(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        return np.logical_or.reduce([mask.contains(y, x) for mask in self.masks])
+
+class Complement(Mask):
+    def __init__(self, mask: Mask) -> None:
+        super().__init__()
+        self.mask = mask
+
+    def compute(self, shape: tuple[int, int]) -> np.ndarray:
+        return ~self.mask.boolean(shape)
+
+    def contains(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        return ~self.mask.contains(y, x)
+
+class LatLonRegion:
+    '''
+    Region in geographic coordinates, subclasses implement contains_latlon(lat, lon)
+    '''
+
+    def contains_latlon(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def on_grid(self, lat: np.ndarray, lon: np.ndarray) -> Mask:
+        '''
+        Mask of the region on a grid given its 2D XLAT and XLONG
+        '''
+        return Raster(self.contains_latlon(np.asarray(lat), np.asarray(lon)))
+
+class LatLonBox(LatLonRegion):
+    '''
+    Cells whose centre is between south and north (degrees north) and west and east (degrees east)
+    '''
+
+    def __init__(self, south: float, north: float, west: float, east: float) -> None:
+        self.south, self.north, self.west, self.east = south, north, west, east
+
+    def contains_latlon(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        return (self.south <= lat) & (lat <= self.north) & (self.west <= lon) & (lon <= self.east)
+
+class LatLonDisk(LatLonRegion):
+    '''
+    Cells whose centre is within radius km of center (lat, lon), great-circle distance
+    '''
+    EARTH_RADIUS = 6370.0 # km, the sphere WRF uses
+
+    def __init__(self, center: tuple[float, float], radius: float) -> None:
+        self.center, self.radius = center, radius
+
+    def contains_latlon(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        lat0, lon0, lat, lon = map(np.radians, (*self.center, lat, lon))
+        haversine = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2
+        return 2 * self.EARTH_RADIUS * np.arcsin(np.sqrt(haversine)) <= self.radius
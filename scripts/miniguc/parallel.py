@@ -0,0 +1,81 @@
+'''
+Process-pool driver for editing independent files, e.g. the met_em.d01.* time files
+or the geo_em/wrfinput files of every domain
+
+Every file is written to a temporary file next to its destination and renamed
+over it only once it is complete, so a failing file leaves the original intact.
+'''
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from multiprocessing import get_context
+from typing import Callable
+import os
+
+from miniguc.instrument import instrument
+
+def default_workers() -> int:
+    '''
+    Number of workers, MINIGUC_WORKERS if set, otherwise one per core
+    '''
+    return int(os.environ.get('MINIGUC_WORKERS', os.cpu_count() or 1))
+
+def modify_atomic(modify: Callable[[str, str], None], input_name: str, output_name: str) -> str:
+    '''
+    Run modify(input_name, tmp_name), then atomically move the temporary file to output_name
+    '''
+    output_dir, file_name = os.path.split(os.path.abspath(output_name))
+    tmp_name = os.path.join(output_dir, f'.{file_name}.{os.getpid()}.tmp')
+    try:
+        # Reported under the final name, see miniguc.instrument
+        with instrument(output_name):
+            modify(input_name, tmp_name)
+            os.replace(tmp_name, output_name)
+    finally:
+        if os.path.exists(tmp_name): os.remove(tmp_name)
+    return output_name
+
+def for_each_file(function: Callable[..., object], file_names: list[str], *args: list,
+                  workers: int | None = None, action: str = 'Modified') -> None:
+    '''
+    Call function(file_name, *(arg[i] for arg in args)) for every file on a pool of worker processes
+    function    must be defined at module level (or in the script) so workers can find it
+    file_names  files to process, e.g. one per domain
+    args        lists of extra arguments, one item per file
+    workers     number of processes, see default_workers
+    action      verb of the progress messages
+    Raises RuntimeError listing the files that failed once all the others are done
+    '''
+    workers = min(workers or default_workers(), len(file_names)) or 1
+    failures: list[str] = []
+
+    # fork, so the workers see the functions defined in a script or notebook as is
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork')) as pool:
+        futures = {
+            pool.submit(function, file_name, *extra): file_name
+            for file_name, *extra in zip(file_names, *args)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            file_name = futures[future]
+            try:
+                future.result()
+                print(f'[{done}/{len(futures)}] {action} {os.path.basename(file_name)}')
+            except Exception as error:
+                failures.append(file_name)
+                print(f'[{done}/{len(futures)}] Failed {os.path.basename(file_name)}: {error!r}')
+
+    if len(failures) > 0:
+        raise RuntimeError(f'{len(failures)} file(s) failed: {", ".join(failures)}')
+
+def process_files(modify: Callable[[str, str], None], input_names: list[str], output_names: list[str],
+                  workers: int | None = None) -> None:
+    '''
+    Apply modify to every file on a pool of worker processes
+    modify          function writing the modified input_name to the given output path,
+                    must be defined at module level (or in the script) so workers can find it
+    input_names     files to modify
+    output_names    destination of each file, may be the input itself
+    workers         number of processes, see default_workers
+    Raises RuntimeError listing the files that failed once all the others are done
+    '''
+    for_each_file(partial(modify_atomic, modify), input_names, output_names, workers=workers)
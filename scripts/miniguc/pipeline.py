@@ -0,0 +1,384 @@
+'''
+Resumable stage graph of the preprocessing of a run
+
+    geogrid (geogrid.exe + miniguc-edit geogrid) ─┐
+                                                  ├─ metgrid (metgrid.exe + miniguc-edit metgrid) ─ promote ─ real
+    ungrib (ungrib.exe) ──────────────────────────┘
+    promote: geo_em and met_em into the run directory, real: real.exe + miniguc-edit wrfinput, wrfbdy
+
+Every stage runs its commands, checks their exit status (and the success line of
+their log, WRF executables often exit with 0 anyway), then records a completion
+marker with the sha256 of its outputs in miniguc-pipeline.json in the run
+directory. A stage is up to date when its key (namelist sections, input files
+and the keys and output hashes of the stages before it, see miniguc.stage_cache) and its
+outputs still match that marker, so running the pipeline again resumes from the
+first failed or stale stage. Stages whose dependencies are done run concurrently,
+e.g. geogrid and its edits alongside ungrib. Outputs already in the stage cache
+are restored instead of running the stage.
+
+    python -m miniguc.pipeline RUN_ID [--from STAGE] [--status] [--jobs N]
+    python -m miniguc.pipeline RUN_ID --only real    # real.exe and its edits again, on the met_em of the run
+
+The output of every stage goes to miniguc-pipeline.<stage>.log in the run directory,
+the status of the run (preparing, prepared or failed) to miniguc.registry.
+'''
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from glob import glob
+from time import perf_counter
+from typing import Callable, TextIO
+import argparse, hashlib, json, os, subprocess, sys, threading
+
+from miniguc.sandbox import create_sandbox, promote, sandbox_dir
+from miniguc.stage_cache import hash_file, restore, stage_key, store
+
+STATE_NAME = 'miniguc-pipeline.json'
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StageError(RuntimeError):
+    pass
+
+class Command:
+    '''
+    External command of a stage
+    args        command line, run in the directory of the stage
+    success     text the log must contain for the command to count as successful
+    success_log file of the stage directory holding that text, the output of the command by default
+    '''
+
+    def __init__(self, args: list[str], success: str | None = None, success_log: str | None = None) -> None:
+        self.args, self.success, self.success_log = args, success, success_log
+
+    def run(self, work_dir: str, log: TextIO) -> None:
+        log.write(f'$ {" ".join(self.args)}\n')
+        log.flush()
+        start = log.tell()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SCRIPTS_DIR, os.environ.get('PYTHONPATH')])))
+        try:
+            returncode = subprocess.run(self.args, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT, env=env).returncode
+        except OSError as error:
+            raise StageError(f'{self.args[0]}: {error.strerror}') from None
+        if returncode != 0:
+            raise StageError(f'{" ".join(self.args)} exited with status {returncode}')
+        if self.success is None: return
+
+        log.flush()
+        if self.success_log is None:
+            with open(log.name) as f:
+                f.seek(start)
+                output = f.read()
+        else:
+            try:
+                with open(os.path.join(work_dir, self.success_log), errors='replace') as f: output = f.read()
+            except FileNotFoundError:
+                output = ''
+        if self.success not in output:
+            raise StageError(f'{" ".join(self.args)} did not report "{self.success}"'
+                             + (f' in {self.success_log}' if self.success_log else ''))
+
+class Promote:
+    '''
+    Promote the files of another directory into the stage directory, see miniguc.sandbox.promote
+    '''
+
+    def __init__(self, source_dir: str, patterns: list[str]) -> None:
+        self.source_dir, self.patterns = source_dir, patterns
+
+    def run(self, work_dir: str, log: TextIO) -> None:
+        for file_name in promote(self.source_dir, self.patterns, work_dir):
+            log.write(f'Promoted {os.path.basename(file_name)} from {self.source_dir}\n')
+
+Step = Command | Promote
+
+class Stage:
+    '''
+    Node of the pipeline
+    name        stage name, also its name in the stage cache
+    work_dir    directory the commands run in, outputs and inputs are relative to it
+    steps       commands run in order, the stage fails at the first failing one
+    outputs     globs of the files the stage produces, removed before it runs
+    after       names of the stages this one needs
+    namelists   {namelist: sections, None for all} the stage reads
+    inputs      globs of other files the outputs depend on, e.g. GRIB files or edit scripts
+    clean       other globs to remove before the stage runs
+    cache       restore the outputs from the stage cache when possible
+    '''
+
+    def __init__(self, name: str, work_dir: str, steps: list[Step], outputs: list[str], after: list[str] | None = None,
+                 namelists: dict[str, list[str] | None] | None = None, inputs: list[str] | None = None,
+                 clean: list[str] | None = None, cache: bool = True) -> None:
+        self.name, self.work_dir, self.steps, self.outputs = name, work_dir, steps, outputs
+        self.after, self.namelists, self.inputs = after or [], namelists or {}, inputs or []
+        self.clean, self.cache = clean or [], cache
+
+    def path(self, pattern: str) -> str:
+        return os.path.join(self.work_dir, pattern)
+
+    def key(self, upstream: list[str]) -> str:
+        '''
+        Stage key from its namelists, inputs and the keys and output digests of the stages before it, see upstream
+        '''
+        namelists = {self.path(name): sections for name, sections in self.namelists.items()}
+        input_files = [name for pattern in self.inputs for name in sorted(glob(self.path(pattern)))]
+        return stage_key(self.name, namelists, input_files, after=upstream)
+
+    def output_files(self) -> list[str]:
+        file_names = []
+        for pattern in self.outputs:
+            matches = sorted(glob(self.path(pattern)))
+            if len(matches) == 0: raise StageError(f'{self.name} produced no {pattern} in {self.work_dir}')
+            file_names += matches
+        return file_names
+
+    def remove_outputs(self) -> None:
+        for pattern in self.outputs + self.clean:
+            for file_name in glob(self.path(pattern)):
+                os.remove(file_name)
+
+def upstream(stage: Stage, state: dict) -> list[str]:
+    '''
+    Keys and output digests of the stages before a stage, from their markers
+    The keys are chained too, so a change upstream (e.g. to an editor) invalidates
+    the stages after it even when the upstream outputs come out byte-identical
+    '''
+    return [value for name in stage.after for value in (state[name]['key'], state[name]['digest'])]
+
+def outputs_digest(outputs: dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(outputs, sort_keys=True).encode()).hexdigest()
+
+def load_state(state_dir: str) -> dict:
+    try:
+        with open(os.path.join(state_dir, STATE_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state_dir: str, state: dict) -> None:
+    state_name = os.path.join(state_dir, STATE_NAME)
+    with open(f'{state_name}.tmp', 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(f'{state_name}.tmp', state_name)
+
+def is_current(stage: Stage, record: dict | None, key: str) -> bool:
+    '''
+    Whether the marker of a stage matches its key and its outputs are unchanged
+    Output hashes are remembered by size and mtime, so this only reads files that changed
+    '''
+    if record is None or record.get('status') != 'done' or record.get('key') != key: return False
+    for name, sha256 in record['outputs'].items():
+        if not os.path.isfile(stage.path(name)) or hash_file(stage.path(name)) != sha256: return False
+    return True
+
+def adopt(stage: Stage, state: dict) -> dict:
+    '''
+    Marker of a stage that is not run again, its own when its outputs are unchanged, otherwise
+    one taking the outputs already in its directory as they are (runs prepared before the pipeline)
+    Raises StageError when the outputs are missing
+    '''
+    record = state.get(stage.name)
+    if record is not None and is_current(stage, record, record.get('key')): return record
+    outputs = {os.path.relpath(file_name, stage.work_dir): hash_file(file_name) for file_name in stage.output_files()}
+    return {'status': 'done', 'key': None, 'outputs': outputs, 'digest': outputs_digest(outputs), 'adopted': True}
+
+def sorted_stages(stages: list[Stage]) -> list[Stage]:
+    '''
+    Stages in dependency order, raises ValueError on unknown stages or cycles
+    '''
+    by_name = {stage.name: stage for stage in stages}
+    ordered: list[Stage] = []
+    visiting: set[str] = set()
+
+    def visit(stage: Stage) -> None:
+        if stage in ordered: return
+        if stage.name in visiting: raise ValueError(f'Cycle in the pipeline at {stage.name}')
+        visiting.add(stage.name)
+        for name in stage.after:
+            if name not in by_name: raise ValueError(f'{stage.name} runs after unknown stage {name}')
+            visit(by_name[name])
+        ordered.append(stage)
+
+    for stage in stages: visit(stage)
+    return ordered
+
+def downstream(stages: list[Stage], names: list[str]) -> set[str]:
+    '''
+    The given stages and every stage depending on them
+    '''
+    selected = set(names)
+    for stage in sorted_stages(stages):
+        if any(name in selected for name in stage.after): selected.add(stage.name)
+    return selected
+
+def status(stages: list[Stage], state_dir: str) -> dict[str, str]:
+    '''
+    done, failed, stale (to run again) or waiting (after a stage that is not done) for every stage
+    '''
+    state, states = load_state(state_dir), {}
+    for stage in sorted_stages(stages):
+        record = state.get(stage.name)
+        if any(states[name] != 'done' for name in stage.after):
+            states[stage.name] = 'waiting'
+        elif is_current(stage, record, stage.key(upstream(stage, state))):
+            states[stage.name] = 'done'
+        else:
+            states[stage.name] = 'failed' if record is not None and record.get('status') == 'failed' else 'stale'
+    return states
+
+def run_stage(stage: Stage, state: dict, state_dir: str, lock: threading.Lock, force: bool,
+              log: Callable[[str], None]) -> None:
+    key = stage.key(upstream(stage, state))
+    if not force and is_current(stage, state.get(stage.name), key):
+        log(f'{stage.name}: up to date')
+        return
+
+    started, start = datetime.now().isoformat(timespec='seconds'), perf_counter()
+    stage.remove_outputs()
+    log_name = os.path.join(state_dir, f'miniguc-pipeline.{stage.name}.log')
+    try:
+        restored = stage.cache and restore(stage.name, key, stage.work_dir)
+        if restored:
+            log(f'{stage.name}: restored from cache ({key[:12]})')
+        else:
+            log(f'{stage.name}: running, see {log_name}')
+            with open(log_name, 'w') as log_file:
+                for step in stage.steps:
+                    step.run(stage.work_dir, log_file)
+        file_names = stage.output_files()
+        if stage.cache and not restored: store(stage.name, key, file_names)
+    except Exception as error:
+        with lock:
+            state[stage.name] = {'status': 'failed', 'key': key, 'error': str(error), 'started': started,
+                                 'seconds': perf_counter() - start, 'log': log_name}
+            save_state(state_dir, state)
+        raise
+
+    outputs = {os.path.relpath(file_name, stage.work_dir): hash_file(file_name) for file_name in file_names}
+    with lock:
+        state[stage.name] = {'status': 'done', 'key': key, 'outputs': outputs, 'digest': outputs_digest(outputs),
+                             'restored': bool(restored), 'started': started, 'seconds': perf_counter() - start}
+        save_state(state_dir, state)
+    log(f'{stage.name}: done in {perf_counter() - start:.1f} s')
+
+def run_pipeline(stages: list[Stage], state_dir: str, force: list[str] | None = None, jobs: int | None = None,
+                 log: Callable[[str], None] = print, only: list[str] | None = None) -> bool:
+    '''
+    Run every stage that is not up to date, each as soon as the stages before it are done
+    stages      stages of the pipeline, see idealized_run
+    state_dir   directory of the completion markers and logs, e.g. the run directory
+    force       stages to run again even when up to date, along with everything after them
+    jobs        stages running at once, all independent ones by default
+    log         progress messages
+    only        run these stages again and nothing else, on the outputs of the stages
+                before them as they are (see adopt), e.g. ['real'] to refresh a run
+    Returns False if a stage failed, the stages after it are left for the next run
+    '''
+    stages = sorted_stages(stages)
+    forced = downstream(stages, force or []) | set(only or [])
+    state, lock, log_lock = load_state(state_dir), threading.Lock(), threading.Lock()
+    unlocked_log = log
+
+    def log(message: str) -> None:
+        # One line at a time from the stage threads
+        with log_lock: unlocked_log(message)
+
+    pending, done, failed = {stage.name: stage for stage in stages}, set(), []
+    if only is not None:
+        pending = {stage.name: stage for stage in stages if stage.name in only}
+        by_name = {stage.name: stage for stage in stages}
+        for name in {name for stage in pending.values() for name in stage.after if name not in pending}:
+            try:
+                state[name] = adopt(by_name[name], state)
+            except StageError as error:
+                log(f'{name}: {error}, needed by {", ".join(pending)}')
+                return False
+            done.add(name)
+        save_state(state_dir, state)
+
+    with ThreadPoolExecutor(max_workers=jobs or len(stages)) as pool:
+        running = {}
+        while True:
+            # Nothing new starts after a failure, the running stages are left to finish
+            for name, stage in list(pending.items()):
+                if len(failed) == 0 and all(dependency in done for dependency in stage.after):
+                    del pending[name]
+                    running[pool.submit(run_stage, stage, state, state_dir, lock, name in forced, log)] = name
+            if len(running) == 0: break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    done.add(name)
+                except Exception as error:
+                    failed.append(name)
+                    log(f'{name}: failed, {error}')
+
+    if len(failed) > 0:
+        log(f'Failed: {", ".join(failed)}, not run: {", ".join(pending) or "-"}. Run again to resume')
+    return len(failed) == 0
+
+def idealized_run(run_dir: str, project_dir: str) -> list[Stage]:
+    '''
+    Stages of generate-idealized-run.sh: WPS in the sandbox of the run (see miniguc.sandbox),
+    real.exe in the run directory
+    '''
+    sandbox = sandbox_dir(run_dir)
+    edits_dir = os.path.join(project_dir, 'scripts', 'miniguc')
+    edit = [sys.executable, '-m', 'miniguc.cli']
+    # The editors use the whole package (engine, kernels, masks, ...), not only their module in miniguc.edits
+    editor = [os.path.join(edits_dir, '*.py'), os.path.join(edits_dir, 'edits', '*.py')]
+    # WPS programs print this at the end of their log, real.exe in rsl.error.0000
+    wps_success = 'Successful completion'
+    return [
+        Stage('geogrid', sandbox, [Command(['./geogrid.exe'], wps_success, 'geogrid.log'), Command(edit + ['geogrid'])],
+              outputs=['geo_em.d*'], namelists={'namelist.wps': ['share', 'geogrid']}, inputs=editor),
+        Stage('ungrib', sandbox, [Command(['./ungrib.exe'], wps_success, 'ungrib.log')],
+              outputs=['FILE:*'], namelists={'namelist.wps': ['share', 'ungrib']}, inputs=['GRIBFILE.*', 'Vtable']),
+        Stage('metgrid', sandbox, [Command(['./metgrid.exe'], wps_success, 'metgrid.log'), Command(edit + ['metgrid'])],
+              outputs=['met_em.d*'], after=['geogrid', 'ungrib'], namelists={'namelist.wps': ['share', 'metgrid']},
+              inputs=editor),
+        # geo_em and met_em are linked rather than moved, so the WPS stages stay complete
+        # Never cached, the run directory must hold the files of the current WPS stages even when real is restored
+        Stage('promote', run_dir, [Promote(sandbox, ['geo_em.d*', 'met_em.d*'])], outputs=['geo_em.d*', 'met_em.d*'],
+              after=['geogrid', 'metgrid'], cache=False),
+        Stage('real', run_dir, [
+            Command(['mpirun', '-np', '1', './real.exe'], 'SUCCESS COMPLETE REAL_EM INIT', 'rsl.error.0000'),
+            Command(edit + ['wrfinput']),
+            Command(edit + ['wrfbdy']),
+        ], outputs=['wrfinput_d*', 'wrfbdy_d01'], after=['promote'], namelists={'namelist.input': None},
+              inputs=editor, clean=['wrfout*']),
+    ]
+
+def main(argv: list[str]) -> int:
+    from miniguc.cli import run_dir
+    from miniguc.files import ROOT_DIR
+    from miniguc.registry import record_status
+
+    parser = argparse.ArgumentParser(prog='python -m miniguc.pipeline', description=__doc__.split('\n')[1])
+    parser.add_argument('run_id', type=int, help='run ID, e.g. 45 for runs/045-*')
+    parser.add_argument('--from', dest='force', nargs='+', default=[], help='run these stages (and the next) again')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='run only these stages again, on the files of the stages before them as they are')
+    parser.add_argument('--status', action='store_true', help='only print the state of every stage')
+    parser.add_argument('--jobs', type=int, default=None, help='stages running at once')
+    args = parser.parse_args(argv)
+
+    folder = run_dir(args.run_id)
+    stages = idealized_run(folder, ROOT_DIR)
+    # Refreshing real leaves WPS (and its sandbox) alone
+    if args.only is None or any(stage.work_dir == sandbox_dir(folder) for stage in stages if stage.name in args.only):
+        create_sandbox(os.path.join(ROOT_DIR, 'Build_WRF', 'WPS'), folder)
+    unknown = [name for name in args.force + (args.only or []) if name not in [stage.name for stage in stages]]
+    if len(unknown) > 0: parser.error(f'unknown stage {", ".join(unknown)}, choose from {", ".join(s.name for s in stages)}')
+    print(f'Selected run no.{args.run_id} ({folder})')
+    if args.status:
+        for name, state in status(stages, folder).items(): print(f'{name:<10}{state}')
+        return 0
+    record_status(folder, 'preparing')
+    succeeded = run_pipeline(stages, folder, args.force, args.jobs, only=args.only)
+    record_status(folder, 'prepared' if succeeded else 'failed')
+    return 0 if succeeded else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
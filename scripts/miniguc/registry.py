@@ -0,0 +1,349 @@
+'''
+Registry of the runs, an SQLite index mapping run IDs to their directory and files
+
+Finding a file of a run used to glob runs/ every time, thousands of times for a
+video that opens the files of several runs for every frame. The registry keeps,
+for every run ID, its directory, the names of its files, its status, parameters
+(from namelist.input and set by hand) and timestamps in runs/.miniguc-runs.sqlite.
+A lookup is a query by run ID, then a dict lookup for the rest of the process.
+
+The pipeline (miniguc.pipeline) and the scheduler (miniguc.scheduler) record the
+status of the runs they prepare and run. scan reads again only the run directories
+that changed since the previous scan, and can run in the background with --every.
+A run missing from the registry, or a file missing from its run, is scanned on lookup.
+
+    python -m miniguc.registry scan [--every 60]
+    python -m miniguc.registry list [--status done]
+    python -m miniguc.registry path 45 [wrfout*]
+    python -m miniguc.registry show 45
+    python -m miniguc.registry set 45 [--status failed] [--param ahe=100 ...]
+
+and from Python
+
+    from miniguc.registry import run_file
+    dataset = Dataset(run_file(45, 'wrfout*'))
+'''
+
+from datetime import datetime
+from fnmatch import fnmatch
+from time import sleep, time
+import argparse, json, os, re, sqlite3, sys
+
+from miniguc.files import ROOT_DIR
+from miniguc.pipeline import STATE_NAME
+from miniguc.scheduler import RECORD_NAME
+from miniguc.stage_cache import read_namelist
+
+REGISTRY_NAME = '.miniguc-runs.sqlite'
+RUN_NAME = re.compile(r'(\d{3,})(-|$)')
+# namelist.input values kept as parameters of a run, {section: [key]}
+NAMELIST_PARAMETERS = {
+    'time_control': ['run_days', 'run_hours', 'start_year', 'start_month', 'start_day', 'start_hour'],
+    'domains': ['max_dom', 'e_we', 'e_sn', 'e_vert', 'dx', 'dy'],
+}
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    status TEXT NOT NULL,
+    status_time REAL NOT NULL,
+    parameters TEXT NOT NULL,
+    created TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    dir_mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    run_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status);
+'''
+
+def run_id_of(name: str) -> int | None:
+    '''
+    Run ID of a run directory name, 45 for 045-some-name, None for run-template
+    '''
+    match = RUN_NAME.match(name)
+    return int(match.group(1)) if match is not None else None
+
+def derived_status(directory: str, names: list[str]) -> tuple[str, float]:
+    '''
+    Status of a run from its files, and the time it was reached
+    done or failed when wrf.exe ran (miniguc-wrf.json or wrfout files), prepared,
+    preparing or failed after the pipeline (miniguc-pipeline.json), new otherwise
+    '''
+    def mtime(name: str) -> float:
+        return os.path.getmtime(os.path.join(directory, name))
+
+    if RECORD_NAME in names:
+        try:
+            with open(os.path.join(directory, RECORD_NAME)) as f:
+                exit_status = json.load(f).get('exit_status')
+        except (OSError, json.JSONDecodeError):
+            exit_status = None
+        return 'done' if exit_status == 0 else 'failed', mtime(RECORD_NAME)
+    wrfout = sorted(name for name in names if name.startswith('wrfout'))
+    if len(wrfout) > 0:
+        return 'done', mtime(wrfout[-1])
+    if STATE_NAME in names:
+        try:
+            with open(os.path.join(directory, STATE_NAME)) as f:
+                stages = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            stages = {}
+        states = [stage.get('status') for stage in stages.values()]
+        status = 'failed' if 'failed' in states else 'prepared' if stages.get('real', {}).get('status') == 'done' \
+            else 'preparing'
+        return status, mtime(STATE_NAME)
+    return 'new', 0.0
+
+def run_mtime(directory: str) -> float:
+    '''
+    Last change of a run directory, including its status files which are rewritten in place
+    '''
+    names = [os.path.join(directory, name) for name in [RECORD_NAME, STATE_NAME]]
+    return max([os.path.getmtime(directory)] + [os.path.getmtime(name) for name in names if os.path.exists(name)])
+
+def namelist_parameters(directory: str) -> dict[str, str]:
+    try:
+        namelist = read_namelist(os.path.join(directory, 'namelist.input'))
+    except OSError:
+        return {}
+    return {key: namelist[section][key] for section, keys in NAMELIST_PARAMETERS.items()
+            for key in keys if key in namelist.get(section, {})}
+
+class Run:
+    '''
+    One row of the registry
+    '''
+
+    def __init__(self, row: sqlite3.Row, names: list[str]) -> None:
+        self.id, self.name, self.dir, self.status = row['id'], row['name'], row['dir'], row['status']
+        self.parameters: dict = json.loads(row['parameters'])
+        self.created, self.updated = row['created'], row['updated']
+        self.names = names
+
+    def file(self, pattern: str) -> str | None:
+        '''
+        Path of the first file of the run matching pattern, None if there is none
+        '''
+        matches = sorted(name for name in self.names if fnmatch(name, pattern))
+        return os.path.join(self.dir, matches[0]) if len(matches) > 0 else None
+
+    def as_dict(self) -> dict:
+        return {'id': self.id, 'name': self.name, 'dir': self.dir, 'status': self.status,
+                'parameters': self.parameters, 'created': self.created, 'updated': self.updated, 'files': self.names}
+
+class Registry:
+    '''
+    Index of the runs of a runs directory, in runs_dir/.miniguc-runs.sqlite
+    runs_dir    $MINIGUC_ROOT/runs by default
+    '''
+
+    def __init__(self, runs_dir: str | None = None) -> None:
+        self.runs_dir = os.path.abspath(runs_dir or os.path.join(ROOT_DIR, 'runs'))
+        self.connection = sqlite3.connect(os.path.join(self.runs_dir, REGISTRY_NAME), timeout=60)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+        # Runs already read by this process, lookups of the same run don't query again
+        self.cache: dict[int, Run] = {}
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def scan(self, full: bool = False) -> int:
+        '''
+        Update the registry from the run directories, removing the runs that are gone
+        full    read every run again, otherwise only the directories modified since the last scan
+        Returns the number of runs read
+        '''
+        directories: dict[int, str] = {}
+        for name in sorted(os.listdir(self.runs_dir)):
+            run_id = run_id_of(name)
+            # The first directory of an ID, like the glob of runs/045* used to
+            if run_id is not None and run_id not in directories and os.path.isdir(os.path.join(self.runs_dir, name)):
+                directories[run_id] = os.path.join(self.runs_dir, name)
+
+        known = {row['id']: row for row in self.connection.execute('SELECT id, dir, dir_mtime FROM runs')}
+        read = 0
+        with self.connection:
+            for run_id in set(known) - set(directories):
+                self.connection.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+                self.connection.execute('DELETE FROM files WHERE run_id = ?', (run_id,))
+            for run_id, directory in directories.items():
+                row = known.get(run_id)
+                if full or row is None or row['dir'] != directory or row['dir_mtime'] != run_mtime(directory):
+                    self.update_run(run_id, directory)
+                    read += 1
+        self.cache.clear()
+        return read
+
+    def update_run(self, run_id: int, directory: str) -> None:
+        '''
+        Read one run directory into the registry, in the transaction of the caller
+        The status is only changed when the files show a newer one than the recorded status
+        '''
+        mtime = run_mtime(directory)
+        names = sorted(name for name in os.listdir(directory) if not name.startswith('.'))
+        status, status_time = derived_status(directory, names)
+        now = datetime.now().isoformat(timespec='seconds')
+        row = self.connection.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+        if row is None:
+            parameters = namelist_parameters(directory)
+            self.connection.execute('INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                run_id, os.path.basename(directory), directory, status, status_time,
+                json.dumps(parameters), now, now, mtime,
+            ))
+        else:
+            if status_time <= row['status_time']: status, status_time = row['status'], row['status_time']
+            parameters = {**json.loads(row['parameters']), **namelist_parameters(directory)}
+            self.connection.execute(
+                'UPDATE runs SET name = ?, dir = ?, status = ?, status_time = ?, parameters = ?, updated = ?, '
+                'dir_mtime = ? WHERE id = ?',
+                (os.path.basename(directory), directory, status, status_time, json.dumps(parameters), now, mtime, run_id)
+            )
+        self.connection.execute('DELETE FROM files WHERE run_id = ?', (run_id,))
+        self.connection.executemany('INSERT INTO files VALUES (?, ?)', [(run_id, name) for name in names])
+        self.cache.pop(run_id, None)
+
+    def refresh(self, run_id: int) -> None:
+        '''
+        Read one run again, found by its ID in the runs directory
+        '''
+        names = sorted(name for name in os.listdir(self.runs_dir) if run_id_of(name) == run_id
+                       and os.path.isdir(os.path.join(self.runs_dir, name)))
+        with self.connection:
+            if len(names) > 0:
+                self.update_run(run_id, os.path.join(self.runs_dir, names[0]))
+            else:
+                self.connection.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+                self.connection.execute('DELETE FROM files WHERE run_id = ?', (run_id,))
+                self.cache.pop(run_id, None)
+
+    def get(self, run_id: int) -> Run:
+        '''
+        A run by ID, raises KeyError if there is no such run
+        '''
+        if run_id in self.cache: return self.cache[run_id]
+        row = self.connection.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+        if row is None or not os.path.isdir(row['dir']):
+            self.refresh(run_id)
+            row = self.connection.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+            if row is None: raise KeyError(f'No run with ID {run_id} in {self.runs_dir}')
+        names = [name for (name,) in self.connection.execute('SELECT name FROM files WHERE run_id = ?', (run_id,))]
+        self.cache[run_id] = Run(row, names)
+        return self.cache[run_id]
+
+    def run_dir(self, run_id: int) -> str:
+        return self.get(run_id).dir
+
+    def run_file(self, run_id: int, pattern: str) -> str:
+        '''
+        Path of the first file of a run matching pattern, e.g. run_file(45, 'wrfout*')
+        Raises FileNotFoundError if the run has no such file, even after reading it again
+        '''
+        file_name = self.get(run_id).file(pattern)
+        if file_name is None or not os.path.exists(file_name):
+            self.refresh(run_id)
+            file_name = self.get(run_id).file(pattern)
+        if file_name is None: raise FileNotFoundError(f'No {pattern} in {self.get(run_id).dir}')
+        return file_name
+
+    def runs(self, status: str | None = None) -> list[Run]:
+        query, values = 'SELECT id FROM runs', ()
+        if status is not None: query, values = query + ' WHERE status = ?', (status,)
+        return [self.get(run_id) for (run_id,) in self.connection.execute(query + ' ORDER BY id', values).fetchall()]
+
+    def set_status(self, run_id: int, status: str) -> None:
+        self.get(run_id)
+        with self.connection:
+            self.connection.execute('UPDATE runs SET status = ?, status_time = ?, updated = ? WHERE id = ?',
+                                    (status, time(), datetime.now().isoformat(timespec='seconds'), run_id))
+        self.cache.pop(run_id, None)
+
+    def set_parameters(self, run_id: int, parameters: dict) -> None:
+        run = self.get(run_id)
+        with self.connection:
+            self.connection.execute('UPDATE runs SET parameters = ?, updated = ? WHERE id = ?', (
+                json.dumps({**run.parameters, **parameters}), datetime.now().isoformat(timespec='seconds'), run_id
+            ))
+        self.cache.pop(run_id, None)
+
+REGISTRIES: dict[str, Registry] = {}
+
+def registry(runs_dir: str | None = None) -> Registry:
+    '''
+    The registry of a runs directory ($MINIGUC_ROOT/runs by default), opened once per process
+    '''
+    runs_dir = os.path.abspath(runs_dir or os.path.join(ROOT_DIR, 'runs'))
+    if runs_dir not in REGISTRIES: REGISTRIES[runs_dir] = Registry(runs_dir)
+    return REGISTRIES[runs_dir]
+
+def run_dir(run_id: int, runs_dir: str | None = None) -> str:
+    return registry(runs_dir).run_dir(run_id)
+
+def run_file(run_id: int, pattern: str, runs_dir: str | None = None) -> str:
+    return registry(runs_dir).run_file(run_id, pattern)
+
+def record_status(directory: str, status: str | None = None) -> None:
+    '''
+    Read a run directory again after changing it, and record its status if given
+    Used by the pipeline and the scheduler, does nothing for directories that are not runs
+    '''
+    run_id = run_id_of(os.path.basename(os.path.normpath(directory)))
+    if run_id is None: return
+    runs = registry(os.path.dirname(os.path.abspath(os.path.normpath(directory))))
+    with runs.connection:
+        runs.update_run(run_id, os.path.abspath(os.path.normpath(directory)))
+    if status is not None: runs.set_status(run_id, status)
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m miniguc.registry', description=__doc__.split('\n')[1])
+    parser.add_argument('--runs-dir', default=None, help='$MINIGUC_ROOT/runs by default')
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan_parser = commands.add_parser('scan', help='update the registry from the run directories')
+    scan_parser.add_argument('--full', action='store_true', help='read every run, not only the modified ones')
+    scan_parser.add_argument('--every', type=float, default=None, help='scan again every this many seconds')
+    list_parser = commands.add_parser('list', help='list the runs')
+    list_parser.add_argument('--status', default=None)
+    path_parser = commands.add_parser('path', help='directory of a run, or its first file matching a pattern')
+    path_parser.add_argument('run_id', type=int)
+    path_parser.add_argument('pattern', nargs='?', default=None, help='e.g. wrfout*')
+    show_parser = commands.add_parser('show', help='everything known about a run, as JSON')
+    show_parser.add_argument('run_id', type=int)
+    set_parser = commands.add_parser('set', help='set the status or parameters of a run')
+    set_parser.add_argument('run_id', type=int)
+    set_parser.add_argument('--status', default=None)
+    set_parser.add_argument('--param', nargs='+', default=[], help='KEY=VALUE')
+    args = parser.parse_args(argv)
+
+    runs = registry(args.runs_dir)
+    try:
+        if args.command == 'scan':
+            while True:
+                print(f'{runs.scan(args.full)} runs read, {len(runs.runs())} in {runs.runs_dir}', flush=True)
+                if args.every is None: break
+                sleep(args.every)
+        elif args.command == 'list':
+            for run in runs.runs(args.status):
+                print(f'{run.id:>4}  {run.status:<10}{run.updated:<21}{run.name}')
+        elif args.command == 'path':
+            print(runs.run_file(args.run_id, args.pattern) if args.pattern else runs.run_dir(args.run_id))
+        elif args.command == 'show':
+            print(json.dumps(runs.get(args.run_id).as_dict(), indent=1))
+        else:
+            if any('=' not in item for item in args.param): parser.error('parameters are given as KEY=VALUE')
+            if args.status is not None: runs.set_status(args.run_id, args.status)
+            if len(args.param) > 0: runs.set_parameters(args.run_id, dict(item.split('=', 1) for item in args.param))
+    except (KeyError, FileNotFoundError) as error:
+        print(error.args[0], file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
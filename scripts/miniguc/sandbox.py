@@ -0,0 +1,141 @@
+'''
+Per-run WPS sandboxes, so the WPS stages of several runs can run at the same time
+
+A sandbox is a directory of the run (wps-sandbox) with symlinks to everything in
+Build_WRF/WPS that the programs only read (executables, GEOGRID.TBL/METGRID.TBL,
+Vtable, GRIBFILE.*) and to the static geographic data, and its own namelist.wps.
+geogrid, ungrib and metgrid run in it, so their logs, FILE:* and geo_em/met_em
+never touch the shared WPS directory or another run. The namelist is the
+namelist.wps of the run when it has one, that of Build_WRF/WPS otherwise, with the
+paths pointing into the sandbox.
+
+Finished outputs are promoted into the run directory with promote: linked under
+temporary names first, then renamed, so the run directory never holds a partial set.
+'''
+
+from fnmatch import fnmatch
+from glob import glob
+import os, re, shutil
+
+from miniguc.stage_cache import read_namelist
+
+SANDBOX_NAME = 'wps-sandbox'
+GEOG_NAME = 'WPS_GEOG'
+# Written by the WPS programs, never linked from the shared directory
+PRIVATE_FILES = ['namelist.wps*', 'namelist.output', 'geo_em.*', 'met_em.*', 'FILE:*', 'PFILE:*', '*.log']
+
+def sandbox_dir(run_dir: str) -> str:
+    return os.path.join(run_dir, SANDBOX_NAME)
+
+def set_namelist_values(text: str, changes: dict[str, dict[str, str]]) -> str:
+    '''
+    Namelist text with the given values, {section: {key: value}}, values as written in the namelist
+    Keys missing from their section are added at its end
+    '''
+    lines, section, pending = [], None, {}
+    for line in text.splitlines():
+        stripped = line.split('!')[0].strip()
+        if stripped.startswith('&'):
+            section = stripped[1:].strip().lower()
+            pending = dict(changes.get(section, {}))
+        elif stripped == '/' and section is not None:
+            lines += [f' {key} = {value},' for key, value in pending.items()]
+            section, pending = None, {}
+        elif section is not None and '=' in stripped:
+            key = stripped.partition('=')[0].strip().lower()
+            if key in pending:
+                lines.append(f' {key} = {pending.pop(key)},')
+                continue
+        elif section is not None and len(stripped) > 0 and key_continues(lines, changes.get(section, {})):
+            # Continuation line of a replaced value
+            continue
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+def key_continues(lines: list[str], values: dict[str, str]) -> bool:
+    match = re.match(r'\s*(\w+)\s*=', lines[-1]) if len(lines) > 0 else None
+    return match is not None and match.group(1).lower() in values
+
+def sandbox_namelist(namelist_name: str, wps_dir: str) -> tuple[str, str | None]:
+    '''
+    namelist.wps text for a sandbox and the directory of the geographic data
+    Outputs go to the sandbox, the tables and the geographic data are read from the shared directories
+    '''
+    namelist = read_namelist(namelist_name)
+    changes: dict[str, dict[str, str]] = {'geogrid': {}, 'metgrid': {}}
+
+    def shared(path: str) -> str:
+        return os.path.normpath(os.path.join(wps_dir, path.strip('\'"')))
+
+    geog_path = namelist.get('geogrid', {}).get('geog_data_path')
+    if geog_path is not None: changes['geogrid']['geog_data_path'] = f"'{GEOG_NAME}/'"
+    for section, key in [('geogrid', 'opt_geogrid_tbl_path'), ('metgrid', 'opt_metgrid_tbl_path')]:
+        if key in namelist.get(section, {}): changes[section][key] = f"'{shared(namelist[section][key])}/'"
+    for section, key in [('geogrid', 'opt_output_from_geogrid_path'), ('metgrid', 'opt_output_from_metgrid_path')]:
+        if key in namelist.get(section, {}): changes[section][key] = "'./'"
+    if 'opt_output_from_geogrid_path' in namelist.get('metgrid', {}):
+        changes['metgrid']['opt_output_from_geogrid_path'] = "'./'"
+
+    with open(namelist_name) as f:
+        text = set_namelist_values(f.read(), changes)
+    return text, shared(geog_path) if geog_path is not None else None
+
+def create_sandbox(wps_dir: str, run_dir: str, namelist_name: str | None = None) -> str:
+    '''
+    Create or refresh the WPS sandbox of a run, outputs already in it are kept
+    wps_dir         shared WPS directory, Build_WRF/WPS
+    run_dir         run directory, the sandbox is its wps-sandbox directory
+    namelist_name   namelist.wps to use, that of the run if it has one, otherwise that of wps_dir
+    Returns the sandbox directory
+    '''
+    sandbox = sandbox_dir(run_dir)
+    os.makedirs(sandbox, exist_ok=True)
+    if namelist_name is None:
+        run_namelist = os.path.join(run_dir, 'namelist.wps')
+        namelist_name = run_namelist if os.path.exists(run_namelist) else os.path.join(wps_dir, 'namelist.wps')
+
+    # Links of an older refresh may point to files that are gone
+    for name in os.listdir(sandbox):
+        if os.path.islink(os.path.join(sandbox, name)): os.remove(os.path.join(sandbox, name))
+
+    text, geog_dir = sandbox_namelist(namelist_name, wps_dir)
+    for name in os.listdir(wps_dir):
+        if name == GEOG_NAME or any(fnmatch(name, pattern) for pattern in PRIVATE_FILES): continue
+        os.symlink(os.path.abspath(os.path.join(wps_dir, name)), os.path.join(sandbox, name))
+    if geog_dir is not None:
+        os.symlink(geog_dir, os.path.join(sandbox, GEOG_NAME))
+
+    tmp_name = os.path.join(sandbox, '.namelist.wps.tmp')
+    with open(tmp_name, 'w') as f:
+        f.write(text)
+    os.replace(tmp_name, os.path.join(sandbox, 'namelist.wps'))
+    return sandbox
+
+def promote(source_dir: str, patterns: list[str], dest_dir: str) -> list[str]:
+    '''
+    Hard link (copy across file systems) the matching files of source_dir into dest_dir
+    Every file is first linked under a temporary name, then all are renamed,
+    and files of a previous promotion matching the patterns are removed
+    Returns the promoted files
+    '''
+    file_names = sorted({name for pattern in patterns for name in glob(os.path.join(source_dir, pattern))})
+    staged = []
+    try:
+        for file_name in file_names:
+            tmp_name = os.path.join(dest_dir, f'.{os.path.basename(file_name)}.promote')
+            if os.path.lexists(tmp_name): os.remove(tmp_name)
+            try:
+                os.link(file_name, tmp_name)
+            except OSError:
+                shutil.copy2(file_name, tmp_name)
+            staged.append(tmp_name)
+    except BaseException:
+        for tmp_name in staged: os.remove(tmp_name)
+        raise
+
+    promoted = [os.path.join(dest_dir, os.path.basename(file_name)) for file_name in file_names]
+    for old_name in {name for pattern in patterns for name in glob(os.path.join(dest_dir, pattern))} - set(promoted):
+        os.remove(old_name)
+    for tmp_name, dest_name in zip(staged, promoted):
+        os.replace(tmp_name, dest_name)
+    return promoted
@@ -0,0 +1,205 @@
+'''
+Local scheduler of wrf.exe runs, packing several MPI jobs onto the cores of the machine
+
+Jobs are started highest priority first (first submitted first among equals) as
+long as their ranks fit in the free cores, the others wait in the queue. A job
+that doesn't fit lets smaller jobs behind it start (backfill), unless backfill=False.
+Each job gets its own set of CPUs, disjoint from the other running jobs, through
+the affinity of mpirun, which its ranks inherit. The command is launched with
+--bind-to none so MPI doesn't bind the ranks to cores of the other jobs.
+
+The exit status, wall time and CPUs of every job go to miniguc-wrf.json in its
+run directory, its output to miniguc-wrf.log, and the status of runs/ directories
+to miniguc.registry.
+
+    python -m miniguc.scheduler 87 89 90:8 91:4:10 [--ranks 4] [--cores 12]
+
+runs 87 and 89 with 4 ranks, 90 with 8, and 91 with 4 ranks before the others
+(priority 10). MINIGUC_CORES limits the cores used (all the cores of the
+affinity of the scheduler by default), MINIGUC_MPIRUN replaces the command,
+e.g. 'mpirun -np {ranks} -bind-to none ./wrf.exe' for MPICH.
+'''
+
+from datetime import datetime
+from itertools import count
+from time import perf_counter, sleep
+import argparse, heapq, json, os, shlex, signal, subprocess, sys
+
+WRF_COMMAND = 'mpirun -np {ranks} --bind-to none ./wrf.exe'
+RECORD_NAME = 'miniguc-wrf.json'
+LOG_NAME = 'miniguc-wrf.log'
+
+def available_cpus() -> list[int]:
+    '''
+    CPUs the scheduler may use, the first MINIGUC_CORES of its affinity if set
+    '''
+    cpus = sorted(os.sched_getaffinity(0))
+    cores = os.environ.get('MINIGUC_CORES')
+    return cpus[:int(cores)] if cores else cpus
+
+def wrf_command(ranks: int) -> list[str]:
+    return shlex.split(os.environ.get('MINIGUC_MPIRUN', WRF_COMMAND).format(ranks=ranks))
+
+class Job:
+    '''
+    One run of a command in a run directory
+    run_dir     directory the command runs in, where the record and log are written
+    ranks       cores the job needs, the number of MPI ranks
+    priority    higher runs first
+    command     command line, mpirun of wrf.exe with the given ranks by default
+    '''
+
+    def __init__(self, run_dir: str, ranks: int, priority: int = 0, command: list[str] | None = None) -> None:
+        self.run_dir, self.ranks, self.priority = run_dir, ranks, priority
+        self.command = command or wrf_command(ranks)
+        self.cpus: list[int] = []
+        self.process: subprocess.Popen | None = None
+        self.start_time = 0.0
+        self.queued = datetime.now().isoformat(timespec='seconds')
+        self.record: dict = {}
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(os.path.normpath(self.run_dir))
+
+class Scheduler:
+    '''
+    Queue of jobs run side by side on disjoint CPU sets
+    cpus            CPUs to share between the jobs, see available_cpus
+    pin             restrict each job to its CPUs, otherwise they are only counted
+    backfill        start lower priority jobs that fit while a bigger one waits for cores
+    poll_seconds    how often finished jobs are checked for
+    '''
+
+    def __init__(self, cpus: list[int] | None = None, pin: bool = True, backfill: bool = True,
+                 poll_seconds: float = 1.0) -> None:
+        self.cpus = cpus if cpus is not None else available_cpus()
+        self.free = list(self.cpus)
+        self.pin, self.backfill, self.poll_seconds = pin, backfill, poll_seconds
+        self.queue: list[tuple[int, int, Job]] = []
+        self.running: list[Job] = []
+        self.finished: list[Job] = []
+        self.submitted = count()
+
+    def submit(self, job: Job) -> Job:
+        if job.ranks > len(self.cpus):
+            raise ValueError(f'{job.name} needs {job.ranks} cores, only {len(self.cpus)} are available')
+        # Highest priority first, then in order of submission
+        heapq.heappush(self.queue, (-job.priority, next(self.submitted), job))
+        return job
+
+    def start(self, job: Job) -> None:
+        from miniguc.registry import record_status
+
+        job.cpus, self.free = self.free[:job.ranks], self.free[job.ranks:]
+        cpus = set(job.cpus)
+        preexec_fn = (lambda: os.sched_setaffinity(0, cpus)) if self.pin else None
+        log = open(os.path.join(job.run_dir, LOG_NAME), 'w')
+        job.record = {
+            'command': job.command, 'ranks': job.ranks, 'priority': job.priority, 'cpus': job.cpus,
+            'queued': job.queued, 'started': datetime.now().isoformat(timespec='seconds'),
+        }
+        job.start_time = perf_counter()
+        try:
+            job.process = subprocess.Popen(job.command, cwd=job.run_dir, stdout=log, stderr=subprocess.STDOUT,
+                                           preexec_fn=preexec_fn, start_new_session=True)
+        except OSError as error:
+            job.record['error'] = str(error)
+            self.finish(job, None)
+        finally:
+            log.close()
+        if job.process is not None:
+            self.running.append(job)
+            record_status(job.run_dir, 'running')
+            print(f'Started {job.name} on CPUs {format_cpus(job.cpus)} ({len(self.free)} free, {len(self.queue)} queued)')
+
+    def finish(self, job: Job, returncode: int | None) -> None:
+        from miniguc.registry import record_status
+
+        self.free = sorted(self.free + job.cpus)
+        job.record.update({
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'wall_seconds': perf_counter() - job.start_time,
+            'exit_status': returncode,
+        })
+        with open(os.path.join(job.run_dir, RECORD_NAME), 'w') as f:
+            json.dump(job.record, f, indent=1)
+        self.finished.append(job)
+        record_status(job.run_dir, 'done' if returncode == 0 else 'failed')
+        print(f'Finished {job.name}: exit status {returncode}, {job.record["wall_seconds"]:.0f} s')
+
+    def schedule(self) -> None:
+        '''
+        Start every queued job that fits, in priority order
+        '''
+        waiting = []
+        while len(self.queue) > 0:
+            item = heapq.heappop(self.queue)
+            if item[2].ranks <= len(self.free):
+                self.start(item[2])
+            else:
+                waiting.append(item)
+                if not self.backfill: break
+        for item in waiting: heapq.heappush(self.queue, item)
+
+    def run(self) -> list[Job]:
+        '''
+        Run every submitted job, returns them in the order they finished
+        On Ctrl-C the running jobs are stopped (their exit status is then negative) and the queue dropped
+        '''
+        try:
+            self.schedule()
+            while len(self.running) > 0:
+                sleep(self.poll_seconds)
+                for job in [job for job in self.running if job.process.poll() is not None]:
+                    self.running.remove(job)
+                    self.finish(job, job.process.returncode)
+                self.schedule()
+        except KeyboardInterrupt:
+            for job in self.running:
+                os.killpg(job.process.pid, signal.SIGTERM)
+            for job in self.running:
+                self.finish(job, job.process.wait())
+            self.running, self.queue = [], []
+        return self.finished
+
+def format_cpus(cpus: list[int]) -> str:
+    '''
+    CPU list as ranges, e.g. 0-3,8
+    '''
+    ranges: list[list[int]] = []
+    for cpu in sorted(cpus):
+        if len(ranges) > 0 and ranges[-1][1] == cpu - 1: ranges[-1][1] = cpu
+        else: ranges.append([cpu, cpu])
+    return ','.join(f'{start}-{end}' if end > start else f'{start}' for start, end in ranges)
+
+def main(argv: list[str] | None = None) -> int:
+    from miniguc.cli import run_dir
+
+    parser = argparse.ArgumentParser(prog='python -m miniguc.scheduler', description=__doc__.split('\n')[1])
+    parser.add_argument('jobs', nargs='+', help='RUN_ID[:RANKS[:PRIORITY]], e.g. 87 or 90:8:10')
+    parser.add_argument('--ranks', type=int, default=4, help='ranks of the jobs that don\'t give theirs')
+    parser.add_argument('--cores', type=int, default=None, help='cores to use, MINIGUC_CORES or all by default')
+    parser.add_argument('--no-backfill', action='store_true', help='never start a job before a higher priority one')
+    args = parser.parse_args(argv)
+
+    cpus = available_cpus()[:args.cores] if args.cores else available_cpus()
+    scheduler = Scheduler(cpus, backfill=not args.no_backfill)
+    for item in args.jobs:
+        run_id, ranks, priority = (item.split(':') + [None, None])[:3]
+        try:
+            scheduler.submit(Job(run_dir(int(run_id)), int(ranks or args.ranks), int(priority or 0)))
+        except ValueError as error:
+            parser.error(str(error))
+
+    start = perf_counter()
+    jobs = scheduler.run()
+    print(f'{"run":<32}{"ranks":>6}{"cpus":>10}{"status":>8}{"wall (s)":>10}')
+    for job in jobs:
+        print(f'{job.name:<32}{job.ranks:>6}{format_cpus(job.cpus):>10}{str(job.record["exit_status"]):>8}'
+              f'{job.record["wall_seconds"]:>10.0f}')
+    print(f'{len(jobs)} jobs in {perf_counter() - start:.0f} s')
+    return 0 if all(job.record['exit_status'] == 0 for job in jobs) else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
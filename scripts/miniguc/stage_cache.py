@@ -0,0 +1,191 @@
+'''
+Content-hash cache of the geogrid -> metgrid -> real pipeline stages
+
+A stage is keyed by a hash of everything it depends on: the namelist sections
+it reads, its input files (GRIB files, edit scripts, ...) and the keys of the
+stages before it. When nothing changed since a previous run, the outputs are
+linked back from the cache instead of running the executables again.
+
+miniguc.pipeline keys, restores and stores its stages through this module
+(generate-idealized-run.sh only calls python -m miniguc.pipeline). The same
+operations are available by hand, run from scripts/ (or with it on PYTHONPATH):
+    python -m miniguc.stage_cache key geogrid --namelist namelist.wps:share,geogrid --inputs ...
+    python -m miniguc.stage_cache restore geogrid KEY DEST_DIR
+    python -m miniguc.stage_cache store geogrid KEY geo_em*
+'''
+
+from glob import glob
+import argparse, hashlib, json, os, shutil, sqlite3, sys, tempfile, threading
+
+CACHE_DIR = os.environ.get('MINIGUC_CACHE', os.path.expanduser('~/.cache/miniguc'))
+HASH_INDEX_NAME = 'file-hashes.sqlite'
+# Open hash indexes by (process, path), see hash_index
+HASH_INDEXES: dict[tuple[int, str], sqlite3.Connection] = {}
+HASH_LOCK = threading.Lock()
+
+def read_namelist(file_name: str) -> dict[str, dict[str, str]]:
+    '''
+    Parse a Fortran namelist (namelist.wps, namelist.input) into {section: {key: value}}
+    Values are kept as normalized strings, which is enough to compare them
+    '''
+    sections: dict[str, dict[str, str]] = {}
+    section, key = None, None
+    with open(file_name) as f:
+        for line in f:
+            line = line.split('!')[0].strip()
+            if len(line) == 0: continue
+            if line.startswith('&'):
+                section = line[1:].strip().lower()
+                sections[section] = {}
+            elif line == '/':
+                section = None
+            elif section is not None:
+                if '=' in line:
+                    key, _, line = line.partition('=')
+                    key = key.strip().lower()
+                    sections[section][key] = ''
+                if key is not None:
+                    values = [value.strip() for value in line.split(',') if value.strip()]
+                    sections[section][key] = ','.join(filter(None, [sections[section][key], *values]))
+    return sections
+
+def hash_index() -> sqlite3.Connection:
+    '''
+    Index of the file hashes in CACHE_DIR, one connection per process shared by its threads (under HASH_LOCK)
+    '''
+    key = (os.getpid(), os.path.join(CACHE_DIR, HASH_INDEX_NAME))
+    if key not in HASH_INDEXES:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        connection = sqlite3.connect(key[1], timeout=60, check_same_thread=False)
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS hashes (file_id TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+                               'mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL)')
+        HASH_INDEXES[key] = connection
+    return HASH_INDEXES[key]
+
+def hash_file(file_name: str) -> str:
+    '''
+    sha256 of the file contents, remembered by device, inode, size and mtime (ns)
+    so big GRIB files are only read again when they change
+    '''
+    stat = os.stat(file_name)
+    file_id, signature = f'{stat.st_dev}:{stat.st_ino}', (stat.st_size, stat.st_mtime_ns)
+    with HASH_LOCK:
+        row = hash_index().execute('SELECT size, mtime_ns, sha256 FROM hashes WHERE file_id = ?', (file_id,)).fetchone()
+    if row is not None and tuple(row[:2]) == signature:
+        return row[2]
+
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    # One row per file, concurrent pipelines only ever replace the rows of the files they hashed
+    with HASH_LOCK, hash_index() as index:
+        index.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)', (file_id, *signature, digest.hexdigest()))
+    return digest.hexdigest()
+
+def stage_key(stage: str, namelists: dict[str, list[str] | None] | None = None,
+              input_files: list[str] | None = None, params: dict | None = None,
+              after: list[str] | None = None) -> str:
+    '''
+    Hash of everything a stage depends on
+    stage       stage name, e.g. geogrid
+    namelists   {namelist path: sections to include, None for the whole namelist}
+    input_files files whose content the outputs depend on, e.g. GRIB files and edit scripts
+    params      extra parameters of the stage
+    after       keys of the stages this one depends on
+    '''
+    content = {'stage': stage, 'namelists': {}, 'inputs': {}, 'params': params or {}, 'after': after or []}
+    for file_name, sections in (namelists or {}).items():
+        namelist = read_namelist(file_name)
+        content['namelists'][os.path.basename(file_name)] = {
+            section: namelist.get(section, {}) for section in (sections or namelist.keys())
+        }
+    for file_name in sorted(input_files or []):
+        # With the parent directory, miniguc/__init__.py and miniguc/edits/__init__.py are both kept
+        name = os.path.join(os.path.basename(os.path.dirname(os.path.abspath(file_name))), os.path.basename(file_name))
+        content['inputs'][name] = hash_file(file_name)
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def stage_dir(stage: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, 'stages', stage, key)
+
+def restore(stage: str, key: str, dest_dir: str) -> bool:
+    '''
+    Link the cached outputs of a stage into dest_dir, returns False if they are not cached
+    The files are blobs of miniguc.artifacts, edit_in_place edits a private copy of them
+    '''
+    from miniguc.artifacts import replace_with
+
+    cached_dir = stage_dir(stage, key)
+    if not os.path.isfile(os.path.join(cached_dir, 'manifest.json')):
+        return False
+
+    with open(os.path.join(cached_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    for file_name in manifest['files']:
+        replace_with(os.path.join(cached_dir, file_name), os.path.join(dest_dir, file_name))
+    return True
+
+def store(stage: str, key: str, output_files: list[str]) -> None:
+    '''
+    Save the outputs of a stage under its key, the entry only appears once complete
+    The saved files are kept in miniguc.artifacts, outputs identical across keys are stored once
+    '''
+    from miniguc.artifacts import add
+
+    cached_dir = stage_dir(stage, key)
+    os.makedirs(os.path.dirname(cached_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(cached_dir))
+    for file_name in output_files:
+        cached_name = os.path.join(tmp_dir, os.path.basename(file_name))
+        shutil.copyfile(file_name, cached_name)
+        add(cached_name)
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump({'stage': stage, 'files': [os.path.basename(name) for name in output_files]}, f)
+
+    if os.path.exists(cached_dir): shutil.rmtree(cached_dir)
+    os.rename(tmp_dir, cached_dir)
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m miniguc.stage_cache', description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    key_parser = commands.add_parser('key', help='print the key of a stage')
+    key_parser.add_argument('stage')
+    key_parser.add_argument('--namelist', action='append', default=[],
+                            help='PATH[:section,section], whole namelist if no section is given')
+    key_parser.add_argument('--inputs', nargs='*', default=[], help='input files, globs are expanded')
+    key_parser.add_argument('--param', action='append', default=[], help='KEY=VALUE')
+    key_parser.add_argument('--after', nargs='*', default=[], help='keys of previous stages')
+
+    restore_parser = commands.add_parser('restore', help='restore cached outputs, exit 1 if missing')
+    restore_parser.add_argument('stage')
+    restore_parser.add_argument('key')
+    restore_parser.add_argument('dest_dir')
+
+    store_parser = commands.add_parser('store', help='cache the outputs of a stage')
+    store_parser.add_argument('stage')
+    store_parser.add_argument('key')
+    store_parser.add_argument('files', nargs='+')
+
+    args = parser.parse_args(argv)
+    if args.command == 'key':
+        namelists = {}
+        for item in args.namelist:
+            path, _, sections = item.partition(':')
+            namelists[path] = sections.split(',') if sections else None
+        input_files = [name for pattern in args.inputs for name in sorted(glob(pattern))]
+        params = dict(item.partition('=')[::2] for item in args.param)
+        print(stage_key(args.stage, namelists, input_files, params, args.after))
+    elif args.command == 'restore':
+        if not restore(args.stage, args.key, args.dest_dir):
+            return 1
+        print(f'Restored {args.stage} from cache ({args.key[:12]})')
+    elif args.command == 'store':
+        store(args.stage, args.key, args.files)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,201 @@
+'''
+Memory-bounded streaming of variables between netCDF files
+
+A variable bigger than the memory budget is copied in slabs along its leading
+axes (never splitting south_north/west_east), sized to the budget and lined up
+with the source chunking. Edits that can work on slabs subclass SlabEdit; edits
+needing a whole-array statistic run as two passes: accumulate the statistic
+over all slabs first, then stream the rewrite. Plain functions still receive
+the whole array.
+
+The budget is set per call, or for every script with MINIGUC_MEMORY, e.g. 4G.
+'''
+
+from math import prod
+from time import perf_counter
+from typing import Callable, Iterator
+import os
+
+import netCDF4
+import numpy as np
+
+from miniguc.instrument import active, timed
+
+Index = tuple[slice, ...]
+
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+def default_budget() -> int | None:
+    '''
+    Memory budget in bytes from MINIGUC_MEMORY (e.g. 512M, 4G), None to load whole variables
+    '''
+    budget = os.environ.get('MINIGUC_MEMORY', '').strip().upper()
+    if len(budget) == 0: return None
+    if budget[-1] in UNITS: return int(float(budget[:-1]) * UNITS[budget[-1]])
+    return int(budget)
+
+class SlabEdit:
+    '''
+    Edit that can be applied to slabs of a variable instead of the whole array
+    local_axes  number of leading axes the edit is independent over, slabs splitting
+                only these axes are edited on their own
+    two_pass    whether the edit can accumulate its statistic over slabs splitting other
+                axes (accumulate then apply), otherwise such variables are loaded whole
+    reads_values    whether the edit uses the values it is given, when the first edit of a
+                    variable overwrites all of them the source is not read at all
+    '''
+    local_axes: int = 0
+    two_pass: bool = False
+    reads_values: bool = True
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        self.begin(values.shape)
+        return self.apply(values, tuple(slice(None) for _ in values.shape[:-2]), values.shape)
+
+    def begin(self, shape: tuple[int, ...]) -> None:
+        '''
+        Reset the statistic before the first pass over a variable of the given shape
+        '''
+
+    def accumulate(self, slab: np.ndarray, index: Index) -> None:
+        '''
+        First pass, add the slab at index to the statistic
+        '''
+        raise NotImplementedError
+
+    def apply(self, slab: np.ndarray, index: Index, shape: tuple[int, ...]) -> np.ndarray:
+        '''
+        Edit the slab at index of a variable of the given shape, using the
+        accumulated statistic if there is one
+        '''
+        raise NotImplementedError
+
+class Fill(SlabEdit):
+    '''
+    Fill the whole variable with a constant
+    '''
+    local_axes = 1 << 16
+    reads_values = False
+
+    def __init__(self, value: float) -> None:
+        self.value = value
+
+    def apply(self, slab: np.ndarray, index: Index, shape: tuple[int, ...]) -> np.ndarray:
+        slab[...] = self.value
+        return slab
+
+def slab_indices(shape: tuple[int, ...], itemsize: int, budget: int, chunking: list[int] | str | None = None,
+                 split_limit: int | None = None) -> tuple[int, Iterator[Index]]:
+    '''
+    Split a variable into slabs of at most budget bytes along its leading axes
+    shape       variable shape, the last two axes are never split
+    itemsize    bytes per value
+    budget      memory budget in bytes
+    chunking    Variable.chunking() of the source, slabs are whole multiples of the chunks when possible
+    split_limit split only axes before this one, loading more than the budget if needed
+    Returns the split axis (-1 for a single slab) and the slab indices
+    '''
+    ndim = len(shape)
+    last_axis = min(ndim - 3, ndim - 3 if split_limit is None else split_limit - 1)
+    if ndim < 3 or last_axis < 0 or prod(shape) * itemsize <= budget:
+        return -1, iter([tuple(slice(None) for _ in shape[:-2])])
+
+    # Split the first axis whose inner block fits in the budget, earlier axes one index at a time
+    axis = next((axis for axis in range(last_axis + 1) if prod(shape[axis + 1:]) * itemsize <= budget), last_axis)
+    step = max(1, budget // (prod(shape[axis + 1:]) * itemsize))
+    if isinstance(chunking, list) and step >= chunking[axis]:
+        step -= step % chunking[axis]
+
+    def indices() -> Iterator[Index]:
+        for outer in np.ndindex(*shape[:axis]):
+            for start in range(0, shape[axis], step):
+                yield (
+                    *(slice(i, i + 1) for i in outer),
+                    slice(start, min(start + step, shape[axis])),
+                    *(slice(None) for _ in shape[axis + 1:-2]),
+                )
+
+    return axis, indices()
+
+def slab_shape(shape: tuple[int, ...], index: Index | slice) -> tuple[int, ...]:
+    index = index if isinstance(index, tuple) else (index,)
+    return tuple(len(range(*part.indices(size))) for part, size in zip(index, shape)) + tuple(shape[len(index):])
+
+def stream_variable(source: netCDF4.Variable, target: netCDF4.Variable,
+                    edits: list[Callable[[np.ndarray], np.ndarray]], budget: int | None) -> None:
+    '''
+    Copy source into target applying the edits, holding at most about budget bytes at a time
+    source      variable to read
+    target      variable to write, may be the source itself (in-place edits)
+    edits       edits of the variable, in order
+    budget      memory budget in bytes, None to load the whole variable
+    '''
+    shape, itemsize = source.shape, source.dtype.itemsize if source.dtype != str else 8
+    name, report = target.name, active()
+
+    # Nothing to read when the first edit overwrites every value, e.g. Fill
+    overwritten = len(edits) > 0 and not getattr(edits[0], 'reads_values', True)
+
+    def read(index) -> np.ndarray:
+        if overwritten:
+            return np.empty(slab_shape(shape, index), dtype=source.dtype)
+        with timed(name, 'read') as nbytes:
+            values = source[index]
+            nbytes.append(values.nbytes)
+        return values
+
+    def write(index, values: np.ndarray) -> None:
+        with timed(name, 'write') as nbytes:
+            target[index] = values
+            nbytes.append(np.asanyarray(values).nbytes)
+
+    def edited(edit, call: Callable[..., np.ndarray], *args) -> np.ndarray:
+        start = perf_counter()
+        values = call(*args)
+        if report is not None: report.add_edit(name, edit, perf_counter() - start)
+        return values
+
+    slab_edits = all(isinstance(edit, SlabEdit) for edit in edits)
+    if budget is None or not slab_edits or prod(shape) * itemsize <= budget:
+        values = read(slice(None))
+        for edit in edits:
+            values = edited(edit, edit, values)
+        write(slice(None), values)
+        return
+
+    split_limit = min([edit.local_axes for edit in edits if not edit.two_pass], default=None)
+    axis, _ = slab_indices(shape, itemsize, budget, source.chunking(), split_limit)
+
+    # Edits independent over the split axis work slab by slab, the others accumulate
+    # their statistic first. Each of those needs its own pass over the source, since
+    # it has to see the values produced by the edits before it
+    for i, edit in enumerate(edits):
+        edit.begin(shape)
+        if axis < edit.local_axes: continue
+        for index in slab_indices(shape, itemsize, budget, source.chunking(), split_limit)[1]:
+            slab = read(index)
+            for previous in edits[:i]:
+                slab = edited(previous, previous.apply, slab, index, shape)
+            edited(edit, edit.accumulate, slab, index)
+
+    for index in slab_indices(shape, itemsize, budget, source.chunking(), split_limit)[1]:
+        slab = read(index)
+        for edit in edits:
+            slab = edited(edit, edit.apply, slab, index, shape)
+        write(index, slab)
+
+def copy_to_many(source: netCDF4.Variable, targets: list[netCDF4.Variable], budget: int | None) -> None:
+    '''
+    Copy source into every target, reading it once, e.g. one input variable shared by many outputs
+    budget      memory budget in bytes, None to load the whole variable
+    '''
+    shape, itemsize = source.shape, source.dtype.itemsize if source.dtype != str else 8
+    if budget is None or prod(shape) * itemsize <= budget:
+        indices: Iterator[Index] | list = [slice(None)]
+    else:
+        indices = slab_indices(shape, itemsize, budget, source.chunking())[1]
+
+    for index in indices:
+        values = source[index]
+        for target in targets:
+            target[index] = values
@@ -0,0 +1,171 @@
+'''
+Parameter-sweep materializer
+
+Derives every member of an urban parameter sweep (AHE, Z0_URB2D, ...) from one
+base run that already went through real.exe and the edit scripts. Instead of
+rerunning real.exe and the edit scripts for each member, the base run directory
+is reproduced with hard links, and only the files holding swept parameters
+(geo_em, wrfinput) are copied and edited in place in the urban cells (ISURBAN).
+
+Shared files (wrfbdy_d01, met_em, executables, tables) are hard links to the
+base run. The edit scripts (e.g. wrfbdy.ju.py) go through miniguc.engine.edit_in_place,
+which replaces the file with an edited copy, so they only change the member they run
+on. A tool opening a shared file for writing itself (Dataset(..., 'r+'), ncks -A, ...)
+would change every member and the base run. Namelists are small and copied.
+
+    python -m miniguc.sweep RUN_DIR --param AHE=0,10,50,100,500,1000 --param Z0_URB2D=0.5,1,2,5,10
+makes runs/NNN-urban-grassland-ahe-{AHE}-z0-{Z0_URB2D} next to RUN_DIR, numbered after the last run
+'''
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fnmatch import fnmatch
+from glob import glob
+from itertools import product
+from multiprocessing import get_context
+import argparse, json, os, re, shutil, sys
+
+from netCDF4 import Dataset
+
+from miniguc.edits.wrfinput import urban_value
+from miniguc.engine import EditPlan, edit_in_place
+from miniguc.files import copy_file
+from miniguc.masks import LandUse
+from miniguc.parallel import default_workers
+
+# Short names used in the run directory names, e.g. *-ahe-100-z0-1
+SHORT_NAMES = {
+    'AHE': 'ahe',
+    'Z0_URB2D': 'z0',
+    'ZD_URB2D': 'zd',
+    'MH_URB2D': 'mh',
+    'BUILD_AREA_FRACTION': 'baf',
+    'LF_URB2D_S': 'lf',
+}
+
+# geo_em names of the urban parameters that real.exe stores under another name in wrfinput
+WRFINPUT_NAMES = {
+    'BUILD_AREA_FRACTION': 'FRC_URB2D',
+    'LF_URB2D_S': 'LF_URB2D',
+}
+
+EDITED_FILES = ['geo_em.d*.nc', 'wrfinput_d*']
+COPIED_FILES = ['namelist.*']
+# wps-sandbox holds the WPS files of the base run, see miniguc.sandbox
+SKIPPED_FILES = ['wrfout*', 'wrfrst*', 'rsl.*', 'sweep.json', 'wps-sandbox']
+
+def parameter_grid(values: dict[str, list[float]]) -> list[dict[str, float]]:
+    '''
+    Every combination of the parameter values, the last parameter varies fastest
+    '''
+    return [dict(zip(values.keys(), combination)) for combination in product(*values.values())]
+
+def member_name(run_id: int, prefix: str, params: dict[str, float]) -> str:
+    '''
+    Run directory name, e.g. 101-urban-grassland-ahe-100-z0-0.5
+    '''
+    suffix = '-'.join(f'{SHORT_NAMES.get(name, name.lower())}-{value:g}' for name, value in params.items())
+    return f'{run_id:03}-{prefix}-{suffix}'
+
+def next_run_id(runs_dir: str) -> int:
+    ids = [int(match.group(1)) for name in os.listdir(runs_dir) if (match := re.match(r'(\d+)-', name))]
+    return max(ids, default=0) + 1
+
+def link_run(base_dir: str, member_dir: str) -> None:
+    '''
+    Reproduce base_dir in member_dir with hard links, copying the files a member may change
+    Symlinks (WRF tables, executables) stay symlinks
+    '''
+    def link_or_copy(src_name: str, dest_name: str) -> None:
+        name = os.path.basename(src_name)
+        if any(fnmatch(name, pattern) for pattern in EDITED_FILES + COPIED_FILES):
+            copy_file(src_name, dest_name)
+        else:
+            os.link(src_name, dest_name)
+
+    shutil.copytree(base_dir, member_dir, symlinks=True, copy_function=link_or_copy,
+                    ignore=shutil.ignore_patterns(*SKIPPED_FILES))
+
+def build_member_plan(params: dict[str, float]):
+    '''
+    Plan builder for edit_in_place, painting each parameter present in the file into the urban cells
+    '''
+    def build_plan(src: Dataset) -> EditPlan:
+        plan = EditPlan()
+        mask = LandUse.from_dataset(src, 'ISURBAN')
+        for name, value in params.items():
+            var_name = name if name in src.variables else WRFINPUT_NAMES.get(name, name)
+            if var_name not in src.variables: continue
+            # Only inside the urban cells, the rest keeps the values of the base run
+            plan.add(var_name, urban_value(mask, var_name, value))
+        return plan
+
+    return build_plan
+
+def materialize_member(base_dir: str, member_dir: str, params: dict[str, float]) -> str:
+    '''
+    Create one member run directory, written next to its destination and renamed once complete
+    '''
+    tmp_dir = os.path.join(os.path.dirname(member_dir), f'.{os.path.basename(member_dir)}.tmp')
+    if os.path.exists(tmp_dir): shutil.rmtree(tmp_dir)
+    link_run(base_dir, tmp_dir)
+
+    note = 'Sweep member ' + ', '.join(f'{name}={value:g}' for name, value in params.items())
+    for pattern in EDITED_FILES:
+        for file_name in glob(os.path.join(tmp_dir, pattern)):
+            edit_in_place(file_name, build_member_plan(params), note=note)
+
+    with open(os.path.join(tmp_dir, 'sweep.json'), 'w') as f:
+        json.dump({'base': os.path.abspath(base_dir), 'params': params}, f, indent=2)
+    os.rename(tmp_dir, member_dir)
+    return member_dir
+
+def materialize_sweep(base_dir: str, values: dict[str, list[float]], prefix: str | None = None,
+                      first_id: int | None = None, workers: int | None = None) -> list[str]:
+    '''
+    Create a run directory for every point of the parameter grid
+    base_dir    base run directory, after real.exe and the edit scripts
+    values      {parameter: values}, geo_em names, e.g. {'AHE': [0, 100], 'Z0_URB2D': [0.5, 1]}
+    prefix      name of the members between the run id and the parameters,
+                defaults to the name of the base run without its id
+    first_id    run id of the first member, defaults to the one after the last run
+    workers     number of processes, see miniguc.parallel.default_workers
+    Returns the member run directories
+    '''
+    base_dir = os.path.abspath(base_dir).rstrip('/')
+    runs_dir = os.path.dirname(base_dir)
+    prefix = prefix or re.sub(r'^\d+-', '', os.path.basename(base_dir))
+    if first_id is None: first_id = next_run_id(runs_dir)
+
+    grid = parameter_grid(values)
+    member_dirs = [os.path.join(runs_dir, member_name(first_id + i, prefix, params)) for i, params in enumerate(grid)]
+    existing = [member_dir for member_dir in member_dirs if os.path.exists(member_dir)]
+    if len(existing) > 0:
+        raise FileExistsError(f'Run directories already exist: {", ".join(existing)}')
+
+    with ProcessPoolExecutor(max_workers=min(workers or default_workers(), len(grid)) or 1,
+                             mp_context=get_context('fork')) as pool:
+        futures = [
+            pool.submit(materialize_member, base_dir, member_dir, params)
+            for member_dir, params in zip(member_dirs, grid)
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            print(f'[{done}/{len(futures)}] Created {os.path.basename(future.result())}')
+    return member_dirs
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog='python -m miniguc.sweep', description=__doc__.split('\n')[1])
+    parser.add_argument('base_dir', help='base run directory')
+    parser.add_argument('--param', action='append', required=True, help='NAME=VALUE,VALUE,...')
+    parser.add_argument('--prefix', default=None, help='member name between id and parameters')
+    parser.add_argument('--first-id', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    values = {}
+    for item in args.param:
+        name, _, numbers = item.partition('=')
+        values[name] = [float(number) for number in numbers.split(',')]
+    materialize_sweep(args.base_dir, values, args.prefix, args.first_id, args.workers)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,8 +1,8 @@
+# Runs side by side on disjoint cores, 4 ranks each, see miniguc/scheduler.py
+# e.g. 87:8 for 8 ranks, 87:4:10 to start it before the others
 ID_LIST=(87 89)
-for i in "${ID_LIST[@]}"
-do
-	cd $(find ~/miniguc/runs/0$i*/ | head -n 1)
-	time mpirun -np 4 ./wrf.exe
-done
+export PYTHONPATH="$HOME/miniguc/scripts:$PYTHONPATH"
+export MINIGUC_ROOT="$HOME/miniguc"
+python -m miniguc.scheduler "${ID_LIST[@]}" --ranks 4
 
 cd ~/miniguc/scripts
@@ -0,0 +1,66 @@
+'''
+Benchmarks of the edit operations on synthetic WRF files, see miniguc.fixtures
+
+    cd scripts && python -m pytest tests
+    MINIGUC_BENCH_SIZE=large python -m pytest tests --benchmark-only
+
+The fixture size is small (100x100x35) by default, MINIGUC_BENCH_SIZE takes
+small, medium, large or NYxNXxNZ. Timings come from pytest-benchmark when it is
+installed, otherwise every benchmark runs once and its time is printed.
+'''
+
+from time import perf_counter
+import os, shutil, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from miniguc.fixtures import parse_size, write_fixtures
+
+@pytest.fixture(scope='session')
+def fixture_files(tmp_path_factory) -> dict[str, list[str]]:
+    '''
+    Pristine fixtures, written once per session, copy them before editing
+    '''
+    shape = parse_size(os.environ.get('MINIGUC_BENCH_SIZE', 'small'))
+    return write_fixtures(str(tmp_path_factory.mktemp('fixtures')), shape)
+
+@pytest.fixture
+def fixture_copy(fixture_files, tmp_path):
+    '''
+    Copy of a pristine fixture in the test directory, e.g. fixture_copy('wrfinput')
+    '''
+    def copy(kind: str, index: int = 0) -> str:
+        source = fixture_files[kind][index]
+        destination = str(tmp_path / os.path.basename(source))
+        shutil.copyfile(source, destination)
+        return destination
+
+    return copy
+
+try:
+    import pytest_benchmark # noqa: F401
+except ImportError:
+    class Benchmark:
+        '''
+        Stand-in for the pytest-benchmark fixture, times a single round
+        '''
+
+        def __init__(self, name: str) -> None:
+            self.name = name
+
+        def __call__(self, function, *args, **kwargs):
+            start = perf_counter()
+            result = function(*args, **kwargs)
+            print(f'\n{self.name}: {perf_counter() - start:.3f} s')
+            return result
+
+        def pedantic(self, target, args=(), kwargs=None, setup=None, rounds=1, iterations=1, warmup_rounds=0):
+            if setup is not None:
+                args, kwargs = setup() or (args, kwargs)
+            return self(target, *args, **(kwargs or {}))
+
+    @pytest.fixture
+    def benchmark(request):
+        return Benchmark(request.node.name)
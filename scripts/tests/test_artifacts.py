@@ -0,0 +1,50 @@
+'''
+Provisioning runs from the content-addressed store of miniguc.artifacts
+'''
+
+import os, shutil
+
+from netCDF4 import Dataset
+
+from miniguc import artifacts, stage_cache
+from miniguc.engine import EditPlan, edit_in_place
+
+def test_artifacts(benchmark, fixture_copy, tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, 'STORE_DIR', str(tmp_path / 'store'))
+    template = tmp_path / 'run-template'
+    template.mkdir()
+    for index in range(20):
+        (template / f'RRTMG_TABLE_{index}_DATA').write_bytes(os.urandom(1 << 16))
+    (template / 'namelist.input').write_text('&time_control\n/\n')
+    os.symlink('/usr/bin/true', template / 'wrf.exe')
+
+    linked = benchmark(artifacts.new_run, str(template), str(tmp_path / '001-a'))
+    artifacts.new_run(str(template), str(tmp_path / '002-b'))
+    assert linked == 20
+    first, second = tmp_path / '001-a' / 'RRTMG_TABLE_0_DATA', tmp_path / '002-b' / 'RRTMG_TABLE_0_DATA'
+    assert os.path.samefile(first, second) and os.stat(first).st_mode & 0o222 == 0
+    assert os.path.islink(tmp_path / '002-b' / 'wrf.exe')
+    assert not os.path.samefile(tmp_path / '001-a' / 'namelist.input', tmp_path / '002-b' / 'namelist.input')
+
+    # Identical met_em files of two runs end up as one blob
+    met_em = [fixture_copy('met_em')]
+    (tmp_path / 'copy').mkdir()
+    met_em.append(str(tmp_path / 'copy' / os.path.basename(met_em[0])))
+    shutil.copyfile(met_em[0], met_em[1])
+    files, saved = artifacts.dedupe([str(tmp_path)], ['met_em.d*'])
+    assert files == 2 and saved == os.path.getsize(met_em[0]) and os.path.samefile(*met_em)
+
+    # Editing one of them leaves the blob and the other run untouched
+    blob = artifacts.blob_name(stage_cache.hash_file(met_em[1]))
+    size = os.path.getsize(blob)
+    assert edit_in_place(met_em[0], lambda src: EditPlan().set(['PMSL'], 0), 'test')
+    assert not os.path.samefile(*met_em) and os.path.samefile(blob, met_em[1])
+    with Dataset(met_em[0]) as edited, Dataset(met_em[1]) as kept:
+        assert edited['PMSL'][:].max() == 0 and kept['PMSL'][:].max() > 0
+
+    # Only the blobs no run links to anymore are collected
+    usage = artifacts.usage()
+    os.remove(met_em[1])
+    assert artifacts.gc(dry_run=True) == (1, size) and os.path.exists(blob)
+    assert artifacts.gc() == (1, size) and not os.path.exists(blob)
+    assert artifacts.usage()['blobs'] == usage['blobs'] - 1 == 20
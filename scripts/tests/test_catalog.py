@@ -0,0 +1,21 @@
+'''
+Sidecar catalogs of miniguc.catalog
+'''
+
+import os
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.catalog import build_catalog, catalog_name, load_catalog
+
+def test_catalog(fixture_copy):
+    file_name = fixture_copy('wrfinput')
+    # Streamed in 1 MB slabs, the lookup afterwards only reads the sidecar
+    catalog = build_catalog(file_name, budget=1 << 20)
+    with Dataset(file_name) as src:
+        values = src['T'][:]
+    stats = catalog['variables']['T']['stats']
+    assert np.isclose(stats['max'], values.max()) and np.isclose(stats['mean'], values.mean(dtype=np.float64))
+    assert np.allclose(stats['level_means'], values.mean(axis=(0, 2, 3), dtype=np.float64))
+    assert os.path.exists(catalog_name(file_name)) and load_catalog(file_name)['built'] == catalog['built']
@@ -0,0 +1,26 @@
+'''
+Compression presets of miniguc.codec when netCDF-C lacks zstd
+'''
+
+import warnings
+
+import netCDF4
+import pytest
+
+from miniguc import codec
+from miniguc.codec import PRESETS, CodecPolicy
+
+def test_codec_fallback(fixture_files, monkeypatch, capsys):
+    monkeypatch.setattr(netCDF4, '__has_zstandard_support__', False, raising=False)
+    monkeypatch.setattr(codec, 'WARNED', set())
+
+    # Written as fast, said once
+    with pytest.warns(RuntimeWarning, match='no zstd support'):
+        assert CodecPolicy('zstd').compression('T') == PRESETS['fast']
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert CodecPolicy({}, {'T': 'zstd'}).compression('T') == PRESETS['fast']
+
+    results = codec.benchmark(fixture_files['wrfbdy'][0], ['fast', 'zstd'])
+    assert [result['written_as'] for result in results] == ['fast', 'fast']
+    assert 'zstd→fast' in capsys.readouterr().out
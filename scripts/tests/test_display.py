@@ -0,0 +1,51 @@
+'''
+Notebook helpers of miniguc.display on the fixture files
+'''
+
+import os
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc import display
+from miniguc.catalog import catalog_name, load_catalog
+
+def test_thumbnails(fixture_files, tmp_path, monkeypatch):
+    monkeypatch.setattr(display, 'THUMBNAIL_DIR', str(tmp_path / 'thumbnails'))
+    thumbnails = display.load_thumbnails(fixture_files['wrfinput'][0])
+    assert max(thumbnails['T'].shape) <= 64
+    assert 'Times' not in thumbnails
+    # Read from the cache the second time
+    assert len(os.listdir(tmp_path / 'thumbnails')) == 1
+    cached = display.load_thumbnails(fixture_files['wrfinput'][0])
+    assert cached.keys() == thumbnails.keys() and np.array_equal(cached['T'], thumbnails['T'], equal_nan=True)
+
+def test_before_after(fixture_files, fixture_copy, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(display, 'THUMBNAIL_DIR', str(tmp_path / 'thumbnails'))
+    before = fixture_files['met_em'][0]
+    after = fixture_copy('met_em')
+
+    # Nothing to draw
+    assert display.plot_before_after(before, after, changed_only=True, cols_num=1) is None
+    assert 'No variable' in capsys.readouterr().out
+
+    with Dataset(after, 'r+') as out: out['PMSL'][:] = 0
+    png_name = display.plot_before_after(before, after, changed_only=True, cols_num=1)
+    assert os.path.getsize(png_name) > 0
+
+def test_urban_vars(fixture_copy, capsys):
+    file_name = fixture_copy('geo_em')
+    sidecar = catalog_name(file_name)
+
+    # Only the six variables are read, no catalog is written for them
+    display.list_urban_vars_min_max(file_name)
+    printed = capsys.readouterr().out
+    with Dataset(file_name) as src: ahe = src['AHE'][:]
+    mean, maximum = printed.split('AHE: mean = ')[1].split(' max = ')
+    assert not os.path.exists(sidecar)
+    assert np.isclose(float(mean), ahe.mean(dtype=np.float64)) and float(maximum) == ahe.max()
+
+    # Taken from the catalog once it has statistics
+    load_catalog(file_name)
+    display.list_urban_vars_min_max(file_name)
+    assert capsys.readouterr().out == printed
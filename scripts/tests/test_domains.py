@@ -0,0 +1,64 @@
+'''
+Regions of miniguc.masks mapped onto a d02 nest by miniguc.domains
+'''
+
+from netCDF4 import Dataset
+import numpy as np
+import pytest
+
+from miniguc.domains import load_domains
+from miniguc.fixtures import LATITUDES, LONGITUDES, write_geo_em, write_nest
+from miniguc.masks import LandUse, LatLonBox, LatLonDisk
+
+PARENT_SHAPE, NEST_SHAPE, RATIO, START = (100, 100, 2), (60, 60, 2), 3, 40
+
+@pytest.fixture(scope='module')
+def geo_em(tmp_path_factory) -> list[str]:
+    output_dir = tmp_path_factory.mktemp('domains')
+    file_names = [str(output_dir / 'geo_em.d01.nc'), str(output_dir / 'geo_em.d02.nc')]
+    write_geo_em(file_names[0], PARENT_SHAPE)
+    write_nest(file_names[1], PARENT_SHAPE, NEST_SHAPE, RATIO, (START, START))
+    return file_names
+
+def on_nest(parent: np.ndarray) -> np.ndarray:
+    '''
+    Cells of d02 inside the given d01 cells: every d01 cell of the nest area is RATIO x RATIO nest cells
+    '''
+    size = NEST_SHAPE[0] // RATIO
+    window = parent[START - 1:START - 1 + size, START - 1:START - 1 + size]
+    return np.repeat(np.repeat(window, RATIO, axis=0), RATIO, axis=1)
+
+def test_domains(geo_em):
+    domains = load_domains(geo_em)
+    assert domains[2].parent is domains[1] and domains[2].ratio == RATIO
+    assert np.allclose(domains[2].to_root(np.array([1]), np.array([1])), START - 1)
+
+    # The urban patch of d01 (ISURBAN cells) covers the same d01 cells on the nest, its first row included
+    with Dataset(geo_em[0]) as src: urban = LandUse.from_dataset(src, 'ISURBAN')
+    parent = urban.boolean(PARENT_SHAPE[:2])
+    nest = domains[2].mask(urban).boolean(NEST_SHAPE[:2])
+    assert np.array_equal(nest, on_nest(parent)) and nest.any() and not nest[:RATIO].any()
+
+def cell_edge(start: float, end: float, size: int, index: float) -> float:
+    return start + (end - start) * index / (size - 1)
+
+def test_domains_latlon(geo_em):
+    domains = load_domains(geo_em)
+    # Edges halfway between d01 cells, rows 45 to 64 and columns 30 to 45, across the nest edges
+    box = LatLonBox(cell_edge(*LATITUDES, PARENT_SHAPE[0], 44.5), cell_edge(*LATITUDES, PARENT_SHAPE[0], 64.5),
+                    cell_edge(*LONGITUDES, PARENT_SHAPE[1], 29.5), cell_edge(*LONGITUDES, PARENT_SHAPE[1], 45.5))
+    parent = domains[1].mask(box).boolean(PARENT_SHAPE[:2])
+    assert parent.sum() == 20 * 16
+    assert np.array_equal(domains[2].mask(box).boolean(NEST_SHAPE[:2]), on_nest(parent))
+
+    # The centre cell of a disk on d01 is the centre of its RATIO x RATIO nest cells
+    row, col = 50, 50
+    disk = LatLonDisk((cell_edge(*LATITUDES, PARENT_SHAPE[0], row), cell_edge(*LONGITUDES, PARENT_SHAPE[1], col)), 10)
+    parent, nest = domains[1].mask(disk).boolean(PARENT_SHAPE[:2]), domains[2].mask(disk).boolean(NEST_SHAPE[:2])
+    center = (row - START + 1) * RATIO + RATIO // 2, (col - START + 1) * RATIO + RATIO // 2
+    assert parent[row, col] and nest[center]
+    assert abs(nest.sum() / RATIO ** 2 - parent.sum()) <= 0.2 * parent.sum()
+
+def test_domains_without_parent(geo_em):
+    with pytest.raises(ValueError, match='d02 given without its parent d01'):
+        load_domains(geo_em[1:])
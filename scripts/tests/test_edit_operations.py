@@ -0,0 +1,193 @@
+'''
+Timing of the operations the edit-data scripts are made of, on synthetic files
+Each benchmark also checks the result, so a faster but wrong change fails
+'''
+
+import os, shutil
+
+from netCDF4 import Dataset
+import numpy as np
+import pytest
+
+from miniguc.edits import geogrid, wrfbdy
+from miniguc.edits.mix import mix_batch
+from miniguc.engine import EditPlan, clone_dataset, edit_in_place
+from miniguc.ensemble import generate_ensemble
+from miniguc.fixtures import INTERVAL
+from miniguc.kernels import HorizontalMean, Paint
+from miniguc.masks import LandUse, Rectangle
+from miniguc.parallel import process_files
+from miniguc.sweep import materialize_sweep
+
+WRFINPUT_UNIFORM = ['T', 'THM', 'MU', 'P', 'AL', 'P_HYD', 'Q2', 'T2', 'TH2', 'PSFC', 'QVAPOR', 'TSLB', 'TMN',
+                    'TSK', 'SST', 'VAR', 'CON', 'VAR_SSO', 'OA1', 'OA2', 'OA3', 'OA4', 'OL1', 'OL2', 'OL3', 'OL4']
+GEO_EM_UNIFORM = ['SOILTEMP', 'SOILCTOP', 'SCT_DOM', 'SOILCBOT', 'SCB_DOM', 'ALBEDO12M', 'GREENFRAC', 'LAI12M',
+                  'SNOALB', 'CON', 'VAR', 'OA1', 'OA2', 'OA3', 'OA4', 'OL1', 'OL2', 'OL3', 'OL4', 'VAR_SSO']
+MET_EM_UNIFORM = ['PRES', 'GHT', 'HGTTROP', 'TTROP', 'SKINTEMP', 'SOILHGT', 'PSFC', 'RH', 'VV', 'UU', 'TT', 'PMSL']
+MET_EM_UNIFORM_LAND = ['SM', 'ST', 'ST000010', 'SM000010', 'SNOW', 'SNOWH']
+
+def clone(input_name: str, output_name: str, plan: EditPlan, compression: str = 'none',
+          memory_budget: int | None = None) -> None:
+    with Dataset(input_name) as src:
+        clone_dataset(src, output_name, plan, note='benchmark', compression=compression, memory_budget=memory_budget)
+
+def clone_met_em(input_name: str, output_name: str) -> None:
+    # Module level, so the worker processes can find it
+    clone(input_name, output_name, EditPlan().add(MET_EM_UNIFORM, HorizontalMean()))
+
+def test_uniform_wrfinput(benchmark, fixture_files, tmp_path):
+    output_name = str(tmp_path / 'wrfinput_d01')
+    benchmark(clone, fixture_files['wrfinput'][0], output_name, EditPlan().add(WRFINPUT_UNIFORM, HorizontalMean()),
+              'fast')
+    with Dataset(output_name) as out:
+        assert np.allclose(out['T'][0, 0], out['T'][0, 0].mean())
+
+def test_uniform_wrfinput_streamed(benchmark, fixture_files, tmp_path):
+    output_name = str(tmp_path / 'wrfinput_d01')
+    plan = EditPlan().add(WRFINPUT_UNIFORM, HorizontalMean())
+    benchmark(clone, fixture_files['wrfinput'][0], output_name, plan, 'fast', 1 << 20)
+    with Dataset(output_name) as out:
+        assert np.allclose(out['T'][0, 5], out['T'][0, 5].mean())
+
+def test_geogrid_plan(benchmark, fixture_files, tmp_path):
+    output_name = str(tmp_path / 'geo_em.d01.nc')
+    with Dataset(fixture_files['geo_em'][0]) as src:
+        shape = src.variables['LU_INDEX'].shape
+        urban_mask = Rectangle(center=(shape[-2] // 2, shape[-1] // 2), size=(shape[-2] // 5, shape[-1] // 5))
+
+    def landuse_index(values: np.ndarray) -> np.ndarray:
+        values[0][:] = 10
+        return urban_mask.fill(values, 1)
+
+    plan = EditPlan().add(GEO_EM_UNIFORM, HorizontalMean(start_axis=1))
+    plan.add('LU_INDEX', landuse_index).set(['HGT_M', 'E', 'F', 'SINALPHA'], 0).set(['MAPFAC_M', 'COSALPHA'], 1)
+    for var_name, value in [('MH_URB2D', 10), ('ZD_URB2D', 3), ('Z0_URB2D', 1), ('BUILD_AREA_FRACTION', 0.25)]:
+        plan.add(var_name, Paint(urban_mask, value))
+    plan.add('AHE', Paint(urban_mask, 100))
+
+    benchmark(clone, fixture_files['geo_em'][0], output_name, plan)
+    with Dataset(output_name) as out:
+        assert out['AHE'][0, :, shape[-2] // 2, shape[-1] // 2].min() == 100
+        assert out['AHE'][0, :, 0, 0].max() == 0
+
+def test_packaged_geogrid(benchmark, fixture_files, tmp_path):
+    # What `miniguc-edit geogrid` runs, into copies so the fixture is left as is
+    benchmark(geogrid.run, fixture_files['geo_em'], str(tmp_path))
+    with Dataset(str(tmp_path / 'geo_em.d01.nc')) as out:
+        assert out['AHE'][0, :, 50, 50].min() == 100
+        assert out['HGT_M'][:].max() == 0
+
+def test_metgrid_file(benchmark, fixture_files, tmp_path):
+    output_name = str(tmp_path / 'met_em.nc')
+    with Dataset(fixture_files['met_em'][0]) as src:
+        land = src.variables['LANDMASK'][0][:] == 1
+    plan = EditPlan().add(MET_EM_UNIFORM, HorizontalMean()).add(MET_EM_UNIFORM_LAND, HorizontalMean(land))
+
+    benchmark(clone, fixture_files['met_em'][0], output_name, plan)
+    with Dataset(output_name) as out:
+        assert np.ptp(out['TT'][0, 3]) < 1e-3
+        assert np.ptp(out['SM'][0][land]) < 1e-6
+
+def test_metgrid_parallel(benchmark, fixture_files, tmp_path):
+    output_names = [str(tmp_path / os.path.basename(name)) for name in fixture_files['met_em']]
+    benchmark(process_files, clone_met_em, fixture_files['met_em'], output_names)
+    assert all(os.path.exists(name) for name in output_names)
+
+def test_wrfbdy_average(benchmark, fixture_files, tmp_path):
+    output_name = str(tmp_path / 'wrfbdy_d01')
+    with Dataset(fixture_files['wrfbdy'][0]) as src:
+        interval = wrfbdy.boundary_interval(src)
+        qvapor = src['QVAPOR_BXS'][:].mean(axis=-1)
+        # A fresh plan for every round, the plan keeps the averaged values until their tendencies
+        benchmark.pedantic(clone_dataset, setup=lambda: ((src, output_name, wrfbdy.build_plan(src)),
+                                                         {'note': 'benchmark', 'compression': 'fast'}), rounds=1)
+    assert interval == INTERVAL.total_seconds()
+    with Dataset(output_name) as out:
+        for name in ['T', 'PH', 'QVAPOR']:
+            for side in ['XS', 'XE', 'YS', 'YE']:
+                values, tendency = out[f'{name}_B{side}'][:], out[f'{name}_BT{side}'][:]
+                assert np.ptp(values, axis=-1).max() <= 1e-6 * np.abs(values).max()
+                np.testing.assert_allclose(tendency[:-1], np.diff(values, axis=0) / interval,
+                                           rtol=1e-3, atol=1e-6 * np.abs(values).max() / interval)
+        np.testing.assert_allclose(out['QVAPOR_BXS'][..., 0], qvapor * 0.01, rtol=1e-5)
+        assert out['U_BXS'][:].max() == 0 and out['W_BTYE'][:].max() == 0
+
+def test_edit_in_place_wrfinput(benchmark, fixture_copy):
+    def build_plan(src: Dataset) -> EditPlan:
+        mask = LandUse.from_dataset(src, 'ISURBAN')
+        plan = EditPlan().set(['U', 'U10', 'V', 'V10', 'W'], 0)
+        return plan.add('BUILD_HEIGHT', lambda values: mask.fill(values, 1))
+
+    # A fresh copy for every round, the edit changes the file
+    in_place = benchmark.pedantic(edit_in_place, rounds=3,
+                                  setup=lambda: ((fixture_copy('wrfinput'), build_plan, 'benchmark'), {}))
+    assert in_place
+
+@pytest.mark.parametrize('preset', ['none', 'fast', 'default'])
+def test_codec(benchmark, fixture_files, tmp_path, preset):
+    output_name = str(tmp_path / 'wrfinput_d01')
+    benchmark(clone, fixture_files['wrfinput'][0], output_name, EditPlan(), preset)
+    assert os.path.getsize(output_name) > 0
+
+def test_mask_fill(benchmark):
+    ahe = np.zeros((1, 288, 100, 100), dtype=np.float32)
+    mask = Rectangle(center=(50, 50), size=(20, 20))
+    benchmark(mask.fill, ahe, 100)
+    assert ahe.sum() == 100 * 288 * 400
+
+def test_ensemble(benchmark, fixture_files, tmp_path):
+    output_names = [str(tmp_path / f'{member:02}' / 'wrfinput_d01') for member in range(4)]
+    benchmark(generate_ensemble, fixture_files['wrfinput'][0], output_names, seed=1, length_scale=5)
+    with Dataset(output_names[0]) as first, Dataset(output_names[1]) as second:
+        assert not np.array_equal(first['U'][:], second['U'][:])
+        assert np.array_equal(first['T'][:], second['T'][:])
+
+def test_sweep(benchmark, fixture_files, tmp_path):
+    base_dir = tmp_path / 'runs' / '001-urban-grassland'
+    base_dir.mkdir(parents=True)
+    for kind in ['geo_em', 'wrfinput', 'wrfbdy']:
+        os.link(fixture_files[kind][0], base_dir / os.path.basename(fixture_files[kind][0]))
+
+    # A second round would find the member directories already there
+    values = {'AHE': [0, 100], 'Z0_URB2D': [0.5, 1], 'LF_URB2D_S': [0.5]}
+    member_dirs = benchmark.pedantic(materialize_sweep, (str(base_dir), values), {'first_id': 0}, rounds=1)
+    assert [os.path.basename(member_dir)[:4] for member_dir in member_dirs] == ['000-', '001-', '002-', '003-']
+    with Dataset(os.path.join(member_dirs[-1], 'geo_em.d01.nc')) as out:
+        urban = LandUse.from_dataset(out, 'ISURBAN')
+        assert np.all(urban.select(out['AHE'][:]) == 100)
+    # wrfinput gets LF_URB2D_S as LF_URB2D, painted on the levels modify_urban_params paints
+    with Dataset(os.path.join(member_dirs[-1], 'wrfinput_d01')) as out, Dataset(base_dir / 'wrfinput_d01') as base:
+        urban = LandUse.from_dataset(out, 'ISURBAN')
+        assert np.all(urban.select(out['LF_URB2D'][0, :3]) == 0.5)
+        assert np.array_equal(out['LF_URB2D'][0, 3:], base['LF_URB2D'][0, 3:])
+
+def test_mix_batch(benchmark, fixture_files, tmp_path):
+    # 2 climate x 2 land runs, copies of the fixture told apart by T (climate) and LU_INDEX (land)
+    sources = []
+    for i in range(4):
+        sources.append(str(tmp_path / f'source{i}_wrfinput_d01'))
+        shutil.copyfile(fixture_files['wrfinput'][0], sources[i])
+        with Dataset(sources[i], 'r+') as source:
+            source['T'][:] = i
+            source['LU_INDEX'][:] = i
+    output_names = [[str(tmp_path / f'out{m}{k}') for k in range(2)] for m in range(2)]
+    notes = [[f'{m} {k}' for k in range(2)] for m in range(2)]
+
+    benchmark(mix_batch, sources[:2], sources[2:], output_names, 'wrfinput', notes)
+    with Dataset(output_names[1][0]) as out:
+        assert out['T'][:].min() == out['T'][:].max() == 1
+        assert out['LU_INDEX'][:].min() == out['LU_INDEX'][:].max() == 2
+        assert out.NOTE == '1 0'
+
+def test_expressions(benchmark, fixture_files, tmp_path):
+    # The land use edits of geogrid as a scenario, read and written in 1 MB slabs, give the same file
+    with Dataset(fixture_files['geo_em'][0]) as src:
+        shape = src.variables['LU_INDEX'].shape
+        urban_mask = Rectangle(center=(shape[-2] // 2, shape[-1] // 2), size=(shape[-2] // 5, shape[-1] // 5))
+        imperative = geogrid.modify_height(geogrid.modify_landuse(EditPlan(), src, urban_mask))
+        scenario = geogrid.modify_landuse_scenario(EditPlan(), src, urban_mask)
+    clone(fixture_files['geo_em'][0], str(tmp_path / 'imperative.nc'), imperative)
+    benchmark(clone, fixture_files['geo_em'][0], str(tmp_path / 'scenario.nc'), scenario, memory_budget=1 << 20)
+    with Dataset(str(tmp_path / 'imperative.nc')) as expected, Dataset(str(tmp_path / 'scenario.nc')) as out:
+        for var_name in ['LU_INDEX', 'LANDMASK', 'LANDUSEF', 'HGT_M']:
+            assert np.array_equal(out[var_name][:], expected[var_name][:])
@@ -0,0 +1,43 @@
+'''
+Results of the packaged editors of miniguc.edits on the fixture files
+'''
+
+from netCDF4 import Dataset
+import numpy as np
+
+from miniguc.edits import metgrid, wrfinput
+from miniguc.engine import clone_dataset, edit_in_place
+
+def test_wrfinput_build_plan(fixture_copy):
+    file_name = fixture_copy('wrfinput')
+    with Dataset(file_name) as src:
+        original = {name: src[name][:] for name in ['LF_URB2D', 'BUILD_HEIGHT', 'T']}
+        urban = src['LU_INDEX'][0] == src.getncattr('ISURBAN')
+    edit_in_place(file_name, wrfinput.build_plan, 'test')
+
+    with Dataset(file_name) as out:
+        # Urban parameters only in the urban cells, and only for the first 3 directions of LF_URB2D
+        lf_urb2d, build_height = out['LF_URB2D'][:], out['BUILD_HEIGHT'][:]
+        assert np.all(lf_urb2d[0, :3][:, urban] == 0.25)
+        np.testing.assert_array_equal(lf_urb2d[0, :3][:, ~urban], original['LF_URB2D'][0, :3][:, ~urban])
+        np.testing.assert_array_equal(lf_urb2d[0, 3], original['LF_URB2D'][0, 3])
+        assert np.all(build_height[0][urban] == 1)
+        np.testing.assert_array_equal(build_height[0][~urban], original['BUILD_HEIGHT'][0][~urban])
+        np.testing.assert_allclose(out['T'][0, :, 0, 0], original['T'][0].mean(axis=(1, 2)), rtol=1e-5)
+        assert np.ptp(out['T'][0], axis=(1, 2)).max() == 0
+        assert out['U'][:].max() == 0 and out['SINALPHA'][:].max() == 0
+
+def test_metgrid_build_plan(fixture_files, tmp_path):
+    output_name = str(tmp_path / 'met_em.d01.nc')
+    with Dataset(fixture_files['met_em'][0]) as src:
+        original = {name: src[name][:] for name in ['TT', 'SM', 'LANDMASK']}
+        clone_dataset(src, output_name, metgrid.build_plan(src), note='test')
+    land = original['LANDMASK'][0] == 1
+
+    with Dataset(output_name) as out:
+        np.testing.assert_allclose(out['TT'][0, :, 0, 0], original['TT'][0].mean(axis=(1, 2)), rtol=1e-5)
+        # Soil moisture is averaged over land only, the water cells keep their values
+        sm = out['SM'][0]
+        np.testing.assert_allclose(sm[land], original['SM'][0][land].mean(), rtol=1e-5)
+        np.testing.assert_array_equal(sm[~land], original['SM'][0][~land])
+        np.testing.assert_array_equal(out['LANDSEA'][:], original['LANDMASK'])
@@ -0,0 +1,24 @@
+'''
+Failures of miniguc.engine.edit_in_place
+'''
+
+import os
+
+from netCDF4 import Dataset
+import pytest
+
+from miniguc.engine import EditPlan, edit_in_place
+
+def test_edit_in_place_failure(fixture_copy):
+    # A failing edit leaves the file as it was, on both paths, each building the plan once
+    file_name, built = fixture_copy('wrfinput'), []
+    with open(file_name, 'rb') as f: original = f.read()
+
+    def failing_plan(src: Dataset) -> EditPlan:
+        built.append(file_name)
+        return EditPlan().set('U', 0).add('V', lambda values: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError): edit_in_place(file_name, failing_plan, 'test')
+    with pytest.raises(ZeroDivisionError): edit_in_place(file_name, failing_plan, 'test', compression='none')
+    with open(file_name, 'rb') as f: assert f.read() == original
+    assert len(built) == 2 and not any(name.endswith('.tmp') for name in os.listdir(os.path.dirname(file_name)))
@@ -0,0 +1,16 @@
+'''
+Compiling edit scripts with miniguc.expressions
+'''
+
+from netCDF4 import Dataset
+
+from miniguc.expressions import compile_script
+
+def test_compile_script(fixture_files):
+    # Consecutive assignments fold into one step, a whole-variable assignment drops the edits before it
+    with Dataset(fixture_files['wrfinput'][0]) as src:
+        graph = compile_script('T := 5; T := T * 2; U := U * 2; U := U + 1; V[0] := 1; V := 0; '
+                               'QVAPOR := horizontal_mean(QVAPOR)', src)
+    assert [str(step) for step in graph['T']] == ['T := 10']
+    assert [str(step) for step in graph['U']] == ['U := ((U * 2) + 1)']
+    assert [str(step) for step in graph['V']] == ['V := 0']
@@ -0,0 +1,40 @@
+'''
+Edit reports of miniguc.instrument
+'''
+
+import json, os, threading
+
+from netCDF4 import Dataset
+
+from miniguc.edits import metgrid
+from miniguc.engine import EditPlan, clone_dataset
+from miniguc.instrument import instrument, report_name, timed
+
+def test_report(fixture_files, tmp_path, monkeypatch):
+    def clone(output_name: str) -> None:
+        with Dataset(fixture_files['met_em'][0]) as src:
+            plan = metgrid.modify_convert_uniform(EditPlan(), ['TT', 'RH']).set('PMSL', 0)
+            clone_dataset(src, output_name, plan, note='test')
+
+    # Off by default, then edits are reported under the step that added them
+    clone(str(tmp_path / 'off.nc'))
+    assert sorted(os.listdir(tmp_path)) == ['off.nc']
+    monkeypatch.setenv('MINIGUC_REPORT', 'json')
+    clone(str(tmp_path / 'on.nc'))
+    with open(report_name(str(tmp_path / 'on.nc'))) as f: steps = json.load(f)['steps']
+    assert steps['modify_convert_uniform']['calls'] == 2 and steps['Fill']['calls'] == 1
+
+    # Files written at the same time by two threads get their own reports
+    barrier, reports = threading.Barrier(2), {}
+
+    def write(name: str) -> None:
+        with instrument(str(tmp_path / name)) as report:
+            barrier.wait()
+            with timed(name, 'write') as nbytes: nbytes.append(1)
+            barrier.wait()
+            reports[name] = report
+
+    threads = [threading.Thread(target=write, args=(name,)) for name in ['a.nc', 'b.nc']]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert reports['a.nc'] is not reports['b.nc'] and list(reports['a.nc'].variables) == ['a.nc']
@@ -0,0 +1,21 @@
+'''
+Checks of miniguc.edits.mix before anything is written
+'''
+
+import os, shutil
+
+from netCDF4 import Dataset
+import pytest
+
+from miniguc.edits.mix import mix_batch
+
+def test_mix_batch_variables(fixture_files, tmp_path):
+    # A land file without one of the variables of the first is refused before anything is written
+    sources = [str(tmp_path / f'source{i}_wrfinput_d01') for i in range(3)]
+    for source in sources: shutil.copyfile(fixture_files['wrfinput'][0], source)
+    with Dataset(sources[2], 'a') as source:
+        source.createVariable('EXTRA', 'f4', ('Time',))
+    output_names = [[str(tmp_path / f'out{k}') for k in range(2)]]
+    with pytest.raises(ValueError, match='EXTRA'):
+        mix_batch(sources[:1], sources[1:], output_names, 'wrfinput', [['0 0', '0 1']])
+    assert not any(name.startswith(('out', '.out')) for name in os.listdir(tmp_path))
@@ -0,0 +1,159 @@
+'''
+Resuming the stage graph of miniguc.pipeline, with small Python commands standing in for the WRF executables
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from time import perf_counter
+import hashlib, os, sqlite3, sys
+
+from miniguc import pipeline, stage_cache
+from miniguc.pipeline import Command, Stage, idealized_run, run_pipeline, status
+from miniguc.sandbox import create_sandbox, promote
+from miniguc.stage_cache import read_namelist
+
+def python(code: str) -> list[str]:
+    return [sys.executable, '-c', code]
+
+def write(name: str, text: str, seconds: float = 0) -> list[str]:
+    # Appends to runs.log, so the test sees which stages ran
+    return python(f'import time; time.sleep({seconds}); open({name!r}, "w").write({text!r}); '
+                  f'open("runs.log", "a").write({name!r} + "\\n")')
+
+def stages(work_dir: str, fail: bool = False, inputs: list[str] | None = None) -> list[Stage]:
+    return [
+        Stage('geogrid', work_dir, [Command(write('geo_em.d01.nc', 'geo', 0.5))], ['geo_em.d*'], inputs=inputs,
+              cache=False),
+        Stage('ungrib', work_dir, [Command(write('FILE:2025', 'grib', 0.5))], ['FILE:*'], cache=False),
+        Stage('metgrid', work_dir, [Command(write('met_em.d01.nc', 'met')),
+                                    Command(python('import sys; sys.exit(int(%r))' % fail))],
+              ['met_em.d*'], after=['geogrid', 'ungrib'], cache=False),
+        Stage('real', work_dir, [Command(write('wrfinput_d01', 'input'), 'input', 'wrfinput_d01')], ['wrfinput_d01'],
+              after=['metgrid'], cache=False),
+    ]
+
+def runs(work_dir: str) -> list[str]:
+    with open(os.path.join(work_dir, 'runs.log')) as f: lines = f.read().split()
+    os.remove(os.path.join(work_dir, 'runs.log'))
+    return lines
+
+def test_pipeline(benchmark, tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    work_dir = str(tmp_path)
+
+    # geogrid and ungrib run at the same time, metgrid fails so real never starts
+    start = perf_counter()
+    assert not run_pipeline(stages(work_dir, fail=True), work_dir)
+    elapsed, state = perf_counter() - start, pipeline.load_state(work_dir)
+    assert elapsed < sum(state[name]['seconds'] for name in ['geogrid', 'ungrib', 'metgrid'])
+    lines = runs(work_dir)
+    assert sorted(lines[:2]) == ['FILE:2025', 'geo_em.d01.nc'] and lines[2:] == ['met_em.d01.nc']
+    assert status(stages(work_dir), work_dir) == {'geogrid': 'done', 'ungrib': 'done', 'metgrid': 'failed',
+                                                  'real': 'waiting'}
+
+    # Resumes from metgrid, then nothing is left to run
+    assert run_pipeline(stages(work_dir), work_dir)
+    assert runs(work_dir) == ['met_em.d01.nc', 'wrfinput_d01']
+    assert benchmark(run_pipeline, stages(work_dir), work_dir)
+    assert not os.path.exists(os.path.join(work_dir, 'runs.log'))
+
+    # A changed output makes the stages after it stale, forcing a stage reruns the ones after it
+    with open(os.path.join(work_dir, 'met_em.d01.nc'), 'w') as f: f.write('edited')
+    assert status(stages(work_dir), work_dir)['metgrid'] == 'stale'
+    assert run_pipeline(stages(work_dir), work_dir, force=['ungrib'])
+    assert runs(work_dir) == ['FILE:2025', 'met_em.d01.nc', 'wrfinput_d01']
+    assert pipeline.load_state(work_dir)['real']['status'] == 'done'
+
+def test_pipeline_upstream_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    work_dir = str(tmp_path)
+    (tmp_path / 'engine.py').write_text('version = 1')
+    assert run_pipeline(stages(work_dir, inputs=['engine.py']), work_dir)
+    runs(work_dir)
+
+    # A changed module reruns the stages after it, even though geo_em comes out byte-identical
+    (tmp_path / 'engine.py').write_text('version = 2')
+    assert status(stages(work_dir, inputs=['engine.py']), work_dir)['geogrid'] == 'stale'
+    assert run_pipeline(stages(work_dir, inputs=['engine.py']), work_dir)
+    assert runs(work_dir) == ['geo_em.d01.nc', 'met_em.d01.nc', 'wrfinput_d01']
+
+    # Every stage running miniguc-edit depends on the whole package
+    package_dir = os.path.dirname(os.path.abspath(pipeline.__file__))
+    project_dir = os.path.dirname(os.path.dirname(package_dir))
+    editors = {stage.name: stage for stage in idealized_run(str(tmp_path / 'run'), project_dir)}
+    for name in ['geogrid', 'metgrid', 'real']:
+        input_files = {os.path.abspath(file_name) for pattern in editors[name].inputs for file_name in glob(pattern)}
+        assert {os.path.join(package_dir, 'engine.py'), os.path.join(package_dir, 'edits', 'wrfbdy.py')} <= input_files
+    assert editors['promote'].cache is False and editors['real'].after == ['promote']
+
+def test_pipeline_only(tmp_path, monkeypatch):
+    # A run prepared before the pipeline: met_em from its own WPS run, no miniguc-pipeline.json
+    monkeypatch.setattr(stage_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    work_dir = str(tmp_path)
+    assert not run_pipeline(stages(work_dir), work_dir, only=['real'])
+    assert not os.path.exists(os.path.join(work_dir, 'runs.log'))
+
+    (tmp_path / 'met_em.d01.nc').write_text('own')
+    assert run_pipeline(stages(work_dir), work_dir, only=['real'])
+    assert runs(work_dir) == ['wrfinput_d01'] and (tmp_path / 'met_em.d01.nc').read_text() == 'own'
+    assert pipeline.load_state(work_dir)['metgrid']['adopted']
+    # Refreshing again runs real again, on the same met_em
+    assert run_pipeline(stages(work_dir), work_dir, only=['real'])
+    assert runs(work_dir) == ['wrfinput_d01']
+
+def test_hash_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    names = [str(tmp_path / f'FILE:{index}') for index in range(40)]
+    for index, name in enumerate(names):
+        with open(name, 'w') as f: f.write(str(index))
+    with ThreadPoolExecutor(8) as executor:
+        digests = list(executor.map(stage_cache.hash_file, names))
+    assert digests == [hashlib.sha256(str(index).encode()).hexdigest() for index in range(40)]
+
+    # Every thread's entry made it to the index, where other processes find them
+    index = sqlite3.connect(os.path.join(tmp_path, 'cache', stage_cache.HASH_INDEX_NAME))
+    assert index.execute('SELECT count(*) FROM hashes').fetchone() == (40,)
+    # Rewritten within the same mtime second, the nanoseconds still tell
+    stat = os.stat(names[0])
+    with open(names[0], 'w') as f: f.write('X')
+    os.utime(names[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert stage_cache.hash_file(names[0]) == hashlib.sha256(b'X').hexdigest()
+    assert index.execute('SELECT count(*) FROM hashes').fetchone() == (40,)
+    index.close()
+
+NAMELIST_WPS = """&share
+ max_dom = 1,
+/
+&geogrid
+ geog_data_path = '../WPS_GEOG/'
+ opt_geogrid_tbl_path = 'geogrid/',
+/
+&metgrid
+ fg_name = 'FILE'
+ opt_output_from_metgrid_path = '/home/mok/miniguc/Build_WRF/WPS/',
+/
+"""
+
+def test_sandbox(tmp_path):
+    wps_dir, geog_dir = tmp_path / 'WPS', tmp_path / 'WPS_GEOG'
+    for directory in [wps_dir / 'geogrid', geog_dir, tmp_path / 'run1', tmp_path / 'run2']: directory.mkdir(parents=True)
+    (wps_dir / 'namelist.wps').write_text(NAMELIST_WPS)
+    for name in ['geogrid.exe', 'geogrid/GEOGRID.TBL', 'geo_em.d01.nc', 'geogrid.log', 'GRIBFILE.AAA']:
+        (wps_dir / name).write_text('shared')
+    (tmp_path / 'run2' / 'namelist.wps').write_text(NAMELIST_WPS.replace('max_dom = 1', 'max_dom = 2'))
+
+    sandboxes = [create_sandbox(str(wps_dir), str(tmp_path / run)) for run in ['run1', 'run2']]
+    assert sorted(os.listdir(sandboxes[0])) == ['GRIBFILE.AAA', 'WPS_GEOG', 'geogrid', 'geogrid.exe', 'namelist.wps']
+    assert os.path.realpath(os.path.join(sandboxes[0], 'WPS_GEOG')) == str(geog_dir)
+    namelists = [read_namelist(os.path.join(sandbox, 'namelist.wps')) for sandbox in sandboxes]
+    assert namelists[0]['geogrid']['geog_data_path'] == "'WPS_GEOG/'"
+    assert namelists[0]['geogrid']['opt_geogrid_tbl_path'] == f"'{wps_dir / 'geogrid'}/'"
+    assert namelists[0]['metgrid'] == {'fg_name': "'FILE'", 'opt_output_from_metgrid_path': "'./'"}
+    assert namelists[1]['share']['max_dom'] == '2'
+
+    # Outputs of a sandbox replace those of a previous promotion, the shared directory is left alone
+    (tmp_path / 'run1' / 'met_em.d02.nc').write_text('old')
+    open(os.path.join(sandboxes[0], 'met_em.d01.nc'), 'w').write('new')
+    assert promote(sandboxes[0], ['met_em.d*'], str(tmp_path / 'run1')) == [str(tmp_path / 'run1' / 'met_em.d01.nc')]
+    assert sorted(os.listdir(tmp_path / 'run1')) == ['met_em.d01.nc', 'wps-sandbox']
+    assert (wps_dir / 'geo_em.d01.nc').read_text() == 'shared'
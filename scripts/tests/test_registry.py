@@ -0,0 +1,35 @@
+'''
+Run lookups through the SQLite registry of miniguc.registry
+'''
+
+import json, os, sys
+
+from miniguc.registry import Registry, record_status
+from miniguc.scheduler import Job, Scheduler
+
+def test_registry(benchmark, tmp_path):
+    for name in ['045-grassland-ahe-100', '046-barren', 'run-template']:
+        (tmp_path / name).mkdir()
+    (tmp_path / '045-grassland-ahe-100' / 'wrfinput_d01').write_text('')
+    (tmp_path / '045-grassland-ahe-100' / 'namelist.input').write_text('&domains\n e_we = 100,\n/\n')
+    runs = Registry(str(tmp_path))
+    assert runs.scan() == 2 and runs.scan() == 0
+    assert [run.id for run in runs.runs('new')] == [45, 46]
+    assert runs.get(45).parameters == {'e_we': '100'}
+
+    # A file written after the scan is found on lookup
+    (tmp_path / '045-grassland-ahe-100' / 'wrfout_d01_2025-01-01_00:00:00').write_text('')
+    wrfout = benchmark(lambda: [runs.run_file(45, 'wrfout*') for _ in range(10000)][0])
+    assert wrfout == str(tmp_path / '045-grassland-ahe-100' / 'wrfout_d01_2025-01-01_00:00:00')
+
+    # Statuses recorded by the orchestrators, then from the files on the next scan
+    record_status(str(tmp_path / '046-barren'), 'preparing')
+    scheduler = Scheduler(cpus=[0], pin=False, poll_seconds=0.05)
+    scheduler.submit(Job(str(tmp_path / '046-barren'), 1, command=[sys.executable, '-c', 'import sys; sys.exit(1)']))
+    scheduler.run()
+    other = Registry(str(tmp_path))
+    assert other.get(46).status == 'failed' and other.get(45).status == 'done'
+    with open(tmp_path / '046-barren' / 'miniguc-wrf.json', 'w') as f: json.dump({'exit_status': 0}, f)
+    os.rename(tmp_path / '045-grassland-ahe-100', tmp_path / '047-forest')
+    assert other.scan() == 2
+    assert other.get(46).status == 'done' and [run.name for run in other.runs()] == ['046-barren', '047-forest']
@@ -0,0 +1,41 @@
+'''
+Packing of jobs by miniguc.scheduler, with short Python commands standing in for wrf.exe
+'''
+
+from itertools import permutations
+from time import perf_counter
+import json, os, sys
+
+from miniguc.scheduler import RECORD_NAME, Job, Scheduler
+
+def job(tmp_path, name: str, ranks: int, priority: int = 0, code: str = 'import time; time.sleep(0.5)') -> Job:
+    run_dir = tmp_path / name
+    run_dir.mkdir()
+    return Job(str(run_dir), ranks, priority, [sys.executable, '-c', code])
+
+def test_scheduler(benchmark, tmp_path):
+    # 6 cores: three 2-rank jobs side by side, then the 4-rank one, the priority job first
+    scheduler = Scheduler(cpus=list(range(6)), pin=False, poll_seconds=0.05)
+    for i in range(3): scheduler.submit(job(tmp_path, f'run{i}', 2))
+    scheduler.submit(job(tmp_path, 'big', 4))
+    scheduler.submit(job(tmp_path, 'urgent', 2, priority=10, code='import sys; sys.exit(3)'))
+
+    start = perf_counter()
+    jobs = benchmark(scheduler.run)
+    assert jobs[0].name == 'urgent' and jobs[-1].name == 'big'
+    # Jobs running at the same time never share a CPU, and some did run at the same time
+    for first, second in permutations(jobs, 2):
+        if first.start_time <= second.start_time < first.start_time + first.record['wall_seconds']:
+            assert set(first.cpus).isdisjoint(second.cpus)
+    assert perf_counter() - start < sum(job.record['wall_seconds'] for job in jobs)
+
+    with open(tmp_path / 'urgent' / RECORD_NAME) as f: record = json.load(f)
+    assert record['exit_status'] == 3
+    with open(tmp_path / 'big' / RECORD_NAME) as f: assert json.load(f)['exit_status'] == 0
+
+def test_scheduler_pinning(tmp_path):
+    cpu = min(os.sched_getaffinity(0))
+    scheduler = Scheduler(cpus=[cpu], poll_seconds=0.05)
+    scheduler.submit(job(tmp_path, 'pinned', 1, code='import os; print(sorted(os.sched_getaffinity(0)))'))
+    scheduler.run()
+    with open(tmp_path / 'pinned' / 'miniguc-wrf.log') as f: assert f.read().strip() == f'[{cpu}]'
@@ -8,6 +8,7 @@ is_py = os.path.basename(sys.argv[0]) == 'bdy-height.ju.py'
 RUN_ID = int(sys.argv[1]) if is_py and len(sys.argv) > 1 else 15
 
 root_dir = '/home/guc/'
+sys.path.append(root_dir + 'scripts')
 data_dir = f'runs/{RUN_ID:03}*/'
 root_data_dir = glob(root_dir + data_dir)[0]
 
@@ -17,12 +18,8 @@ if len(glob(image_dir)) == 0:
 
 # %%
 
-def list_variables(dataset: Dataset) -> None:
-    '''
-    List all variables in the nc dataset for adjustment
-    dataset:    netcdf dataset
-    '''
-    print('\n'.join(map(lambda x: f"{x.name}: {dataset[x.name].__dict__.get('description')} {x.dimensions}", dataset.variables.values())))
+# list_variables(file_name) prints the descriptions from the catalog of the file, see miniguc.catalog
+from miniguc.display import list_variables
 
 # %%
 
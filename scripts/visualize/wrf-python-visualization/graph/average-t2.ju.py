@@ -4,6 +4,10 @@
 from netCDF4 import Dataset
 from glob import glob
 import numpy as np
+import sys
+
+sys.path.append('/home/guc/scripts')
+from miniguc.masks import Rectangle
 
 from wrf import getvar, ALL_TIMES, extract_times
 
@@ -25,6 +29,9 @@ plt.subplots_adjust(wspace=0.7)
 iterate_values = AHE_VALUES
 threshold_datetime = np.datetime64('2025-03-10')
 
+# Same urban area as geogrid.ju.py, the indices are computed once and reused
+urban_mask = Rectangle(center=(50, 50), size=(20, 20))
+
 for ahe in AHE_VALUES:
     z0 = 1
 # for z0 in Z0_VALUES:
@@ -43,13 +50,13 @@ for ahe in AHE_VALUES:
 
     cut_t2_value = np.array(cut_t2_value)
     cut_t2_mean = np.mean(cut_t2_value)
-    cut_t2_mean_urb = np.mean(cut_t2_value[:, 40:60, 40:60])
+    cut_t2_mean_urb = np.mean(urban_mask.select(cut_t2_value))
 
     cut_mean_values.append(cut_t2_mean - 273.15)
     cut_mean_values_urb.append(cut_t2_mean_urb - 273.15)
 
     all_mean_values.append(np.mean(all_t2_values) - 273.15)
-    all_mean_values_urb.append(np.mean(all_t2_values[:, 40:60, 40:60]) - 273.15)
+    all_mean_values_urb.append(np.mean(urban_mask.select(all_t2_values)) - 273.15)
 
 
 axes[0].set_title('Mean Temperature Across All Time\nvs. AHE Value', y=1.1)
@@ -87,13 +94,13 @@ for z0 in Z0_VALUES:
         times = extract_times(dataset, timeidx=ALL_TIMES)
     t2_values = getvar(dataset, "T2", timeidx=ALL_TIMES)
     mean_t2_values = np.mean(t2_values, axis=(1, 2)) - 273.15
-    mean_t2_values_urban = np.mean(t2_values[:, 40:60, 40:60], axis=(1, 2)) - 273.15
+    mean_t2_values_urban = np.mean(urban_mask.select(t2_values), axis=-1) - 273.15
 
     axes[0][0].plot(times, mean_t2_values, label=f"AHE={ahe}")
     axes[0][1].plot(times, mean_t2_values_urban, label=f"AHE={ahe}")
 
     axes[1][0].plot(times, np.max(t2_values, axis=(1, 2)) - 273.15, label=f"AHE={ahe}")
-    axes[1][1].plot(times, np.max(t2_values[:, 40:60, 40:60], axis=(1, 2)) - 273.15, label=f"AHE={ahe}")
+    axes[1][1].plot(times, np.max(urban_mask.select(t2_values), axis=-1) - 273.15, label=f"AHE={ahe}")
 
 
 for i in range(2):
@@ -39,7 +39,12 @@ INDEPENDENT_VAR = 'AHE'
 root_dir = '/home/guc/'
 data_dir = f'tmp/'
 image_dir = glob(root_dir + data_dir)[0]
-dummy_dataset = Dataset(glob(f'{root_dir}runs/045-*/wrfout*')[0])
+
+# Files of the runs from the registry of runs/, see miniguc.registry, instead of globbing for every frame
+sys.path.append(root_dir + 'scripts')
+from miniguc.registry import run_file
+
+dummy_dataset = Dataset(run_file(45, 'wrfout*', root_dir + 'runs'))
 z_data = getvar(dummy_dataset, "z", timeidx=0)
 
 if len(glob(image_dir)) == 0:
@@ -153,8 +158,8 @@ def generate_frame(time_idx, date_time = np.datetime64('1970-01-01')):
 
     for i, rural_land_type in enumerate(RUN_IDS):
         for j, run_id in enumerate(RUN_IDS[rural_land_type]):
-            dataset = Dataset(glob(f'{root_dir}runs/{run_id:03}-*/wrfout*')[0])
-            wrfinput = Dataset(glob(f'{root_dir}runs/{run_id:03}-*/wrfinput*')[0])
+            dataset = Dataset(run_file(run_id, 'wrfout*', root_dir + 'runs'))
+            wrfinput = Dataset(run_file(run_id, 'wrfinput*', root_dir + 'runs'))
             independent_var_value = get_independent_var_values(wrfinput, INDEPENDENT_VAR)
             var_contour, qrain_contour = generate_subplot(dataset, axes[i][j], time_idx)
 